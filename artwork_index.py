@@ -0,0 +1,386 @@
+"""
+Perceptual-hash index of the track artwork, for finding near-duplicate images.
+
+Each image in IMAGE_OUTPUT_PATH gets a 64-bit DCT perceptual hash (pHash),
+kept as a packed uint64 NumPy array in the cache directory together with
+the file names, sizes and modification times. Images that look the same
+(re-encodes, resized copies, reissue art with small changes) have hashes
+a few bits apart, so near-duplicates are found with Hamming-distance
+queries over the whole array:
+
+    python artwork_index.py build            # hash new and changed images
+    python artwork_index.py report           # list groups of near-duplicate artwork
+    python artwork_index.py query cover.jpg  # find images that look like cover.jpg
+
+download_image uses the index to reuse an existing file instead of storing
+a duplicate. Requires NumPy and Pillow; without them deduplication is off.
+"""
+import io
+import os
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+from media_cache import get_cache_dir
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.artwork')
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+# Images within this many differing bits are treated as the same artwork at ingest
+DEFAULT_DUPLICATE_THRESHOLD = 4
+# Looser default for the catalog report; must stay below 8 for the byte-bucket search
+DEFAULT_REPORT_THRESHOLD = 6
+
+_lock = threading.RLock()
+_indexes = {}
+_dct_matrix = None
+_popcount_table = None
+
+def dedup_available():
+    """NumPy and Pillow are needed for hashing; check without importing them."""
+    return all(importlib.util.find_spec(name) is not None for name in ('numpy', 'PIL'))
+
+def dedup_enabled():
+    """Reuse near-duplicate artwork at ingest unless ARTWORK_DEDUP is set to 0."""
+    return os.getenv('ARTWORK_DEDUP', '1').lower() not in ('0', 'false', 'no', 'off') and dedup_available()
+
+def get_duplicate_threshold():
+    return int(os.getenv('ARTWORK_DUPLICATE_THRESHOLD', DEFAULT_DUPLICATE_THRESHOLD))
+
+def _get_dct_matrix():
+    """Orthonormal DCT-II matrix, so the 2-D DCT is two matrix products."""
+    global _dct_matrix
+    if _dct_matrix is None:
+        import numpy as np
+
+        n = np.arange(DCT_SIZE)
+        matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * DCT_SIZE)) * np.sqrt(2 / DCT_SIZE)
+        matrix[0] /= np.sqrt(2)
+        _dct_matrix = matrix
+    return _dct_matrix
+
+def phash_image(image):
+    """
+    Compute the 64-bit perceptual hash of a PIL image.
+
+    The image is reduced to 32x32 grayscale and the low 8x8 frequencies of its
+    DCT are compared to their median, one bit each.
+
+    Returns:
+        int: The hash as an unsigned 64-bit integer
+    """
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.asarray(image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    dct = _get_dct_matrix()
+    low = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # Leave the DC term out of the median so overall brightness doesn't dominate
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+def phash_bytes(data):
+    """Perceptual hash of an encoded image (e.g. a downloaded JPEG)."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return phash_image(image)
+
+def phash_file(path):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return phash_image(image)
+
+def _popcount(values):
+    """Number of set bits in each element of a uint64 array."""
+    import numpy as np
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    global _popcount_table
+    if _popcount_table is None:
+        _popcount_table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return _popcount_table[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+def hamming_distances(hashes, query):
+    """
+    Vectorized Hamming distance between one hash and an array of hashes.
+
+    Args:
+        hashes (numpy.ndarray): uint64 hashes
+        query (int): Hash to compare against
+
+    Returns:
+        numpy.ndarray: Number of differing bits for each hash
+    """
+    import numpy as np
+
+    return _popcount(np.bitwise_xor(hashes, np.uint64(query)))
+
+class ArtworkIndex:
+    """Perceptual hashes of the images in one directory, stored as NumPy arrays."""
+
+    def __init__(self, image_dir, path=None):
+        import numpy as np
+
+        self.image_dir = os.path.abspath(image_dir)
+        key = hashlib.sha1(self.image_dir.encode('utf-8')).hexdigest()[:12]
+        self.path = path or os.path.join(get_cache_dir(), f"artwork_index-{key}.npz")
+        self.names = np.array([], dtype=str)
+        self.hashes = np.array([], dtype=np.uint64)
+        self.sizes = np.array([], dtype=np.int64)
+        self.mtimes = np.array([], dtype=np.float64)
+        self.load()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def load(self):
+        import numpy as np
+
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.names = data['names']
+                self.hashes = data['hashes']
+                self.sizes = data['sizes']
+                self.mtimes = data['mtimes']
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self):
+        import numpy as np
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, names=self.names, hashes=self.hashes, sizes=self.sizes, mtimes=self.mtimes)
+        os.replace(tmp_path, self.path)
+
+    def add(self, name, image_hash, size, mtime):
+        """Add or replace one image's entry (call save() to persist)."""
+        import numpy as np
+
+        keep = self.names != name
+        self.names = np.append(self.names[keep], name)
+        self.hashes = np.append(self.hashes[keep], np.uint64(image_hash))
+        self.sizes = np.append(self.sizes[keep], size)
+        self.mtimes = np.append(self.mtimes[keep], mtime)
+
+    def query(self, image_hash, threshold=DEFAULT_DUPLICATE_THRESHOLD, exclude=None):
+        """
+        Find indexed images within `threshold` bits of a hash.
+
+        Returns:
+            list: (distance, file name) pairs, closest first
+        """
+        import numpy as np
+
+        if not len(self):
+            return []
+        distances = hamming_distances(self.hashes, image_hash)
+        matches = np.nonzero(distances <= threshold)[0]
+        results = sorted((int(distances[i]), str(self.names[i])) for i in matches)
+        return [(distance, name) for distance, name in results
+                if name != exclude and os.path.exists(os.path.join(self.image_dir, name))]
+
+    def refresh(self, workers=None):
+        """
+        Hash new and changed images and drop deleted ones.
+
+        Returns:
+            int: Number of images hashed
+        """
+        import numpy as np
+        from image_derivatives import list_source_images
+
+        known = {str(name): (int(size), float(mtime)) for name, size, mtime in zip(self.names, self.sizes, self.mtimes)}
+        current = {}
+        for path in list_source_images(self.image_dir):
+            stat = os.stat(path)
+            current[os.path.basename(path)] = (stat.st_size, stat.st_mtime)
+
+        keep = np.array([str(name) in current for name in self.names], dtype=bool)
+        self.names, self.hashes = self.names[keep], self.hashes[keep]
+        self.sizes, self.mtimes = self.sizes[keep], self.mtimes[keep]
+
+        changed = [name for name, stat in current.items() if known.get(name) != stat]
+        if changed:
+            paths = [os.path.join(self.image_dir, name) for name in changed]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                hashes = list(executor.map(_hash_file_safe, paths, chunksize=32))
+            for name, image_hash in zip(changed, hashes):
+                if image_hash is not None:
+                    self.add(name, image_hash, *current[name])
+        self.save()
+        return len(changed)
+
+    def duplicate_pairs(self, threshold=DEFAULT_REPORT_THRESHOLD):
+        """
+        Find every pair of indexed images within `threshold` bits.
+
+        Uses multi-index hashing: two 64-bit hashes differing in at most 7 bits
+        must agree exactly on at least one of their 8 bytes, so only images
+        sharing a byte value at some position are compared. Everything is
+        vectorized, which keeps tens of thousands of images well under a second.
+
+        Returns:
+            list: (distance, name, name) triples, closest first
+        """
+        import numpy as np
+
+        if threshold >= 8:
+            raise ValueError("threshold must be below 8 bits")
+        count = len(self)
+        if count < 2:
+            return []
+
+        byte_view = self.hashes.view(np.uint8).reshape(count, 8)
+        firsts, seconds, found = [], [], []
+        for position in range(8):
+            keys = byte_view[:, position]
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            sorted_hashes = self.hashes[order]
+            # Compare each image with the next 1, 2, ... images sharing its byte value
+            offset = 1
+            while offset < count:
+                same = np.nonzero(sorted_keys[:-offset] == sorted_keys[offset:])[0]
+                if not len(same):
+                    break
+                distances = _popcount(np.bitwise_xor(sorted_hashes[same], sorted_hashes[same + offset]))
+                close = distances <= threshold
+                firsts.append(order[same[close]])
+                seconds.append(order[same[close] + offset])
+                found.append(distances[close])
+                offset += 1
+        if not firsts:
+            return []
+
+        first = np.concatenate(firsts)
+        second = np.concatenate(seconds)
+        distances = np.concatenate(found)
+        # A pair sharing several bytes is found once per byte; keep one of each
+        low, high = np.minimum(first, second), np.maximum(first, second)
+        _, unique = np.unique(low.astype(np.int64) * count + high, return_index=True)
+        return sorted(
+            (int(distances[i]), str(self.names[low[i]]), str(self.names[high[i]]))
+            for i in unique
+        )
+
+def _hash_file_safe(path):
+    try:
+        return phash_file(path)
+    except Exception as e:
+        logger.warning("Could not hash %s: %s", path, e)
+        return None
+
+def get_artwork_index(image_dir):
+    """
+    Return the shared in-memory index for an image directory.
+
+    The first time a directory is seen without a saved index, its existing
+    images are hashed so ingest-time checks cover the whole catalog.
+    """
+    image_dir = os.path.abspath(image_dir)
+    with _lock:
+        if image_dir not in _indexes:
+            index = ArtworkIndex(image_dir)
+            if not os.path.exists(index.path):
+                logger.info("Building the artwork index for %s", image_dir)
+                index.refresh()
+            _indexes[image_dir] = index
+        return _indexes[image_dir]
+
+def find_duplicate(image_dir, data, filename):
+    """
+    Look for existing artwork that looks the same as newly downloaded image data.
+
+    Args:
+        image_dir (str): Artwork directory
+        data (bytes): The downloaded image
+        filename (str): The file name it would be saved under
+
+    Returns:
+        tuple: (existing file name or None, hash of the new image)
+    """
+    image_hash = phash_bytes(data)
+    with _lock:
+        matches = get_artwork_index(image_dir).query(image_hash, get_duplicate_threshold(), exclude=filename)
+    return (matches[0][1] if matches else None), image_hash
+
+def remember_artwork(image_dir, filename, image_hash):
+    """Add a newly saved image to the index."""
+    stat = os.stat(os.path.join(image_dir, filename))
+    with _lock:
+        index = get_artwork_index(image_dir)
+        index.add(filename, image_hash, stat.st_size, stat.st_mtime)
+        index.save()
+
+def group_duplicates(pairs):
+    """Merge duplicate pairs into groups of file names (connected components)."""
+    parent = {}
+
+    def find(name):
+        parent.setdefault(name, name)
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for _, a, b in pairs:
+        parent[find(a)] = find(b)
+    groups = {}
+    for name in parent:
+        groups.setdefault(find(name), []).append(name)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group))
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Perceptual-hash index of the track artwork.")
+    parser.add_argument('--image-dir', default=None, help="artwork directory (default: IMAGE_OUTPUT_PATH)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="hash new and changed images")
+    build.add_argument('--workers', type=int, default=None)
+    report = subparsers.add_parser('report', help="list groups of near-duplicate artwork")
+    report.add_argument('--threshold', type=int, default=DEFAULT_REPORT_THRESHOLD, help="max differing bits (0-7)")
+    query = subparsers.add_parser('query', help="find indexed images that look like an image file")
+    query.add_argument('image')
+    query.add_argument('--threshold', type=int, default=DEFAULT_REPORT_THRESHOLD)
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    if not dedup_available():
+        logger.error("Error: the artwork index needs NumPy and Pillow (pip install numpy Pillow)")
+        return
+    image_dir = os.path.expanduser(args.image_dir or get_setting('IMAGE_OUTPUT_PATH', ''))
+    if not os.path.isdir(image_dir):
+        logger.error("Error: image directory does not exist: %s", image_dir)
+        return
+
+    index = ArtworkIndex(image_dir)
+    if args.command == 'build':
+        start = time.perf_counter()
+        hashed = index.refresh(workers=args.workers)
+        print(f"Hashed {hashed} new or changed images; {len(index)} indexed ({time.perf_counter() - start:.1f}s)")
+    elif args.command == 'report':
+        start = time.perf_counter()
+        groups = group_duplicates(index.duplicate_pairs(args.threshold))
+        elapsed = time.perf_counter() - start
+        for group in groups:
+            print(', '.join(group))
+        print(f"\n{len(groups)} groups of near-duplicate artwork among {len(index)} images "
+              f"(searched in {elapsed * 1000:.0f}ms)")
+    else:
+        for distance, name in index.query(phash_file(args.image), args.threshold):
+            print(f"{distance:2d} bits  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+End-to-end benchmark of the card pipeline on recorded HTTP traffic.
+
+Runs many cards through scrape, image, enrich and publish with every request
+answered from a cassette (see http_cassettes.py), so the numbers measure
+CardCreator and the simulated latency instead of the network on the day, and
+reports latency percentiles per stage, per platform and per card:
+
+    python bench_e2e.py --cards 200 --latency-ms 80 --jitter-ms 40
+    python bench_e2e.py --cassette ~/cassettes/kdzu.json.gz --cards 200 --latency-ms recorded
+
+Without --cassette a synthetic cassette is recorded first: generated Bandcamp
+pages, artwork and YouTube/Spotify search results, plus the posters' traffic
+to the fake servers from fake_servers.py. With --cassette, the track pages
+recorded in it (HTTP_CASSETTE_MODE=record) are cycled through.
+
+Cards are written to a temporary directory and nothing is posted.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import contextlib
+from urllib.parse import urlsplit, parse_qs
+
+from fake_servers import start_fake_servers, stop_fake_servers, fake_server_env
+from http_cassettes import Cassette, use_cassette, record_page
+from load_test import PLATFORMS, summarize_latencies, format_summary_row
+from stations import load_stations, DEFAULT_STATIONS_CONFIG
+
+logger = logging.getLogger('cardcreator.bench')
+
+STAGES = ('scrape', 'image', 'enrich', 'publish')
+# load_page() waits this long for Chrome; used as the recorded duration of synthetic pages
+PAGE_LOAD_SECONDS = 3.0
+SYNTHETIC_SETTINGS = {
+    'YOUTUBE_API_KEY': 'bench-youtube-key',
+    'SPOTIPY_CLIENT_ID': 'bench-spotify-id',
+    'SPOTIPY_CLIENT_SECRET': 'bench-spotify-secret',
+}
+
+def synthetic_track(index):
+    """Return the details of synthetic track number index."""
+    artist = f"bench-artist-{index % 50}"
+    return {
+        'url': f"https://{artist}.bandcamp.com/track/synthetic-track-{index}",
+        'title': f"Synthetic Track {index}",
+        'artist': f"Bench Artist {index % 50}",
+        'artist_link': f"https://{artist}.bandcamp.com",
+        'image_url': f"https://f4.bcbits.com/img/a{index:010d}_10.jpg",
+        'tags': ['electronic', 'ambient', f"tag-{index % 7}"],
+    }
+
+def synthetic_page(track):
+    """Return a track page with the parts parse_track_page() reads."""
+    tags = ''.join(f'<a class="tag" href="https://bandcamp.com/tag/{tag}">{tag}</a>' for tag in track['tags'])
+    return f"""<html><head><meta itemprop="datePublished" content="20240301"></head><body>
+<div id="name-section">
+  <h2 class="trackTitle">{track['title']}</h2>
+  <h3 class="albumTitle"><span>by</span> <span><a href="{track['artist_link']}">{track['artist']}</a></span></h3>
+</div>
+<div id="tralbumArt"><a class="popupImage" href="{track['image_url']}"><img src="{track['image_url']}"></a></div>
+<div class="tralbum-credits">released March 1, 2024<br>Mastered by Bench Engineer</div>
+<div class="tralbum-tags">{tags}</div>
+</body></html>"""
+
+def synthetic_artwork(index, size=1200):
+    """Return JPEG bytes of noise artwork that looks different for every index (so dedup doesn't skip it)."""
+    from PIL import Image
+
+    rng = random.Random(index)
+    image = Image.frombytes('RGB', (32, 32), bytes(rng.getrandbits(8) for _ in range(32 * 32 * 3)))
+    buffer = io.BytesIO()
+    image.resize((size, size)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def _json_answer(payload):
+    return 200, {'Content-Type': 'application/json; charset=utf-8'}, json.dumps(payload).encode('utf-8')
+
+def synthetic_origin(method, url):
+    """
+    Answer the artwork, YouTube and Spotify requests of synthetic cards.
+
+    Returns:
+        tuple: (status, headers, body), or None for requests it doesn't know
+    """
+    parts = urlsplit(url)
+    query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+    if parts.netloc.endswith('bcbits.com'):
+        index = int(os.path.basename(parts.path).split('_')[0].lstrip('a'))
+        return 200, {'Content-Type': 'image/jpeg'}, synthetic_artwork(index)
+    if parts.netloc.endswith('googleapis.com') and parts.path.endswith('/search'):
+        return _json_answer({'items': [
+            {'id': {'kind': 'youtube#video', 'videoId': f"bench{n}"},
+             'snippet': {'title': f"{query.get('q', '')} (video {n})", 'channelTitle': 'Bench Channel'}}
+            for n in range(5)
+        ]})
+    if parts.netloc == 'accounts.spotify.com':
+        return _json_answer({'access_token': 'bench-spotify-token', 'token_type': 'Bearer', 'expires_in': 3600})
+    if parts.netloc == 'api.spotify.com' and parts.path.endswith('/search'):
+        return _json_answer({'tracks': {'items': [
+            {'name': f"{query.get('q', '')} ({n})", 'external_urls': {'spotify': f"https://open.spotify.com/track/bench{n}"}}
+            for n in range(5)
+        ]}})
+    return None
+
+def isolate_settings(directory, overrides):
+    """
+    Point the station settings at a benchmark directory.
+
+    Copies the configured station profiles (so a cassette recorded with them
+    still matches) with overrides applied to every station and the defaults,
+    and uses the copy for the rest of the run.
+    """
+    config = load_stations()
+    stations = {name: {**settings, **overrides} for name, settings in config['stations'].items()}
+    path = os.path.join(directory, 'stations.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'defaults': {**config['defaults'], **overrides}, 'stations': stations}, f)
+    os.environ['STATIONS_CONFIG'] = path
+    os.environ.update({key: str(value) for key, value in overrides.items()})
+
+def output_settings(directory):
+    """Create fresh output and cache directories for one pass and return the settings for them."""
+    settings = {
+        'MARKDOWN_OUTPUT_PATH': os.path.join(directory, 'tracks'),
+        'IMAGE_OUTPUT_PATH': os.path.join(directory, 'images'),
+        'CARD_IMAGE_OUTPUT_PATH': os.path.join(directory, 'cards'),
+    }
+    for path in settings.values():
+        os.makedirs(path, exist_ok=True)
+    # Upload caches and archived pages would change what a second pass requests
+    os.environ['CARDCREATOR_CACHE_DIR'] = os.path.join(directory, 'cache')
+    os.environ['PAGE_ARCHIVE_DIR'] = os.path.join(directory, 'archive')
+    return settings
+
+def load_posters(platforms):
+    """Return (manifest entry, create function) for each selected poster that is installed."""
+    from posters import get_registered_posters, is_poster_available, load_poster
+
+    return {name: (poster, load_poster(name)) for name, poster in get_registered_posters().items()
+            if name in platforms and is_poster_available(name)}
+
+def run_card(url, posters):
+    """
+    Create and publish one card, timing each stage.
+
+    Returns:
+        tuple: (stage -> seconds, platform -> seconds, failed stage names, total seconds)
+    """
+    import card_creator
+    from card_renderer import post_image_path
+    from hashtags import get_track_hashtags
+
+    stages = {}
+    posts = {}
+    failed = []
+    card_start = time.perf_counter()
+
+    start = time.perf_counter()
+    track = card_creator.parse_track_page(card_creator.load_page(url, None), url)
+    if track is not None:
+        image_filename = f"{card_creator.sanitize_filename(track['title'].lower())}.jpg"
+        markdown_path = card_creator.write_track_file(track, url, image_filename)
+    stages['scrape'] = time.perf_counter() - start
+    if track is None:
+        return stages, posts, ['scrape'], time.perf_counter() - card_start
+
+    start = time.perf_counter()
+    image_path = card_creator.download_image(track['hero_image'], image_filename)
+    stages['image'] = time.perf_counter() - start
+    if image_path is None:
+        return stages, posts, ['image'], time.perf_counter() - card_start
+
+    start = time.perf_counter()
+    query = f"{track['title']} {track['artist']}"
+    youtube_link = spotify_link = None
+    try:
+        if card_creator.get_setting('YOUTUBE_API_KEY'):
+            results = card_creator.search_youtube_api(query, card_creator.get_setting('YOUTUBE_API_KEY'))
+            youtube_link = results[0][2] if results else None
+        if card_creator.get_setting('SPOTIPY_CLIENT_ID') and card_creator.get_setting('SPOTIPY_CLIENT_SECRET'):
+            results = card_creator.search_spotify(query, card_creator.get_setting('SPOTIPY_CLIENT_ID'),
+                                                  card_creator.get_setting('SPOTIPY_CLIENT_SECRET'))
+            spotify_link = results[0][1] if results else None
+    except Exception as e:
+        logger.warning("Search failed for %s: %s", url, e)
+        failed.append('enrich')
+    card_creator.add_links_to_track_file(markdown_path, youtube_link, spotify_link)
+    review = "A benchmark review: steady pulse, warm pads and a long fade."
+    card_creator.add_review_to_track_file(markdown_path, review)
+    stages['enrich'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hashtags = get_track_hashtags(track['tags'], track['artist'], None)
+    for name, (poster, create_post) in posters.items():
+        post_start = time.perf_counter()
+        success = create_post(
+            image_path=post_image_path(poster, markdown_path, image_path),
+            title=track['title'],
+            artist=track['artist'],
+            review=review,
+            bandcamp_url=url,
+            spotify_url=spotify_link,
+            youtube_url=youtube_link,
+            hashtags=hashtags
+        )
+        posts[name] = time.perf_counter() - post_start
+        if not success:
+            failed.append(name)
+    stages['publish'] = time.perf_counter() - start
+    if any(name in posters for name in failed):
+        failed.append('publish')
+    return stages, posts, failed, time.perf_counter() - card_start
+
+def record_synthetic_cassette(path, cards, work_dir, platforms):
+    """
+    Record a cassette for synthetic cards: pages, artwork and searches come
+    from synthetic_origin(), posts go to freshly started fake servers.
+    """
+    tracks = [synthetic_track(i) for i in range(cards)]
+    servers = start_fake_servers()
+    try:
+        isolate_settings(work_dir, {**SYNTHETIC_SETTINGS, **fake_server_env(servers),
+                                                  **output_settings(os.path.join(work_dir, 'record'))})
+        with use_cassette(path, 'record') as cassette:
+            # The replay needs the same server addresses, even though nothing listens there any more
+            cassette.meta['settings'] = {**SYNTHETIC_SETTINGS, **fake_server_env(servers)}
+            for track in tracks:
+                record_page(track['url'], synthetic_page(track), PAGE_LOAD_SECONDS)
+        posters = load_posters(platforms)
+        with use_cassette(path, 'update', origin=synthetic_origin):
+            for track in tracks:
+                run_card(track['url'], posters)
+    finally:
+        stop_fake_servers(servers)
+
+def recorded_tracks(path):
+    """
+    Read the track pages recorded in a cassette.
+
+    Returns:
+        tuple: (track page URLs in recording order, settings stored with the cassette)
+    """
+    cassette = Cassette(path, 'replay')
+    urls = [interaction['url'] for interaction in cassette.interactions
+            if interaction['kind'] == 'page' and '/track/' in interaction['url']]
+    return list(dict.fromkeys(urls)), cassette.meta.get('settings', {})
+
+def run_benchmark(cards=50, cassette_path=None, latency_ms=0, jitter_ms=0, platforms=PLATFORMS, verbose=False):
+    """
+    Run the benchmark and return a report dict.
+
+    Args:
+        cards (int): Number of cards to create
+        cassette_path (str, optional): Recorded cassette to replay; a
+            synthetic one is recorded if not given
+        latency_ms (float or str): Simulated latency per replayed request,
+            or 'recorded' for the recorded durations
+        jitter_ms (float): Extra random latency of up to this many milliseconds
+        platforms (tuple): Platforms to post each card to
+        verbose (bool): Show the pipeline's own output
+
+    Returns:
+        dict: Throughput (None if any stage or post failed), per-stage, per-platform
+        and per-card latency summaries, failures
+    """
+    work_dir = tempfile.mkdtemp(prefix='cardcreator-e2e-')
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        os.environ['HASHTAG_PROMPT'] = '0'
+        os.environ['STATIONS_CONFIG'] = os.path.abspath(os.path.expanduser(os.getenv('STATIONS_CONFIG', DEFAULT_STATIONS_CONFIG)))
+        if cassette_path:
+            cassette_path = os.path.abspath(os.path.expanduser(cassette_path))
+        # spotipy keeps its token in ./.cache; don't leave the benchmark's next to the real one
+        os.chdir(work_dir)
+        with output:
+            if cassette_path:
+                urls, recorded_settings = recorded_tracks(cassette_path)
+            else:
+                cassette_path = os.path.join(work_dir, 'synthetic.json.gz')
+                record_synthetic_cassette(cassette_path, cards, work_dir, platforms)
+                urls, recorded_settings = recorded_tracks(cassette_path)
+        if not urls:
+            raise ValueError(f"No track pages recorded in {cassette_path}")
+
+        replay_dir = os.path.join(work_dir, 'replay')
+        os.makedirs(replay_dir)
+        isolate_settings(replay_dir, {**recorded_settings, **output_settings(replay_dir)})
+        posters = load_posters(platforms)
+
+        stage_latencies = {stage: [] for stage in STAGES}
+        post_latencies = {name: [] for name in posters}
+        failures = {name: 0 for name in (*STAGES, *posters)}
+        card_latencies = []
+        start = time.perf_counter()
+        with output, use_cassette(cassette_path, 'replay', latency_ms, jitter_ms) as cassette:
+            for i in range(cards):
+                stages, posts, failed, card_time = run_card(urls[i % len(urls)], posters)
+                card_latencies.append(card_time)
+                for stage, elapsed in stages.items():
+                    stage_latencies[stage].append(elapsed)
+                for name, elapsed in posts.items():
+                    post_latencies[name].append(elapsed)
+                for name in failed:
+                    failures[name] += 1
+            interactions = len(cassette.interactions)
+        elapsed = time.perf_counter() - start
+
+        # Failed stages and posts finish early, so their cards don't count towards throughput
+        failed_runs = sum(failures.values())
+        return {
+            'cards': cards,
+            'tracks': len(urls),
+            'cassette': cassette_path,
+            'interactions': interactions,
+            'latency_ms': latency_ms,
+            'jitter_ms': jitter_ms,
+            'elapsed_s': elapsed,
+            'cards_per_second': cards / elapsed if elapsed and not failed_runs else None,
+            'stages': {stage: summarize_latencies(values) for stage, values in stage_latencies.items()},
+            'platforms': {name: summarize_latencies(values) for name, values in post_latencies.items()},
+            'failures': failures,
+            'card': summarize_latencies(card_latencies),
+        }
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_report(report):
+    latency = report['latency_ms'] if report['latency_ms'] == 'recorded' else f"{float(report['latency_ms']):g}ms"
+    throughput = report['cards_per_second']
+    throughput = f"{throughput:.1f} cards/s" if throughput is not None else "no throughput (failures below)"
+    print(f"\n{report['cards']} cards ({report['tracks']} recorded tracks, {report['interactions']} interactions) "
+          f"in {report['elapsed_s']:.2f}s, {throughput}")
+    print(f"Replay latency: {latency} + up to {float(report['jitter_ms']):g}ms jitter\n")
+    for stage, summary in report['stages'].items():
+        print(format_summary_row(stage, summary, f"failures={report['failures'][stage]}"))
+    print()
+    for name, summary in report['platforms'].items():
+        print(format_summary_row(name, summary, f"failures={report['failures'][name]}"))
+    print()
+    print(format_summary_row('card', report['card']))
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Benchmark the whole card pipeline on recorded HTTP traffic.")
+    parser.add_argument('--cards', type=int, default=50)
+    parser.add_argument('--cassette', help="recorded cassette to replay (default: record a synthetic one)")
+    parser.add_argument('--latency-ms', default='0',
+                        help="simulated latency per replayed request, or 'recorded' for the recorded durations")
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--platforms', default=','.join(PLATFORMS),
+                        help="comma-separated subset of instagram,mastodon,bluesky (empty to skip publishing)")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's output")
+    args = parser.parse_args()
+
+    platforms = tuple(p.strip() for p in args.platforms.split(',') if p.strip())
+    unknown = set(platforms) - set(PLATFORMS)
+    if unknown:
+        parser.error(f"unknown platforms: {', '.join(sorted(unknown))}")
+    latency_ms = args.latency_ms
+    if latency_ms != 'recorded':
+        try:
+            latency_ms = float(latency_ms)
+        except ValueError:
+            parser.error("--latency-ms takes a number of milliseconds or 'recorded'")
+    if args.cassette and not os.path.exists(os.path.expanduser(args.cassette)):
+        parser.error(f"cassette not found: {args.cassette}")
+
+    # Credentials for a recorded cassette come from .env (their values aren't matched)
+    load_dotenv()
+    if not args.verbose:
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    setup_logging()
+    report = run_benchmark(args.cards, args.cassette, latency_ms, args.jitter_ms, platforms, args.verbose)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    failed_runs = sum(report['failures'].values())
+    if failed_runs:
+        print(f"Failed stages or posts: {failed_runs}; rerun with --verbose to see why", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Measure how long it takes to import card_creator, i.e. the time before the first prompt.
+
+Each measurement runs in a fresh interpreter. The "eager" variant additionally
+imports the modules card_creator used to load at import time, which shows what
+the lazy imports save:
+
+    python bench_startup.py --runs 10 --top 15
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+# Modules card_creator imported at module load before they were made lazy
+EAGER_IMPORTS = [
+    'requests',
+    'bs4',
+    'spotipy',
+    'spotipy.oauth2',
+    'googleapiclient.discovery',
+    'selenium.webdriver',
+    'selenium.webdriver.chrome.service',
+    'selenium.webdriver.chrome.options',
+    'webdriver_manager.chrome',
+    'instagram_poster',
+    'mastodon_poster',
+    'bluesky_poster',
+]
+
+def time_import(statement, runs):
+    """
+    Time a Python statement in fresh interpreters.
+
+    Returns:
+        list: Wall-clock seconds for each run
+    """
+    code = (
+        "import time; _start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - _start)"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+def eager_statement():
+    """Import card_creator plus every eager-era module that is installed."""
+    lines = ["import card_creator"]
+    for module in EAGER_IMPORTS:
+        lines.append(f"try:\n    import {module}\nexcept ImportError:\n    pass")
+    return '\n'.join(lines)
+
+def slowest_imports(statement, top):
+    """
+    Use -X importtime to find card_creator's slowest direct imports.
+    
+    Returns:
+        list: (cumulative microseconds, module name) pairs, slowest first
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=here, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        indent = len(name) - len(name.lstrip())
+        entries.append((int(cumulative_us), indent, name.strip()))
+    
+    # Direct imports of card_creator are one level (two spaces) deeper than it
+    root = next((indent for _, indent, name in entries if name == 'card_creator'), None)
+    if root is not None:
+        entries = [entry for entry in entries if entry[1] == root + 2]
+    return sorted(((us, name) for us, _, name in entries), reverse=True)[:top]
+
+def describe(timings):
+    return (f"median {statistics.median(timings) * 1000:7.1f}ms  "
+            f"min {min(timings) * 1000:7.1f}ms  max {max(timings) * 1000:7.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark card_creator startup time.")
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per variant")
+    parser.add_argument('--top', type=int, default=10, help="slowest imports to list (0 to skip)")
+    args = parser.parse_args()
+
+    lazy = time_import("import card_creator", args.runs)
+    eager = time_import(eager_statement(), args.runs)
+
+    print(f"lazy  (import card_creator):        {describe(lazy)}")
+    print(f"eager (plus former module imports): {describe(eager)}")
+    saved = statistics.median(eager) - statistics.median(lazy)
+    print(f"startup saved: {saved * 1000:.1f}ms per run")
+
+    if args.top:
+        print("\nSlowest imports for 'import card_creator':")
+        for cumulative_us, name in slowest_imports("import card_creator", args.top):
+            print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
 import os
 import re
+import logging
 from atproto import Client
 from dotenv import load_dotenv
+from stations import get_setting, get_hero_image_base_url
+from hashtags import get_track_hashtags, parse_tag_list
+from track_frontmatter import parse_frontmatter_value
+from logging_config import setup_logging
 from atproto import models
+from media_cache import file_sha256, get_cached_media, remember_media, forget_media
+
+logger = logging.getLogger('cardcreator.bluesky')
+
+BLOB_CACHE_NAME = 'bluesky_blobs'
 
 def read_track_from_markdown(markdown_file_path):
     """
@@ -33,7 +43,7 @@ def read_track_from_markdown(markdown_file_path):
             if ':' in line and not line.startswith('#'):
                 key, value = line.split(':', 1)
                 key = key.strip()
-                value = value.strip().strip('"').strip("'")
+                value = parse_frontmatter_value(value)
                 track_data[key] = value
         
         # Extract review (remove the placeholder text)
@@ -44,10 +54,10 @@ def read_track_from_markdown(markdown_file_path):
         
         # Get image path from heroImage
         hero_image = track_data.get('heroImage', '')
-        if hero_image.startswith('https://static.kdzu.org/images/tracks/'):
+        if hero_image.startswith(get_hero_image_base_url()):
             # Convert to local path
             image_filename = os.path.basename(hero_image)
-            image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH', '')), image_filename)
+            image_path = os.path.join(os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH', '')), image_filename)
         else:
             image_path = None
         
@@ -58,11 +68,13 @@ def read_track_from_markdown(markdown_file_path):
             'bandcamp_url': track_data.get('bandcamp', ''),
             'spotify_url': track_data.get('spotify', ''),
             'youtube_url': track_data.get('youtube', ''),
+            'label': track_data.get('label', ''),
+            'tags': parse_tag_list(track_data.get('tags', '')),
             'image_path': image_path
         }
         
     except Exception as e:
-        print(f"Error reading markdown file: {str(e)}")
+        logger.error("Error reading markdown file: %s", e)
         return None
 
 def get_hashtags():
@@ -87,7 +99,58 @@ def get_hashtags():
     
     return hashtags  # Return as list instead of joined string
 
-def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None):
+def get_blob_cache_key(did, image_hash):
+    """Build the blob cache key for an image in a specific account's repo."""
+    return f"{did}|{image_hash}"
+
+def get_or_upload_blob(client, image_path):
+    """
+    Return a blob ref for image_path, reusing a cached upload for the same account.
+    
+    Args:
+        client (Client): Logged-in Bluesky client
+        image_path (str): Path to the image
+        
+    Returns:
+        tuple: (BlobRef, cache key, whether it came from the cache)
+    """
+    cache_key = get_blob_cache_key(client.me.did, file_sha256(image_path))
+    cached = get_cached_media(BLOB_CACHE_NAME, cache_key)
+    if cached:
+        try:
+            return models.BlobRef.model_validate(cached['blob']), cache_key, True
+        except Exception:
+            forget_media(BLOB_CACHE_NAME, cache_key)
+    
+    logger.info("Uploading image to Bluesky...")
+    with open(image_path, 'rb') as f:
+        upload = client.upload_blob(f.read())
+    
+    remember_media(BLOB_CACHE_NAME, cache_key, {
+        'blob': upload.blob.model_dump(by_alias=True, mode='json')
+    })
+    return upload.blob, cache_key, False
+
+def login_bluesky():
+    """
+    Create a Bluesky client and log in with the current station's credentials (see stations.py).
+    
+    Returns:
+        Client: Logged-in client, or None if the credentials are missing
+    """
+    bluesky_handle = get_setting('BLUESKY_HANDLE')
+    bluesky_password = get_setting('BLUESKY_PASSWORD')
+    if not bluesky_handle or not bluesky_password:
+        logger.error("Error: Bluesky credentials not found in .env file")
+        logger.error("Please add BLUESKY_HANDLE and BLUESKY_PASSWORD to your .env file")
+        return None
+    
+    # BLUESKY_SERVICE_URL points the client at another PDS
+    client = Client(base_url=get_setting('BLUESKY_SERVICE_URL') or None)
+    client.login(bluesky_handle, bluesky_password)
+    return client
+
+def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None, hashtags=None, client=None):
     """
     Create a Bluesky post for a track review.
     
@@ -99,26 +162,19 @@ def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify
         bandcamp_url (str): Bandcamp URL
         spotify_url (str, optional): Spotify URL
         youtube_url (str, optional): YouTube URL
+        hashtags (list, optional): Hashtags to use; prompts for them if not given
+        client (Client, optional): Logged-in client to reuse (see login_bluesky())
     """
-    # Load environment variables
-    load_dotenv()
-    
     try:
-        # Get Bluesky credentials
-        bluesky_handle = os.getenv('BLUESKY_HANDLE')
-        bluesky_password = os.getenv('BLUESKY_PASSWORD')
-        
-        if not bluesky_handle or not bluesky_password:
-            print("Error: Bluesky credentials not found in .env file")
-            print("Please add BLUESKY_HANDLE and BLUESKY_PASSWORD to your .env file")
-            return False
-        
         # Initialize Bluesky client
-        client = Client()
-        client.login(bluesky_handle, bluesky_password)
+        if client is None:
+            client = login_bluesky()
+            if client is None:
+                return False
         
-        # Get hashtags from user
-        hashtags = get_hashtags()
+        # Get hashtags from user unless they were provided
+        if hashtags is None:
+            hashtags = get_hashtags()
         
         # Clean and validate URLs
         def clean_url(url):
@@ -158,12 +214,12 @@ def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify
             post_text += f"\nYT: {youtube_url}"
         
         # Add tracks web page link
-        more_tracks_url = os.getenv('MORE_TRACKS_URL', 'https://kdzu.org/tracks-we-love')
+        more_tracks_url = get_setting('MORE_TRACKS_URL', 'https://kdzu.org/tracks-we-love')
         post_text += f"\nKDZU: {more_tracks_url}"
         
         # Check character limit (Bluesky has 300 character limit)
         if len(post_text) > 300:
-            print(f"Post is {len(post_text)} characters, truncating to fit Bluesky's 300 character limit...")
+            logger.info("Post is %d characters, truncating to fit Bluesky's 300 character limit...", len(post_text))
             
             # Create a shorter version with essential info only
             short_post = f"""{title} by {artist}"""
@@ -185,18 +241,15 @@ def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify
             
             post_text = short_post
             
-            print(f"Truncated post is {len(post_text)} characters")
+            logger.info("Truncated post is %d characters", len(post_text))
         
         # Create the post (with image)
-        print("Posting to Bluesky...")
+        logger.info("Posting to Bluesky...")
         
-        # Upload image first
-        print("Uploading image to Bluesky...")
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-        
-        # Upload the image
-        upload = client.upload_blob(image_data)
+        # Upload image first, unless this account already has the same image
+        blob, cache_key, from_cache = get_or_upload_blob(client, image_path)
+        if from_cache:
+            logger.info("Reusing previously uploaded Bluesky image")
         
         # Try to use facets for better URL and hashtag handling
         try:
@@ -235,33 +288,38 @@ def create_bluesky_post(image_path, title, artist, review, bandcamp_url, spotify
                             )
                         ))
             
-            # Create the post with image and facets
-            client.send_post(
-                text=post_text,
-                facets=facets,
-                embed=models.AppBskyEmbedImages.Main(
-                    images=[models.AppBskyEmbedImages.Image(
-                        image=upload.blob,
-                        alt=f"Album artwork for {title} by {artist}"
-                    )]
-                )
-            )
         except ImportError:
             # Fallback to simple post with image if facets not available
+            facets = None
+        
+        def send(blob):
             client.send_post(
                 text=post_text,
+                facets=facets,
                 embed=models.AppBskyEmbedImages.Main(
                     images=[models.AppBskyEmbedImages.Image(
-                        image=upload.blob,
+                        image=blob,
                         alt=f"Album artwork for {title} by {artist}"
                     )]
                 )
             )
         
+        # Create the post with image and facets
+        try:
+            send(blob)
+        except Exception:
+            if not from_cache:
+                raise
+            # The server no longer has the cached blob; upload it again
+            logger.info("Cached Bluesky image was rejected, uploading again...")
+            forget_media(BLOB_CACHE_NAME, cache_key)
+            blob, cache_key, _ = get_or_upload_blob(client, image_path)
+            send(blob)
+        
         return True
         
     except Exception as e:
-        print(f"Error posting to Bluesky: {str(e)}")
+        logger.error("Error posting to Bluesky: %s", e, extra={'platform': 'bluesky'})
         return False
 
 def create_bluesky_post_from_markdown(markdown_file_path):
@@ -271,18 +329,15 @@ def create_bluesky_post_from_markdown(markdown_file_path):
     Args:
         markdown_file_path (str): Path to the markdown file
     """
-    # Load environment variables
-    load_dotenv()
-    
     # Read track data from markdown
     track_data = read_track_from_markdown(markdown_file_path)
     if not track_data:
-        print("Error: Could not read track data from markdown file")
+        logger.error("Error: Could not read track data from markdown file")
         return False
     
     # Check if image exists
     if not track_data['image_path'] or not os.path.exists(track_data['image_path']):
-        print(f"Error: Image file not found at {track_data['image_path']}")
+        logger.error("Error: Image file not found at %s", track_data['image_path'])
         return False
     
     # Create Bluesky post
@@ -293,7 +348,8 @@ def create_bluesky_post_from_markdown(markdown_file_path):
         review=track_data['review'],
         bandcamp_url=track_data['bandcamp_url'],
         spotify_url=track_data['spotify_url'],
-        youtube_url=track_data['youtube_url']
+        youtube_url=track_data['youtube_url'],
+        hashtags=get_track_hashtags(track_data['tags'], track_data['artist'], track_data['label'])
     )
 
 def setup_bluesky_app():
@@ -314,12 +370,13 @@ def setup_bluesky_app():
     return True
 
 if __name__ == "__main__":
+    load_dotenv()
+    setup_logging()
     print("Bluesky Poster for CardCreator")
     print("=" * 40)
     
     # Check if setup is needed
-    load_dotenv()
-    if not os.getenv('BLUESKY_PASSWORD'):
+    if not get_setting('BLUESKY_PASSWORD'):
         print("Bluesky credentials not found. Running setup...")
         setup_bluesky_app()
     else:
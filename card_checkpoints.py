@@ -0,0 +1,94 @@
+import os
+import time
+from urllib.parse import urlparse
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from stations import get_station_name
+
+CHECKPOINT_CACHE_NAME = 'card_checkpoints'
+
+# Stages of the interactive card flow, in order. Publishing is checkpointed per
+# platform as 'publish:<poster name>'.
+STAGES = ('scrape', 'image', 'enrich', 'review', 'publish')
+
+DEFAULT_CHECKPOINT_TTL = 90 * 24 * 60 * 60
+
+def checkpoint_key(url):
+    """
+    Normalize a Bandcamp URL so the same card always maps to one checkpoint.
+
+    With station profiles the key is prefixed with the station, since each
+    station writes and posts its own card for a track. A fragment is kept, so
+    album tracks without their own page can have keys like album#track-2.
+    """
+    parsed = urlparse(url.strip())
+    key = f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+    if parsed.fragment:
+        key = f"{key}#{parsed.fragment}"
+    station = get_station_name()
+    return f"{station}:{key}" if station else key
+
+def get_checkpoint_ttl():
+    """Seconds a card's checkpoint is kept after its last update (CARD_CHECKPOINT_TTL)."""
+    return float(os.getenv('CARD_CHECKPOINT_TTL', DEFAULT_CHECKPOINT_TTL))
+
+def load_checkpoint(url):
+    """
+    Return the completed stages recorded for a card.
+
+    Args:
+        url (str): The card's Bandcamp URL
+
+    Returns:
+        dict: Stage name -> saved output (empty if nothing was checkpointed)
+    """
+    entry = load_media_cache(CHECKPOINT_CACHE_NAME).get(checkpoint_key(url))
+    if not entry or time.time() - entry.get('updated_at', 0) > get_checkpoint_ttl():
+        return {}
+    return entry.get('stages', {})
+
+def get_stage(url, stage):
+    """Return a stage's saved output, or None if the stage hasn't completed."""
+    return load_checkpoint(url).get(stage)
+
+def save_stage(url, stage, output):
+    """
+    Record a stage's output for a card.
+
+    Expired checkpoints of other cards are dropped at the same time.
+
+    Args:
+        url (str): The card's Bandcamp URL
+        stage (str): Stage name, e.g. 'enrich' or 'publish:mastodon'
+        output: JSON-serializable output of the stage
+    """
+    now = time.time()
+    ttl = get_checkpoint_ttl()
+    with cache_lock:
+        checkpoints = load_media_cache(CHECKPOINT_CACHE_NAME)
+        for key in [key for key, entry in checkpoints.items() if now - entry.get('updated_at', 0) > ttl]:
+            del checkpoints[key]
+        entry = checkpoints.setdefault(checkpoint_key(url), {'url': url, 'stages': {}})
+        entry['stages'][stage] = output
+        entry['updated_at'] = now
+        save_media_cache(CHECKPOINT_CACHE_NAME, checkpoints)
+
+def clear_checkpoint(url):
+    """Forget every stage of a card so the next run starts from scratch."""
+    with cache_lock:
+        checkpoints = load_media_cache(CHECKPOINT_CACHE_NAME)
+        if checkpoints.pop(checkpoint_key(url), None) is not None:
+            save_media_cache(CHECKPOINT_CACHE_NAME, checkpoints)
+
+def first_incomplete_stage(stages):
+    """
+    Return the first stage of STAGES without a checkpoint.
+
+    'publish' counts as complete once any platform has been published to.
+    """
+    for stage in STAGES:
+        if stage == 'publish':
+            if not any(name.startswith('publish:') for name in stages):
+                return stage
+        elif stage not in stages:
+            return stage
+    return None
@@ -1,57 +1,105 @@
 import os
 import re
-import requests
-from bs4 import BeautifulSoup
+import json
+import logging
+import functools
+import argparse
 from datetime import datetime
 import pytz
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import shutil
-from urllib.parse import urlparse, quote_plus
+from urllib.parse import urlparse, urljoin
 from dotenv import load_dotenv
-from googleapiclient.discovery import build
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.core.os_manager import ChromeType
 import time
-from instagram_poster import create_instagram_post
-
-# Try to import mastodon_poster, but don't fail if it's not available
-try:
-    from mastodon_poster import create_mastodon_post
-    MASTODON_AVAILABLE = True
-except ImportError:
-    MASTODON_AVAILABLE = False
-    print("Note: Mastodon posting not available (mastodon.py not installed)")
-
-# Try to import bluesky_poster, but don't fail if it's not available
-try:
-    from bluesky_poster import create_bluesky_post
-    BLUESKY_AVAILABLE = True
-except ImportError:
-    BLUESKY_AVAILABLE = False
-    print("Note: Bluesky posting not available (atproto not installed)")
+from hashtags import get_track_hashtags
+from track_frontmatter import read_frontmatter, format_frontmatter_list, format_frontmatter_value, update_frontmatter
+from page_archive import archive_page, archive_enabled
+from image_derivatives import derivatives_enabled, update_image_derivatives
+from artwork_index import dedup_enabled, find_duplicate, remember_artwork
+from posters import get_registered_posters, is_poster_available, load_poster
+from card_renderer import post_image_path
+from chromedriver_resolver import resolve_chromedriver, forget_resolution
+from stations import get_setting, get_hero_image_base_url, set_default_station, take_post_budget, refund_post_budget
+from card_checkpoints import load_checkpoint, get_stage, save_stage, clear_checkpoint, first_incomplete_stage
+from tracing import span, traced, enable_tracing, write_trace, format_report
+from logging_config import setup_logging
+from metrics import inc, measure, measured, setup_metrics
+from http_cassettes import setup_cassettes, is_replaying, replay_page, record_page
+
+# requests, BeautifulSoup, Selenium, spotipy, googleapiclient and the posters are
+# imported inside the functions that use them so startup stays fast.
+
+logger = logging.getLogger('cardcreator')
+
+_http_session = None
+
+# Frontmatter fields filled from the Bandcamp page -> key in the parsed track.
+# These are the fields `page_archive.py reextract` may backfill.
+EXTRACTED_FIELDS = {
+    'tags': 'tags',
+    'releaseDate': 'release_date',
+    'credits': 'credits',
+}
+
+REVIEW_PLACEHOLDER = "Write your track review here. Keep it concise but descriptive. Focus on the sound, mood, and impact of the track."
+
+def get_http_session():
+    """Return a shared requests session so repeated downloads reuse connections."""
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+    return _http_session
 
 def get_pacific_time():
     pacific = pytz.timezone('US/Pacific')
     return datetime.now(pacific).strftime('%Y-%m-%d')
 
+@traced()
+@measured('cardcreator_image_downloads', help="Artwork downloads", success=lambda path: path is not None)
 def download_image(url, filename):
-    """Download image from URL and save to specified path."""
+    """
+    Download image from URL and save to specified path.
+    
+    If artwork that looks the same is already in IMAGE_OUTPUT_PATH (see
+    artwork_index.py), nothing is written and the existing file's path is
+    returned instead, so callers should take the file name from the result.
+    """
     try:
-        response = requests.get(url)
+        response = get_http_session().get(url, timeout=30)
         if response.status_code == 200:
-            base_path = os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH'))
+            base_path = os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH'))
             full_path = os.path.join(base_path, os.path.basename(filename))
             os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            inc('cardcreator_image_download_bytes_total', len(response.content), help="Bytes of artwork downloaded")
+            
+            image_hash = None
+            if dedup_enabled():
+                try:
+                    with span('image.dedup'):
+                        existing, image_hash = find_duplicate(base_path, response.content, os.path.basename(full_path))
+                    if existing:
+                        inc('cardcreator_image_duplicates_total', help="Downloads that reused existing artwork")
+                        logger.info("Reusing existing artwork: %s", existing, extra={'path': os.path.join(base_path, existing), 'url': url})
+                        return os.path.join(base_path, existing)
+                except Exception as e:
+                    logger.warning("Could not check for duplicate artwork: %s", e, extra={'url': url})
+            
             with open(full_path, 'wb') as f:
                 f.write(response.content)
-            print(f"Image saved to: {full_path}")
+            logger.info("Image saved to: %s", full_path, extra={'path': full_path, 'bytes': len(response.content)})
+            if image_hash is not None:
+                try:
+                    remember_artwork(base_path, os.path.basename(full_path), image_hash)
+                except Exception as e:
+                    logger.warning("Could not add artwork to the index: %s", e, extra={'path': full_path})
+            if derivatives_enabled():
+                try:
+                    with span('image.derivatives'):
+                        update_image_derivatives(full_path)
+                except Exception as e:
+                    logger.warning("Could not create image derivatives: %s", e, extra={'path': full_path})
             return full_path
     except Exception as e:
-        print(f"Error downloading image: {e}")
+        logger.error("Error downloading image: %s", e, extra={'url': url})
     return None
 
 def extract_label_from_url(url):
@@ -62,8 +110,28 @@ def extract_label_from_url(url):
     label = label.replace('_', ' ')
     return label.title()
 
+@functools.lru_cache(maxsize=None)
+def get_youtube_client(api_key):
+    """Build the YouTube Data API client once per API key."""
+    from googleapiclient.discovery import build
+    
+    return build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+
+@functools.lru_cache(maxsize=None)
+def get_spotify_client(client_id, client_secret):
+    """Create the Spotify client once per set of credentials (it refreshes its own token)."""
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+    
+    return spotipy.Spotify(auth_manager=SpotifyClientCredentials(
+        client_id=client_id,
+        client_secret=client_secret
+    ))
+
+@traced()
+@measured('cardcreator_api_calls', help="External API calls", api='youtube')
 def search_youtube_api(query, api_key):
-    youtube = build('youtube', 'v3', developerKey=api_key)
+    youtube = get_youtube_client(api_key)
     request = youtube.search().list(
         part='snippet',
         q=query,
@@ -71,13 +139,14 @@ def search_youtube_api(query, api_key):
         type='video'
     )
     response = request.execute()
+    # search.list costs 100 units of the daily YouTube Data API quota
+    inc('cardcreator_youtube_quota_units_total', 100, help="YouTube Data API quota units used")
     return [(item['snippet']['title'], item['snippet']['channelTitle'], f"https://www.youtube.com/watch?v={item['id']['videoId']}") for item in response['items']]
 
+@traced()
+@measured('cardcreator_api_calls', help="External API calls", api='spotify')
 def search_spotify(query, client_id, client_secret):
-    sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-        client_id=client_id,
-        client_secret=client_secret
-    ))
+    sp = get_spotify_client(client_id, client_secret)
     results = sp.search(q=query, limit=5, type='track')
     return [(track['name'], track['external_urls']['spotify']) 
             for track in results['tracks']['items']]
@@ -88,20 +157,20 @@ def sanitize_filename(name):
 
 def validate_paths():
     """Validate that required paths exist and are writable."""
-    markdown_path = os.path.expanduser(os.getenv('MARKDOWN_OUTPUT_PATH', ''))
-    image_path = os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH', ''))
+    markdown_path = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    image_path = os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH', ''))
     
     if not markdown_path or not image_path:
-        print("Error: MARKDOWN_OUTPUT_PATH and IMAGE_OUTPUT_PATH must be set in .env file")
+        logger.error("Error: MARKDOWN_OUTPUT_PATH and IMAGE_OUTPUT_PATH must be set in .env file")
         return False
     
     # Check if paths exist
     if not os.path.exists(markdown_path):
-        print(f"Error: Markdown output path does not exist: {markdown_path}")
+        logger.error("Error: Markdown output path does not exist: %s", markdown_path)
         return False
         
     if not os.path.exists(image_path):
-        print(f"Error: Image output path does not exist: {image_path}")
+        logger.error("Error: Image output path does not exist: %s", image_path)
         return False
     
     # Check if paths are writable
@@ -118,12 +187,25 @@ def validate_paths():
             f.write('test')
         os.remove(test_file)
     except Exception as e:
-        print(f"Error: Paths are not writable: {e}")
+        logger.error("Error: Paths are not writable: %s", e)
         return False
     
     return True
 
-def create_track_file(url):
+def create_chrome_driver():
+    """
+    Start a headless Chrome for scraping Bandcamp pages.
+    
+    Returns None when an HTTP cassette is replayed (see http_cassettes.py),
+    since load_page() then takes the pages from the cassette.
+    """
+    if is_replaying():
+        return None
+    
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    
     # Set up Chrome options
     chrome_options = Options()
     chrome_options.add_argument('--headless=new')  # Use new headless mode
@@ -132,196 +214,672 @@ def create_track_file(url):
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--window-size=1920,1080')
     chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36')
+    
+    # Use the driver matching the installed browser (remembered between runs)
+    with span('chrome.resolve'):
+        resolution = resolve_chromedriver()
+    if resolution['chrome_binary']:
+        chrome_options.binary_location = resolution['chrome_binary']
+    with span('chrome.start'):
+        try:
+            # Without a driver path, Selenium Manager finds one itself
+            return webdriver.Chrome(service=Service(resolution['driver_path']), options=chrome_options)
+        except Exception:
+            if not resolution['driver_path'] or os.getenv('CHROMEDRIVER_PATH'):
+                raise
+            # The browser may have updated past the remembered driver; resolve again once
+            logger.warning("ChromeDriver %s failed to start Chrome; resolving again", resolution['driver_path'])
+            forget_resolution()
+            resolution = resolve_chromedriver()
+            return webdriver.Chrome(service=Service(resolution['driver_path']), options=chrome_options)
 
-    try:
-        # Initialize the Chrome driver with specific configuration for Mac ARM64
-        chromedriver_path = os.path.expanduser("~/.wdm/drivers/chromedriver/mac64/137.0.7151.119/chromedriver-mac-arm64/chromedriver")
-        service = Service(chromedriver_path)
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # Load the page
-        print(f"Loading URL: {url}")
-        driver.get(url)
+def is_album_url(url):
+    """Check whether a Bandcamp URL points at an album (release) page."""
+    return urlparse(url).path.startswith('/album/')
+
+def load_page(url, driver):
+    """
+    Load a Bandcamp page in the browser and return its HTML.
+    
+    Args:
+        url (str): Page URL
+        driver (WebDriver): Browser to load it in (None when replaying a cassette)
         
-        # Wait for the page to load
-        time.sleep(3)
+    Returns:
+        str: Page source once the page has rendered
+    """
+    logger.info("Loading URL: %s", url)
+    with span('page.load', url=url):
+        page_source = replay_page(url)
+        if page_source is None:
+            start = time.perf_counter()
+            driver.get(url)
+            
+            # Wait for the page to load
+            time.sleep(3)
+            
+            # Get the page source
+            page_source = driver.page_source
+            record_page(url, page_source, time.perf_counter() - start)
+    
+    # Keep a copy so the catalog can be re-extracted later without the network
+    if archive_enabled():
+        try:
+            archive_page(url, page_source)
+        except Exception as e:
+            logger.warning("Could not archive %s: %s", url, e)
+    return page_source
+
+def _parse_name_section(soup):
+    """Return (title, artist, artist link) from a track or album page's name-section."""
+    # Find the name-section div
+    name_section = soup.find('div', id='name-section')
+    
+    # Extract title from h2 in name-section
+    title = None
+    artist = None
+    artist_link = ""
+    
+    if name_section:
+        # Get title from h2
+        title_element = name_section.find('h2', class_='trackTitle')
+        if title_element:
+            # Clean up title text
+            title = ' '.join(title_element.text.split())
         
-        # Get the page source
-        page_source = driver.page_source
+        # Get artist from h3.albumTitle
+        album_title = name_section.find('h3', class_='albumTitle')
+        if album_title:
+            # Find all spans in the album title
+            spans = album_title.find_all('span')
+            # The last span contains the artist link
+            if spans:
+                last_span = spans[-1]
+                artist_link_element = last_span.find('a')
+                if artist_link_element:
+                    # Clean up artist name and link
+                    artist = ' '.join(artist_link_element.text.split())
+                    artist_link = artist_link_element['href'].strip()
+    
+    # Debug output
+    logger.debug("Raw HTML for name-section: %s", name_section)
+    return title, artist, artist_link
+
+def _parse_hero_image(soup):
+    # Get hero image with more reliable selector
+    image_element = soup.find('a', class_='popupImage') or soup.find('div', class_='tralbumArt')
+    if image_element:
+        if image_element.name == 'a':
+            return image_element['href']
+        img_tag = image_element.find('img')
+        if img_tag and 'src' in img_tag.attrs:
+            return img_tag['src']
+    return "https://f4.bcbits.com/img/a1234567890_16.jpg"
+
+def _parse_tags(soup):
+    # Get genre/location tags listed on the page
+    tags = []
+    for tag_element in soup.find_all('a', class_='tag'):
+        tag = ' '.join(tag_element.text.split())
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+def _parse_release_date(soup, tralbum):
+    """Return the release date as YYYY-MM-DD, or None if the page doesn't show one."""
+    for value in (tralbum.get('album_release_date'), (tralbum.get('current') or {}).get('release_date')):
+        if value:
+            try:
+                return datetime.strptime(value, '%d %b %Y %H:%M:%S %Z').strftime('%Y-%m-%d')
+            except ValueError:
+                pass
+    meta = soup.find('meta', itemprop='datePublished')
+    if meta and meta.get('content'):
+        try:
+            return datetime.strptime(meta['content'], '%Y%m%d').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return None
+
+def _parse_credits(soup):
+    """Return the release credits as one line, without the "released ..." line."""
+    element = soup.find('div', class_='tralbum-credits')
+    if element is None:
+        return None
+    lines = [' '.join(line.split()) for line in element.get_text('\n').split('\n')]
+    lines = [line for line in lines if line and not line.lower().startswith('released ')]
+    return ' / '.join(lines) or None
+
+def _parse_tralbum_data(soup):
+    """Return the JSON release data Bandcamp embeds in the page, if present."""
+    element = soup.find(attrs={'data-tralbum': True})
+    if element is None:
+        return {}
+    try:
+        return json.loads(element['data-tralbum'])
+    except ValueError:
+        return {}
+
+def parse_track_page(page_source, url):
+    """
+    Extract a track's details from a Bandcamp track page.
+    
+    Returns:
+        dict: title, artist, artist_link, hero_image, tags, release_date and
+            credits (None if not shown), or None if the
+            title, artist or artist link is missing
+    """
+    from bs4 import BeautifulSoup
+    
+    with span('page.parse'):
         soup = BeautifulSoup(page_source, 'html.parser')
+        title, artist, artist_link = _parse_name_section(soup)
+        track = {
+            'title': title,
+            'artist': artist,
+            'artist_link': artist_link,
+            'hero_image': _parse_hero_image(soup),
+            'tags': _parse_tags(soup),
+            'release_date': _parse_release_date(soup, _parse_tralbum_data(soup)),
+            'credits': _parse_credits(soup),
+        }
+    
+    logger.info("Scraped Title: %s", title or "Unknown Title")
+    logger.info("Scraped Artist: %s", artist or "Unknown Artist")
+    logger.info("Scraped Artist Link: %s", artist_link)
+    logger.info("Scraped Tags: %s", ', '.join(track['tags']))
+    
+    # Validate required information
+    if not title:
+        logger.error("\nError: Could not find track title. Please check the URL and try again.", extra={'url': url})
+        return None
+    if not artist:
+        logger.error("\nError: Could not find artist name. Please check the URL and try again.", extra={'url': url})
+        return None
+    if not artist_link:
+        logger.error("\nError: Could not find artist link. Please check the URL and try again.", extra={'url': url})
+        return None
+    return track
+
+def parse_album_page(page_source, url):
+    """
+    Extract the release details and track list from a Bandcamp album page.
+    
+    The track list comes from the release data embedded in the page, falling
+    back to the visible track table.
+    
+    Returns:
+        dict: title, artist, artist_link, hero_image, tags, release_date,
+            credits and tracks (each with
+            title, url and artist, which is None unless the track credits its own
+            artist), or None if the album title or artist is missing
+    """
+    from bs4 import BeautifulSoup
+    
+    with span('page.parse'):
+        soup = BeautifulSoup(page_source, 'html.parser')
+        title, artist, artist_link = _parse_name_section(soup)
+        tralbum = _parse_tralbum_data(soup)
         
-        # Find the name-section div
-        name_section = soup.find('div', id='name-section')
-        
-        # Extract title from h2 in name-section
-        title = "Unknown Title"
-        artist = "Unknown Artist"
-        artist_link = ""
+        tracks = []
+        for info in tralbum.get('trackinfo') or []:
+            link = info.get('title_link')
+            tracks.append({
+                'title': ' '.join((info.get('title') or '').split()) or None,
+                'url': urljoin(url, link) if link else None,
+                'artist': info.get('artist') or None,
+            })
         
-        if name_section:
-            # Get title from h2
-            title_element = name_section.find('h2', class_='trackTitle')
-            if title_element:
-                # Clean up title text
-                title = ' '.join(title_element.text.split())
-            
-            # Get artist from h3.albumTitle
-            album_title = name_section.find('h3', class_='albumTitle')
-            if album_title:
-                # Find all spans in the album title
-                spans = album_title.find_all('span')
-                # The last span contains the artist link
-                if spans:
-                    last_span = spans[-1]
-                    artist_link_element = last_span.find('a')
-                    if artist_link_element:
-                        # Clean up artist name and link
-                        artist = ' '.join(artist_link_element.text.split())
-                        artist_link = artist_link_element['href'].strip()
+        if not tracks:
+            for row in soup.select('#track_table tr.track_row_view'):
+                title_element = row.find('span', class_='track-title')
+                link_element = row.select_one('div.title a') or row.find('a', href=re.compile(r'/track/'))
+                tracks.append({
+                    'title': ' '.join(title_element.text.split()) if title_element else None,
+                    'url': urljoin(url, link_element['href']) if link_element else None,
+                    'artist': None,
+                })
         
-        # Debug print statements
-        print("Raw HTML for name-section:", name_section)
-        print(f"Scraped Title: {title}")
-        print(f"Scraped Artist: {artist}")
-        print(f"Scraped Artist Link: {artist_link}")
+        album = {
+            'title': title,
+            'artist': artist,
+            'artist_link': artist_link or f"{urlparse(url).scheme}://{urlparse(url).netloc}",
+            'hero_image': _parse_hero_image(soup),
+            'tags': _parse_tags(soup),
+            'release_date': _parse_release_date(soup, tralbum),
+            'credits': _parse_credits(soup),
+            'tracks': tracks,
+        }
+    
+    logger.info("Scraped Album: %s by %s (%d tracks)", title, artist, len(tracks))
+    if not title or not artist:
+        logger.error("\nError: Could not find album title or artist. Please check the URL and try again.", extra={'url': url})
+        return None
+    return album
+
+def write_track_file(track, url, image_filename):
+    """
+    Write a track's markdown card.
+    
+    Args:
+        track (dict): title, artist, artist_link, tags and optionally
+            release_date and credits
+        url (str): The track's Bandcamp URL
+        image_filename (str): Artwork file name used for heroImage
         
-        # Validate required information
-        if title == "Unknown Title":
-            print("\nError: Could not find track title. Please check the URL and try again.")
-            return None, None, None
+    Returns:
+        str: Path of the markdown file
+    """
+    # Get label from URL
+    label = extract_label_from_url(url)
+    parsed = urlparse(url)
+    label_link = f"{parsed.scheme}://{parsed.netloc}"
+    
+    # Get today's date in Pacific time
+    pub_date = get_pacific_time()
+    
+    # Release date and credits are only written when the page has them
+    optional_fields = ''.join(
+        f"{key}: {format_frontmatter_value(track[source_key])}\n"
+        for key, source_key in EXTRACTED_FIELDS.items()
+        if key != 'tags' and track.get(source_key)
+    )
+    
+    # Create the markdown content
+    # Values are quoted with format_frontmatter_value so titles with " or \ stay valid YAML
+    content = f"""---
+title: {format_frontmatter_value(track['title'])}
+artist: {format_frontmatter_value(track['artist'])}
+artistLink: {format_frontmatter_value(track['artist_link'])}
+label: {format_frontmatter_value(label)}
+labelLink: {format_frontmatter_value(label_link)}
+heroImage: {format_frontmatter_value(get_hero_image_base_url() + image_filename)}
+pubDate: {pub_date}
+bandcamp: {format_frontmatter_value(url)}
+youtube: ""
+spotify: ""
+tags: {format_frontmatter_list(track['tags'])}
+{optional_fields}---
+
+{REVIEW_PLACEHOLDER}
+"""
+    
+    # Write to file
+    output_filename = f"{sanitize_filename(track['title'].lower())}.md"
+    base_path = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH'))
+    filepath = os.path.join(base_path, output_filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'w') as f:
+        f.write(content)
+    
+    logger.info("Markdown file created: %s", filepath, extra={'path': filepath, 'url': url})
+    return filepath
+
+@traced()
+@measured('cardcreator_scrapes', help="Bandcamp track scrapes", success=lambda track: track is not None)
+def scrape_track(url, driver=None, download=True):
+    """
+    Scrape a Bandcamp track page and write its markdown card (and artwork).
+    
+    Args:
+        url (str): Bandcamp track URL
+        driver (WebDriver, optional): Browser to reuse; if not given, a new
+            Chrome is started and closed again afterwards
+        download (bool): Also download the artwork before writing the card
         
-        if artist == "Unknown Artist":
-            print("\nError: Could not find artist name. Please check the URL and try again.")
-            return None, None, None
-            
-        if not artist_link:
-            print("\nError: Could not find artist link. Please check the URL and try again.")
-            return None, None, None
+    Returns:
+        dict: The scraped track plus image_filename and markdown_path, or
+            None on failure
+    """
+    owns_driver = driver is None
+    try:
+        if owns_driver:
+            driver = create_chrome_driver()
         
-        # Get label from URL
-        label = extract_label_from_url(url)
-        label_link = url.split('/track/')[0]
+        track = parse_track_page(load_page(url, driver), url)
+        if track is None:
+            return None
         
         # Sanitize file name for image and markdown
-        sanitized_title = sanitize_filename(title.lower())
-        image_filename = f"{sanitized_title}.jpg"
-        
-        # Get hero image with more reliable selector
-        hero_image = None
-        image_element = soup.find('a', class_='popupImage') or soup.find('div', class_='tralbumArt')
-        if image_element:
-            if image_element.name == 'a':
-                hero_image = image_element['href']
-            else:
-                img_tag = image_element.find('img')
-                if img_tag and 'src' in img_tag.attrs:
-                    hero_image = img_tag['src']
+        track['image_filename'] = f"{sanitize_filename(track['title'].lower())}.jpg"
+        if download:
+            image_path = download_image(track['hero_image'], track['image_filename'])
+            if image_path:
+                # May be existing artwork reused instead of a new file
+                track['image_filename'] = os.path.basename(image_path)
         
-        if not hero_image:
-            hero_image = "https://f4.bcbits.com/img/a1234567890_16.jpg"
+        track['markdown_path'] = write_track_file(track, url, track['image_filename'])
+        return track
         
-        # Create images/tracks directory if it doesn't exist
-        os.makedirs('images/tracks', exist_ok=True)
+    except Exception as e:
+        logger.error("Error during scraping: %s", e, extra={'url': url})
+        return None
         
-        download_image(hero_image, image_filename)
+    finally:
+        # Always close a driver we started
+        if owns_driver:
+            try:
+                driver.quit()
+            except:
+                pass
+
+def create_track_file(url, driver=None):
+    """
+    Scrape a Bandcamp track page and write its markdown card and artwork.
+    
+    Args:
+        url (str): Bandcamp track URL
+        driver (WebDriver, optional): Browser to reuse; if not given, a new
+            Chrome is started and closed again afterwards
         
-        # Get today's date in Pacific time
-        pub_date = get_pacific_time()
+    Returns:
+        tuple: (markdown file path, title, artist), or (None, None, None) on failure
+    """
+    track = scrape_track(url, driver)
+    if track is None:
+        return None, None, None
+    return track['markdown_path'], track['title'], track['artist']
+
+def parse_track_selection(selection, count):
+    """
+    Parse a track selection like "1,3-5" or "all" into zero-based indexes.
+    
+    Args:
+        selection (str): Comma-separated track numbers and ranges, or "all"
+        count (int): Number of tracks on the album
         
-        # Create the markdown content
-        content = f"""---
-title: "{title}"
-artist: "{artist}"
-artistLink: "{artist_link}"
-label: "{label}"
-labelLink: "{label_link}"
-heroImage: "https://static.kdzu.org/images/tracks/{image_filename}"
-pubDate: {pub_date}
-bandcamp: "{url}"
-youtube: ""
-spotify: ""
----
+    Returns:
+        list: Sorted track indexes
+    """
+    selection = (selection or '').strip().lower()
+    if selection in ('', 'all', '*'):
+        return list(range(count))
+    
+    indexes = set()
+    for part in selection.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        start = int(start)
+        end = int(end) if end else start
+        if start < 1 or end > count or start > end:
+            raise ValueError(f"Track numbers must be between 1 and {count}: {part}")
+        indexes.update(range(start - 1, end))
+    return sorted(indexes)
 
-Write your track review here. Keep it concise but descriptive. Focus on the sound, mood, and impact of the track.
-"""
+@traced()
+def create_album_track_files(url, driver=None, selection=None, select=None):
+    """
+    Create cards for tracks of a Bandcamp album from a single album page load.
+    
+    The track list, tags and artwork are taken from the album page and the
+    artwork is downloaded once and shared by all cards. A track page is only
+    loaded when the album page lacks that track's title or artist (e.g. on
+    various-artists compilations that don't credit tracks individually).
+    
+    Args:
+        url (str): Bandcamp album URL
+        driver (WebDriver, optional): Browser to reuse
+        selection (str, optional): Tracks to create, e.g. "1,3-5" (default: all)
+        select (callable, optional): Called with the album details to choose
+            the selection interactively; overrides selection
         
-        # Write to file
-        output_filename = f"{sanitized_title}.md"
-        base_path = os.path.expanduser(os.getenv('MARKDOWN_OUTPUT_PATH'))
-        filepath = os.path.join(base_path, output_filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            f.write(content)
+    Returns:
+        list: (markdown file path, title, artist, track url) for each card created
+    """
+    owns_driver = driver is None
+    try:
+        if owns_driver:
+            driver = create_chrome_driver()
+        
+        album = parse_album_page(load_page(url, driver), url)
+        if album is None:
+            return []
+        if not album['tracks']:
+            logger.error("Error: No tracks found on album page", extra={'url': url})
+            return []
+        
+        if select is not None:
+            selection = select(album)
+        indexes = parse_track_selection(selection, len(album['tracks']))
+        
+        # One artwork file for the whole release
+        image_path = download_image(album['hero_image'], f"{sanitize_filename(album['title'].lower())}.jpg")
+        if not image_path:
+            return []
+        image_filename = os.path.basename(image_path)
         
-        print(f"Markdown file created: {filepath}")
-        return filepath, title, artist
+        various_artists = album['artist'].lower().startswith('various')
+        cards = []
+        for index in indexes:
+            entry = album['tracks'][index]
+            track = {
+                'title': entry['title'],
+                'artist': entry['artist'] or (None if various_artists else album['artist']),
+                'artist_link': album['artist_link'],
+                'tags': album['tags'],
+                'release_date': album['release_date'],
+                'credits': album['credits'],
+            }
+            track_url = entry['url'] or url
+            
+            if (not track['title'] or not track['artist']) and entry['url']:
+                with measure('cardcreator_scrapes', help="Bandcamp track scrapes"):
+                    page_track = parse_track_page(load_page(entry['url'], driver), entry['url'])
+                if page_track:
+                    track.update({key: page_track[key] for key in ('title', 'artist', 'artist_link')})
+                    track['release_date'] = page_track['release_date'] or album['release_date']
+                    track['credits'] = page_track['credits'] or album['credits']
+                    track['tags'] = page_track['tags'] or album['tags']
+            
+            if not track['title'] or not track['artist']:
+                logger.error("Error: Missing title or artist for track %d, skipping", index + 1, extra={'url': track_url})
+                continue
+            
+            filepath = write_track_file(track, track_url, image_filename)
+            cards.append((filepath, track['title'], track['artist'], track_url))
+        return cards
         
     except Exception as e:
-        print(f"Error during scraping: {str(e)}")
-        return None, None, None
+        logger.error("Error during album scraping: %s", e, extra={'url': url})
+        return []
         
     finally:
-        # Always close the driver
+        if owns_driver:
+            try:
+                driver.quit()
+            except:
+                pass
+
+def add_links_to_track_file(filepath, youtube_link=None, spotify_link=None):
+    """
+    Fill the empty YouTube and Spotify links in a track file's frontmatter.
+    
+    Args:
+        filepath (str): Path to the markdown file
+        youtube_link (str, optional): Selected YouTube URL
+        spotify_link (str, optional): Selected Spotify URL
+    """
+    with open(filepath, 'r') as f:
+        content = f.read()
+    
+    if youtube_link:
+        content = content.replace('youtube: ""', f'youtube: {format_frontmatter_value(youtube_link)}')
+    if spotify_link:
+        content = content.replace('spotify: ""', f'spotify: {format_frontmatter_value(spotify_link)}')
+    
+    with open(filepath, 'w') as f:
+        f.write(content)
+
+def add_review_to_track_file(filepath, review):
+    """
+    Replace the review placeholder in a track file with the actual review.
+    
+    Args:
+        filepath (str): Path to the markdown file
+        review (str): Review text
+    """
+    with open(filepath, 'r') as f:
+        content = f.read()
+    
+    content = content.replace(REVIEW_PLACEHOLDER, review)
+    
+    with open(filepath, 'w') as f:
+        f.write(content)
+
+def get_image_path(markdown_path):
+    """
+    Return the artwork path that belongs to a track markdown file.
+    
+    The file name comes from the card's heroImage, since tracks from the same
+    album share one artwork file.
+    """
+    hero_image = read_frontmatter(markdown_path).get('heroImage')
+    if hero_image:
+        image_filename = os.path.basename(urlparse(hero_image).path)
+    else:
+        image_filename = os.path.basename(markdown_path).replace('.md', '.jpg')
+    return os.path.join(os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH')), image_filename)
+
+def select_album_tracks(album):
+    """Show an album's track list and ask which tracks to create cards for."""
+    print(f"\n{album['title']} by {album['artist']}:")
+    for i, track in enumerate(album['tracks'], 1):
+        artist = f" - {track['artist']}" if track['artist'] else ""
+        print(f"{i}. {track['title'] or 'Unknown Title'}{artist}")
+    while True:
+        selection = input("Select tracks (e.g. 1,3-5 or 'all'): ")
         try:
-            driver.quit()
-        except:
-            pass
+            parse_track_selection(selection, len(album['tracks']))
+            return selection
+        except ValueError as e:
+            print(e)
 
-def main():
-    # Load environment variables and validate paths
-    load_dotenv()
-    if not validate_paths():
-        return
-        
-    url = input("Enter the Bandcamp track URL: ")
+def prompt_choice(prompt, count):
+    """
+    Ask for a number between 1 and count until a valid one is given.
     
-    # Create the track file and get title/artist
-    output_file, title, artist = create_track_file(url)
-    if not output_file or not title or not artist:
-        print("\nScript stopped due to missing required information.")
-        return
-        
-    print(f"Image file created: {output_file}")
+    Returns:
+        int: Zero-based index, or None if the answer was left empty (skip)
+    """
+    while True:
+        answer = input(prompt).strip()
+        if not answer:
+            return None
+        if answer.isdigit() and 1 <= int(answer) <= count:
+            return int(answer) - 1
+        print(f"Please enter a number between 1 and {count}, or press Enter to skip.")
+
+def scrape_stage(url):
+    """
+    Scrape a track page and write its markdown card, unless a checkpoint has it.
+    
+    Returns:
+        dict: The scraped track plus markdown_path and image_filename, or None
+    """
+    track = get_stage(url, 'scrape')
+    if track and os.path.exists(track['markdown_path']):
+        return track
+    
+    with span('stage.scrape'):
+        # The artwork is downloaded (and checkpointed) separately by image_stage
+        track = scrape_track(url, download=False)
+    if track is None:
+        return None
+    save_stage(url, 'scrape', track)
+    return track
+
+def image_stage(url, track):
+    """
+    Download a track's artwork, unless it was already downloaded.
+    
+    Returns:
+        str: Local image path, or None if the download failed
+    """
+    image_path = get_stage(url, 'image')
+    if image_path and os.path.exists(image_path):
+        return image_path
+    
+    with span('stage.image'):
+        image_path = download_image(track['hero_image'], track['image_filename'])
+        if image_path and os.path.basename(image_path) != track['image_filename']:
+            # Existing artwork was reused; point the card written by scrape_stage at it
+            update_frontmatter(track['markdown_path'], {'heroImage': f"{get_hero_image_base_url()}{os.path.basename(image_path)}"})
+    if image_path:
+        save_stage(url, 'image', image_path)
+    return image_path
+
+def enrich_stage(url, title, artist):
+    """
+    Search YouTube and Spotify and let the user pick a link from each.
+    
+    Search results are checkpointed (as 'search') before the selection
+    prompts, so a rerun after an interrupted selection doesn't spend API
+    quota again.
+    
+    Returns:
+        tuple: (YouTube link, Spotify link); either may be None
+    """
+    enrich = get_stage(url, 'enrich')
+    if enrich is not None:
+        return enrich['youtube'], enrich['spotify']
     
     # Build search query from scraped title and artist
     search_query = f"{title} {artist}"
+    search = get_stage(url, 'search') or {}
+    youtube_link = None
+    spotify_link = None
     
-    # Search YouTube using API
-    api_key = os.getenv('YOUTUBE_API_KEY')
-    if api_key:
-        print("\nYouTube search results:")
-        youtube_results = search_youtube_api(search_query, api_key)
-        for i, (yt_title, channel, link) in enumerate(youtube_results, 1):
-            print(f"{i}. {yt_title} - {channel}: {link}")
-        youtube_choice = int(input("Select a YouTube video (1-5): ")) - 1
-        youtube_link = youtube_results[youtube_choice][2]
-    else:
-        print("\nYouTube API key not found in .env. Skipping YouTube search.")
-        youtube_link = None
-    
-    # Search Spotify
-    client_id = os.getenv('SPOTIPY_CLIENT_ID')
-    client_secret = os.getenv('SPOTIPY_CLIENT_SECRET')
-    if client_id and client_secret:
-        print("\nSpotify search results:")
-        spotify_results = search_spotify(search_query, client_id, client_secret)
-        for i, (sp_title, link) in enumerate(spotify_results, 1):
-            print(f"{i}. {sp_title}: {link}")
-        spotify_choice = int(input("Select a Spotify track (1-5): ")) - 1
-        spotify_link = spotify_results[spotify_choice][1]
-    else:
-        print("\nSpotify credentials not found in .env. Skipping Spotify search.")
-        spotify_link = None
+    with span('stage.enrich'):
+        # Search YouTube using API
+        api_key = get_setting('YOUTUBE_API_KEY')
+        if api_key:
+            if 'youtube' not in search:
+                search['youtube'] = search_youtube_api(search_query, api_key)
+                save_stage(url, 'search', search)
+            youtube_results = search['youtube']
+            print("\nYouTube search results:")
+            for i, (yt_title, channel, link) in enumerate(youtube_results, 1):
+                print(f"{i}. {yt_title} - {channel}: {link}")
+            if youtube_results:
+                youtube_choice = prompt_choice(f"Select a YouTube video (1-{len(youtube_results)}): ", len(youtube_results))
+                if youtube_choice is not None:
+                    youtube_link = youtube_results[youtube_choice][2]
+        else:
+            logger.warning("\nYouTube API key not found in .env. Skipping YouTube search.")
+        
+        # Search Spotify
+        client_id = get_setting('SPOTIPY_CLIENT_ID')
+        client_secret = get_setting('SPOTIPY_CLIENT_SECRET')
+        if client_id and client_secret:
+            if 'spotify' not in search:
+                search['spotify'] = search_spotify(search_query, client_id, client_secret)
+                save_stage(url, 'search', search)
+            spotify_results = search['spotify']
+            print("\nSpotify search results:")
+            for i, (sp_title, link) in enumerate(spotify_results, 1):
+                print(f"{i}. {sp_title}: {link}")
+            if spotify_results:
+                spotify_choice = prompt_choice(f"Select a Spotify track (1-{len(spotify_results)}): ", len(spotify_results))
+                if spotify_choice is not None:
+                    spotify_link = spotify_results[spotify_choice][1]
+        else:
+            logger.warning("\nSpotify credentials not found in .env. Skipping Spotify search.")
     
-    # Update the markdown file with selected links
-    with open(output_file, 'r') as f:
-        content = f.read()
+    save_stage(url, 'enrich', {'youtube': youtube_link, 'spotify': spotify_link})
+    return youtube_link, spotify_link
+
+def review_stage(url):
+    """
+    Prompt for the track review, unless one was already written.
     
-    # Replace the empty YouTube and Spotify links in the frontmatter
-    if youtube_link:
-        content = content.replace('youtube: ""', f'youtube: "{youtube_link}"')
-    if spotify_link:
-        content = content.replace('spotify: ""', f'spotify: "{spotify_link}"')
+    Returns:
+        str: The review
+    """
+    review = get_stage(url, 'review')
+    if review is not None:
+        return review
     
     # Prompt for track review
     print("\nWrite your track review (press Enter THREE TIMES to finish):")
@@ -335,95 +893,207 @@ def main():
     
     # Join the review lines and remove the last empty line
     review = "\n".join(review_lines[:-1])
+    save_stage(url, 'review', review)
+    return review
+
+def publish_stage(url, output_file, title, artist, review, spotify_link, youtube_link, bandcamp_url=None):
+    """
+    Offer to post the card to each platform it hasn't been posted to yet.
     
-    # Replace the review placeholder with the actual review
-    content = content.replace("Write your track review here. Keep it concise but descriptive. Focus on the sound, mood, and impact of the track.", review)
-    
-    with open(output_file, 'w') as f:
-        f.write(content)
-    
-    print(f"\nReview has been added to {output_file}")
-    
-    # Ask if user wants to post to Instagram
-    post_to_instagram = input("\nWould you like to post this track to Instagram? (y/n): ").lower().strip() == 'y'
+    url is the card's checkpoint key; bandcamp_url is the link posted, if
+    different (album tracks without their own page).
+    """
+    image_path = get_image_path(output_file)
+    track_data = read_frontmatter(output_file)
+    hashtags = None
     
-    if post_to_instagram:
-        # Get the image path from the markdown content
-        image_filename = os.path.basename(output_file).replace('.md', '.jpg')
-        image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH')), image_filename)
+    # Ask about each registered poster; a poster's module is only imported once selected
+    for name, poster in get_registered_posters().items():
+        label = poster['label']
+        if get_stage(url, f'publish:{name}'):
+            print(f"\nAlready posted to {label}, skipping.")
+            continue
+        if not is_poster_available(name):
+            print(f"\n{label} posting not available. Install {poster['package']} to enable this feature.")
+            continue
         
-        if os.path.exists(image_path):
-            success = create_instagram_post(
-                image_path=image_path,
-                title=title,
-                artist=artist,
-                review=review,
-                bandcamp_url=url,
-                spotify_url=spotify_link,
-                youtube_url=youtube_link
-            )
-            if success:
-                print("Successfully posted to Instagram!")
-            else:
-                print("Failed to post to Instagram. Check the error message above.")
-        else:
-            print(f"Error: Image file not found at {image_path}")
-    
-    # Ask if user wants to post to Mastodon
-    if MASTODON_AVAILABLE:
-        post_to_mastodon = input("\nWould you like to post this track to Mastodon? (y/n): ").lower().strip() == 'y'
+        post_to_platform = input(f"\nWould you like to post this track to {label}? (y/n): ").lower().strip() == 'y'
+        if not post_to_platform:
+            continue
         
-        if post_to_mastodon:
-            # Get the image path from the markdown content
-            image_filename = os.path.basename(output_file).replace('.md', '.jpg')
-            image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH')), image_filename)
-            
-            if os.path.exists(image_path):
-                success = create_mastodon_post(
-                    image_path=image_path,
+        if not os.path.exists(image_path):
+            logger.error("Error: Image file not found at %s", image_path)
+            continue
+        
+        if not take_post_budget(name):
+            print(f"The hourly posting limit for {label} has been reached. Run again later to post.")
+            continue
+        
+        # Build hashtags once from the scraped tags for all platforms
+        if hashtags is None:
+            hashtags = get_track_hashtags(track_data.get('tags'), artist, track_data.get('label'))
+        
+        success = False
+        try:
+            create_post = load_poster(name)
+            with span(poster['function']), measure('cardcreator_posts', help="Social media posts", platform=name) as outcome:
+                success = create_post(
+                    image_path=post_image_path(poster, output_file, image_path),
                     title=title,
                     artist=artist,
                     review=review,
-                    bandcamp_url=url,
+                    bandcamp_url=bandcamp_url or url,
                     spotify_url=spotify_link,
-                    youtube_url=youtube_link
+                    youtube_url=youtube_link,
+                    hashtags=hashtags
                 )
-                if success:
-                    print("Successfully posted to Mastodon!")
-                else:
-                    print("Failed to post to Mastodon. Check the error message above.")
-            else:
-                print(f"Error: Image file not found at {image_path}")
-    else:
-        print("\nMastodon posting not available. Install mastodon.py to enable this feature.")
+                if not success:
+                    outcome['result'] = 'error'
+        finally:
+            # Only posts that went out count against the hourly limit
+            if not success:
+                refund_post_budget(name)
+        if success:
+            save_stage(url, f'publish:{name}', {'posted_at': datetime.now().isoformat(timespec='seconds')})
+            print(f"Successfully posted to {label}!")
+        else:
+            print(f"Failed to post to {label}. Check the error message above.")
+
+def create_card(restart=False):
+    """
+    Interactively create track cards and optionally post them.
+    
+    Each stage (scrape, image, enrich, review, publish per platform) is
+    checkpointed by Bandcamp URL, so entering the same URL again resumes at the
+    first incomplete stage instead of starting over.
     
-    # Ask if user wants to post to Bluesky
-    if BLUESKY_AVAILABLE:
-        post_to_bluesky = input("\nWould you like to post this track to Bluesky? (y/n): ").lower().strip() == 'y'
+    Args:
+        restart (bool): Ignore and discard any checkpoints for the URL
+    """
+    # Load environment variables and validate paths
+    load_dotenv()
+    if not validate_paths():
+        return
         
-        if post_to_bluesky:
-            # Get the image path from the markdown content
-            image_filename = os.path.basename(output_file).replace('.md', '.jpg')
-            image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH')), image_filename)
-            
-            if os.path.exists(image_path):
-                success = create_bluesky_post(
-                    image_path=image_path,
-                    title=title,
-                    artist=artist,
-                    review=review,
-                    bandcamp_url=url,
-                    spotify_url=spotify_link,
-                    youtube_url=youtube_link
-                )
-                if success:
-                    print("Successfully posted to Bluesky!")
-                else:
-                    print("Failed to post to Bluesky. Check the error message above.")
-            else:
-                print(f"Error: Image file not found at {image_path}")
-    else:
-        print("\nBluesky posting not available. Install atproto to enable this feature.")
+    url = input("Enter the Bandcamp track or album URL: ").strip()
+    if restart:
+        clear_checkpoint(url)
+    
+    if is_album_url(url):
+        cards = get_stage(url, 'scrape')
+        if not cards or not all(os.path.exists(card[0]) for card in cards):
+            cards = create_album_track_files(url, select=select_album_tracks)
+            if not cards:
+                logger.error("\nScript stopped due to missing required information.")
+                return
+            save_stage(url, 'scrape', cards)
+        for i, (output_file, title, artist, track_url) in enumerate(cards, 1):
+            # Tracks without their own page share the album URL, which holds the
+            # album's checkpoint; give each of them its own
+            key = f"{url}#track-{i}" if track_url == url else track_url
+            if restart:
+                clear_checkpoint(key)
+            print(f"\n=== Track {i} of {len(cards)}: {title} by {artist} ===")
+            print(f"Markdown file: {output_file}")
+            if not get_stage(key, 'scrape'):
+                save_stage(key, 'scrape', {'title': title, 'artist': artist, 'markdown_path': output_file})
+            finish_card(output_file, title, artist, track_url, key)
+        return
+    
+    stages = load_checkpoint(url)
+    resume_at = first_incomplete_stage(stages)
+    if stages and resume_at:
+        print(f"Resuming {stages['scrape']['title'] if 'scrape' in stages else url} at the {resume_at} stage.")
+    
+    # Create the track file and get title/artist
+    track = scrape_stage(url)
+    if not track:
+        logger.error("\nScript stopped due to missing required information.")
+        return
+    
+    if not image_stage(url, track):
+        logger.error("\nScript stopped: the artwork could not be downloaded. Run again to retry.")
+        return
+        
+    print(f"Markdown file: {track['markdown_path']}")
+    finish_card(track['markdown_path'], track['title'], track['artist'], url)
+
+def finish_card(output_file, title, artist, url, key=None):
+    """
+    Add links and a review to a created card, then offer to post it.
+    
+    Completed stages are taken from the card's checkpoint and re-applied to
+    the markdown file (which is a no-op if they are already in it).
+    
+    Args:
+        output_file (str): Path to the track's markdown file
+        title (str): Track title
+        artist (str): Artist name
+        url (str): The track's Bandcamp URL
+        key (str, optional): Checkpoint key, if not the URL
+    """
+    key = key or url
+    youtube_link, spotify_link = enrich_stage(key, title, artist)
+    
+    # Update the markdown file with selected links
+    add_links_to_track_file(output_file, youtube_link, spotify_link)
+    
+    review = review_stage(key)
+    
+    # Replace the review placeholder with the actual review
+    add_review_to_track_file(output_file, review)
+    
+    print(f"\nReview has been added to {output_file}")
+    
+    publish_stage(key, output_file, title, artist, review, spotify_link, youtube_link, bandcamp_url=url)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create a KDZU track card from a Bandcamp URL.")
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='',
+        metavar='TRACE_FILE',
+        help="time each stage; writes a JSON trace (default: cardcreator-trace-<timestamp>.json)"
+    )
+    parser.add_argument(
+        '--watch',
+        metavar='INBOX',
+        help="follow an inbox file or directory of Bandcamp URLs and create a card for each new entry"
+    )
+    parser.add_argument('--workers', type=int, default=None, help="cards scraped at once in --watch mode")
+    parser.add_argument('--restart', action='store_true', help="ignore saved progress for the URL and start over")
+    parser.add_argument('--station', default=None, help="station profile to use (see stations.py; default: STATION)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv()
+    setup_logging()
+    setup_metrics()
+    setup_cassettes()
+    try:
+        set_default_station(args.station)
+    except ValueError as e:
+        logger.error("Error: %s", e)
+        return
+    if args.watch:
+        from inbox_watcher import watch_inbox, DEFAULT_WORKERS
+        watch_inbox(args.watch, workers=args.workers or int(os.getenv('INBOX_WORKERS', DEFAULT_WORKERS)), station=args.station)
+        return
+    if args.profile is None:
+        create_card(restart=args.restart)
+        return
+    
+    enable_tracing()
+    try:
+        with span('card'):
+            create_card(restart=args.restart)
+    finally:
+        trace_path = args.profile or f"cardcreator-trace-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        write_trace(trace_path)
+        print(f"\nProfile (trace written to {trace_path}):")
+        print(format_report())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,451 @@
+"""
+Render social card images: the track artwork with title, artist, label and
+KDZU branding, sized for each platform.
+
+Fonts, background templates and text layouts are cached per process, so
+after the first card each render is mostly resizing the artwork and drawing
+a few lines of text. Cards are written to CARD_IMAGE_OUTPUT_PATH (default
+IMAGE_OUTPUT_PATH/cards) as <card name>-<format>.jpg:
+
+    python card_renderer.py render ~/kdzu/tracks/some-track.md --format instagram --format landscape
+    python card_renderer.py week 2026-W41 --workers 8   # every card published that week
+    python card_renderer.py bench --cards 48            # throughput on synthetic artwork
+
+When publishing, posters whose manifest entry has a card_format (Instagram)
+post the rendered card instead of the bare artwork; set CARD_IMAGES=0 to
+turn that off. Requires Pillow (pip install Pillow).
+"""
+import os
+import time
+import logging
+import argparse
+import functools
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.renderer')
+
+CARD_FORMATS = {
+    'instagram': (1080, 1350),
+    'square': (1080, 1080),
+    'story': (1080, 1920),
+    'landscape': (1200, 675),
+}
+DEFAULT_FORMATS = ('instagram',)
+BRAND_NAME = 'KDZU'
+BRAND_TAGLINE = 'Tracks We Love'
+DEFAULT_BRAND_COLOR = '#e4412b'
+BACKGROUND_COLOR = '#111111'
+TEXT_COLOR = '#ffffff'
+MUTED_COLOR = '#b3b3b3'
+# Tried in order when CARD_FONT / CARD_FONT_BOLD aren't set
+FONT_CANDIDATES = {
+    'regular': ('DejaVuSans.ttf', '/System/Library/Fonts/Supplemental/Arial.ttf', 'Arial.ttf'),
+    'bold': ('DejaVuSans-Bold.ttf', '/System/Library/Fonts/Supplemental/Arial Bold.ttf', 'Arial Bold.ttf'),
+}
+JPEG_QUALITY = 90
+
+def card_images_enabled():
+    """Post rendered cards where a poster asks for them, unless CARD_IMAGES is 0 or Pillow is missing."""
+    return (os.getenv('CARD_IMAGES', '1').lower() not in ('0', 'false', 'no', 'off')
+            and importlib.util.find_spec('PIL') is not None)
+
+def get_card_output_dir():
+    output_dir = get_setting('CARD_IMAGE_OUTPUT_PATH')
+    if output_dir:
+        return os.path.expanduser(output_dir)
+    return os.path.join(os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH', '')), 'cards')
+
+@functools.lru_cache(maxsize=None)
+def get_font(role, size):
+    """Load a font once per role ('regular' or 'bold') and size."""
+    from PIL import ImageFont
+
+    configured = os.getenv('CARD_FONT_BOLD' if role == 'bold' else 'CARD_FONT')
+    for candidate in ((configured,) if configured else ()) + FONT_CANDIDATES[role]:
+        try:
+            return ImageFont.truetype(os.path.expanduser(candidate), size)
+        except OSError:
+            continue
+    logger.warning("No TrueType font found; set CARD_FONT and CARD_FONT_BOLD for better cards")
+    return ImageFont.load_default(size)
+
+@functools.lru_cache(maxsize=4096)
+def layout_text(text, role, max_size, min_size, max_width, max_lines):
+    """
+    Fit text into at most max_lines lines of max_width pixels.
+
+    Tries font sizes from max_size down to min_size; if the text doesn't fit
+    even at min_size, the lines that don't fit are dropped and the last one
+    is cut with an ellipsis.
+
+    Returns:
+        tuple: (font size, tuple of lines)
+    """
+    words = text.split()
+    sizes = list(range(max_size, min_size, -max(1, (max_size - min_size) // 8))) + [min_size]
+    for size in sizes:
+        lines = _wrap(words, get_font(role, size), max_width)
+        if len(lines) <= max_lines:
+            return size, tuple(lines)
+    font = get_font(role, min_size)
+    lines = lines[:max_lines]
+    last = lines[-1]
+    while last and font.getlength(last + '…') > max_width:
+        last = last[:-1].rstrip()
+    lines[-1:] = [last + '…']
+    return min_size, tuple(lines)
+
+def _wrap(words, font, max_width):
+    lines, line = [], ''
+    for word in words:
+        candidate = f"{line} {word}" if line else word
+        if font.getlength(candidate) <= max_width:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        # A word wider than the whole line is split wherever it overflows
+        line = ''
+        for char in word:
+            if line and font.getlength(line + char) > max_width:
+                lines.append(line)
+                line = ''
+            line += char
+    if line:
+        lines.append(line)
+    return lines
+
+def _layout(card_format):
+    """Positions of the artwork and text block for a card format."""
+    width, height = CARD_FORMATS[card_format]
+    margin = round(width * 0.06)
+    brand_size = round(min(width, height) * 0.045)
+    if width > height:
+        # Landscape: artwork on the left, branding and text on the right
+        side = height - 2 * margin
+        column = 2 * margin + side
+        return {
+            'art': (margin, margin, side),
+            'brand': (column, margin, brand_size),
+            'text': (column, margin + brand_size * 3, width - margin - column),
+        }
+    header = round(height * 0.08)
+    # Text sizes scale with the width, so the text block does too
+    text_height = round(width * 0.3)
+    side = min(width - 2 * margin, height - header - text_height - margin)
+    top = header + margin // 2
+    return {
+        'art': ((width - side) // 2, top, side),
+        'brand': (margin, round(margin * 0.6), brand_size),
+        'text': (margin, top + side + margin, width - 2 * margin),
+    }
+
+def get_branding():
+    """Return the station's (CARD_TEMPLATE_DIR, CARD_BRAND_COLOR, CARD_BRAND_NAME)."""
+    return (
+        get_setting('CARD_TEMPLATE_DIR'),
+        get_setting('CARD_BRAND_COLOR', DEFAULT_BRAND_COLOR),
+        get_setting('CARD_BRAND_NAME', BRAND_NAME),
+    )
+
+def get_template(card_format, branding=None):
+    """
+    Return the background for a card format: CARD_TEMPLATE_DIR/<format>.png if
+    present, otherwise a generated gradient with the station's branding
+    (CARD_BRAND_NAME, CARD_BRAND_COLOR).
+
+    Args:
+        branding (tuple, optional): Default: get_branding()
+    """
+    return _template(card_format, *(branding or get_branding()))
+
+@functools.lru_cache(maxsize=None)
+def _template(card_format, template_dir, brand_color, brand_name):
+    from PIL import Image, ImageDraw
+
+    size = CARD_FORMATS[card_format]
+    template_path = os.path.join(os.path.expanduser(template_dir), f"{card_format}.png") if template_dir else None
+    if template_path and os.path.exists(template_path):
+        with Image.open(template_path) as template:
+            return template.convert('RGB').resize(size, Image.LANCZOS)
+
+    width, height = size
+    gradient = Image.linear_gradient('L').resize(size).point(lambda value: value * 0.35)
+    image = Image.composite(Image.new('RGB', size, brand_color), Image.new('RGB', size, BACKGROUND_COLOR), gradient)
+
+    draw = ImageDraw.Draw(image)
+    margin = round(width * 0.06)
+    x, y, brand_size = _layout(card_format)['brand']
+    draw.text((x, y), brand_name, font=get_font('bold', brand_size), fill=brand_color)
+    tagline_font = get_font('regular', round(brand_size * 0.6))
+    draw.text((width - margin, height - margin * 0.6), BRAND_TAGLINE, font=tagline_font, fill=MUTED_COLOR, anchor='rd')
+    return image
+
+def _load_artwork(image_path, side):
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as artwork:
+        # Let the JPEG decoder downscale while decoding; much faster for large artwork
+        artwork.draft('RGB', (side, side))
+        return ImageOps.fit(artwork.convert('RGB'), (side, side), Image.LANCZOS)
+
+def render_card(track, card_format='instagram', branding=None):
+    """
+    Composite a card image.
+
+    Args:
+        track (dict): title, artist, label and image_path (local artwork)
+        card_format (str): One of CARD_FORMATS
+        branding (tuple, optional): Default: get_branding()
+
+    Returns:
+        PIL.Image.Image: The rendered card
+    """
+    from PIL import ImageDraw
+
+    image = get_template(card_format, branding).copy()
+    layout = _layout(card_format)
+    left, top, side = layout['art']
+    image.paste(_load_artwork(track['image_path'], side), (left, top))
+
+    draw = ImageDraw.Draw(image)
+    x, y, text_width = layout['text']
+    base, height = CARD_FORMATS[card_format]
+    # Only landscape cards have room for a second artist line
+    artist_lines = 2 if base > height else 1
+    blocks = [
+        (track.get('title', ''), 'bold', round(base * 0.062), round(base * 0.04), 2, TEXT_COLOR),
+        (track.get('artist', ''), 'regular', round(base * 0.045), round(base * 0.032), artist_lines, TEXT_COLOR),
+        (track.get('label', ''), 'regular', round(base * 0.03), round(base * 0.025), 1, MUTED_COLOR),
+    ]
+    for text, role, max_size, min_size, max_lines, color in blocks:
+        if not text:
+            continue
+        size, lines = layout_text(text, role, max_size, min_size, text_width, max_lines)
+        font = get_font(role, size)
+        for line in lines:
+            draw.text((x, y), line, font=font, fill=color)
+            y += round(size * 1.2)
+        y += round(size * 0.5)
+    return image
+
+def card_path(markdown_path, card_format, output_dir=None):
+    name = os.path.splitext(os.path.basename(markdown_path))[0]
+    return os.path.join(output_dir or get_card_output_dir(), f"{name}-{card_format}.jpg")
+
+def render_track(track, name, formats=DEFAULT_FORMATS, output_dir=None, force=False, branding=None):
+    """
+    Render and save a track's cards, skipping ones newer than their inputs.
+
+    Args:
+        track (dict): title, artist, label, image_path and optionally markdown_path
+        name (str): Card name used for the file names (the markdown file name)
+        formats (iterable): Card formats to render
+        output_dir (str, optional): Default: get_card_output_dir()
+        force (bool): Render even if the files are up to date
+        branding (tuple, optional): Default: get_branding()
+
+    Returns:
+        list: Paths of the card images
+    """
+    output_dir = output_dir or get_card_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    inputs = [path for path in (track['image_path'], track.get('markdown_path')) if path]
+    newest_input = max(os.path.getmtime(path) for path in inputs)
+    paths = []
+    for card_format in formats:
+        path = card_path(name, card_format, output_dir)
+        if force or not os.path.exists(path) or os.path.getmtime(path) < newest_input:
+            render_card(track, card_format, branding).save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        paths.append(path)
+    return paths
+
+def read_track(markdown_path):
+    """Read the fields a card needs from a track's markdown file."""
+    from card_creator import get_image_path
+    from track_frontmatter import read_frontmatter
+
+    fields = read_frontmatter(markdown_path)
+    return {
+        'title': fields.get('title', ''),
+        'artist': fields.get('artist', ''),
+        'label': fields.get('label', ''),
+        'image_path': get_image_path(markdown_path),
+        'markdown_path': markdown_path,
+    }
+
+def render_card_file(markdown_path, formats=DEFAULT_FORMATS, output_dir=None, force=False):
+    """Render the cards for one markdown file (see render_track)."""
+    return render_track(read_track(markdown_path), markdown_path, formats, output_dir, force)
+
+def post_image_path(poster, markdown_path, image_path):
+    """
+    Return the image to post for a poster: its rendered card if the poster's
+    manifest entry asks for one (card_format), otherwise the artwork.
+
+    Falls back to the artwork if rendering fails.
+    """
+    card_format = poster.get('card_format')
+    if not card_format or not card_images_enabled():
+        return image_path
+    try:
+        return render_card_file(markdown_path, (card_format,))[0]
+    except Exception as e:
+        logger.warning("Could not render the %s card, posting the artwork: %s", card_format, e,
+                       extra={'path': markdown_path})
+        return image_path
+
+def _warm_up(formats, branding):
+    """Worker initializer: load the fonts and templates once per process."""
+    for card_format in formats:
+        get_template(card_format, branding)
+
+def _render_job(args):
+    track, name, formats, output_dir, force, branding = args
+    try:
+        return name, render_track(track, name, formats, output_dir, force, branding), None
+    except Exception as e:
+        return name, [], str(e)
+
+def render_batch(tracks, formats=DEFAULT_FORMATS, output_dir=None, workers=None, force=False):
+    """
+    Render many tracks' cards on a process pool.
+
+    The output directory and branding are resolved here and handed to the
+    workers, since the current station (see stations.py) doesn't follow the
+    jobs into other processes.
+
+    Args:
+        tracks (list): (track dict, card name) pairs
+        formats (iterable): Card formats to render
+        output_dir (str, optional): Default: get_card_output_dir()
+
+    Returns:
+        tuple: (number of cards rendered successfully, list of (name, error))
+    """
+    formats = tuple(formats)
+    output_dir = output_dir or get_card_output_dir()
+    branding = get_branding()
+    jobs = [(track, name, formats, output_dir, force, branding) for track, name in tracks]
+    rendered, errors = 0, []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up, initargs=(formats, branding)) as executor:
+        for name, paths, error in executor.map(_render_job, jobs, chunksize=4):
+            if error:
+                errors.append((name, error))
+                logger.error("Error rendering %s: %s", name, error)
+            else:
+                rendered += 1
+    return rendered, errors
+
+def _synthetic_tracks(count, directory):
+    """Artwork and metadata for the benchmark (1500px JPEGs, like Bandcamp's)."""
+    import random
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(0)
+    tracks = []
+    for i in range(count):
+        image = Image.new('RGB', (1500, 1500), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.randrange(1500), rng.randrange(1500)
+            draw.ellipse((x, y, x + rng.randrange(100, 700), y + rng.randrange(100, 700)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        image_path = os.path.join(directory, f"art-{i}.jpg")
+        image.save(image_path, quality=90)
+        track = {
+            'title': rng.choice(['Night Bus', 'A Very Long Title That Needs To Wrap Over Two Lines', 'Tape Hiss (Dub)']),
+            'artist': rng.choice(['Someone', 'Various Artists Collective and Friends']),
+            'label': 'Some Label',
+            'image_path': image_path,
+        }
+        tracks.append((track, f"bench-{i}.md"))
+    return tracks
+
+def benchmark(count, formats, workers):
+    """Print cold, warm and pooled rendering throughput on synthetic artwork."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracks = _synthetic_tracks(count, directory)
+        output_dir = os.path.join(directory, 'cards')
+
+        start = time.perf_counter()
+        render_track(*tracks[0], formats, output_dir, force=True)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for track, name in tracks:
+            render_track(track, name, formats, output_dir, force=True)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_batch(tracks, formats, output_dir, workers=workers, force=True)
+        pooled = time.perf_counter() - start
+
+    images = count * len(formats)
+    print(f"{count} cards x {len(formats)} formats ({', '.join(formats)})")
+    print(f"  first card (loading fonts/templates): {cold * 1000:.0f}ms")
+    print(f"  warm, one process:  {images / sequential:.1f} images/s ({sequential * 1000 / images:.0f}ms each)")
+    print(f"  process pool ({workers or os.cpu_count()} workers): {images / pooled:.1f} images/s")
+    print(f"  layout cache: {layout_text.cache_info().hits} hits, {layout_text.cache_info().misses} misses")
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Render social card images for track cards.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    render = subparsers.add_parser('render', help="render the cards of markdown files")
+    render.add_argument('markdown', nargs='+')
+    week = subparsers.add_parser('week', help="render every card published in an ISO week")
+    week.add_argument('week', nargs='?', default=None, help="e.g. 2026-W41 (default: last week)")
+    bench = subparsers.add_parser('bench', help="measure rendering throughput on synthetic artwork")
+    bench.add_argument('--cards', type=int, default=48)
+    for subparser in (render, week, bench):
+        subparser.add_argument('--format', action='append', choices=sorted(CARD_FORMATS), dest='formats',
+                               help="card format (repeatable; default: instagram)")
+        subparser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    for subparser in (render, week):
+        subparser.add_argument('--force', action='store_true', help="re-render up-to-date cards")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    if importlib.util.find_spec('PIL') is None:
+        logger.error("Error: the card renderer needs Pillow (pip install Pillow)")
+        return
+    formats = tuple(args.formats or DEFAULT_FORMATS)
+
+    if args.command == 'bench':
+        benchmark(args.cards, formats, args.workers)
+        return
+
+    if args.command == 'render':
+        markdown_paths = args.markdown
+    else:
+        from feed_generator import FeedIndex, parse_week, last_week
+
+        markdown_dir = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+        if not os.path.isdir(markdown_dir):
+            logger.error("Error: MARKDOWN_OUTPUT_PATH must point to the markdown catalog")
+            return
+        try:
+            monday, sunday = parse_week(args.week or last_week())
+        except ValueError:
+            logger.error("Error: week takes an ISO week like 2026-W41")
+            return
+        index = FeedIndex(markdown_dir)
+        index.update()
+        markdown_paths = [os.path.join(markdown_dir, name) for name in index.between(monday, sunday)]
+
+    start = time.perf_counter()
+    tracks = [(read_track(path), path) for path in markdown_paths]
+    rendered, errors = render_batch(tracks, formats, workers=args.workers, force=args.force)
+    print(f"Rendered {rendered} of {len(tracks)} cards to {get_card_output_dir()} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
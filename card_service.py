@@ -0,0 +1,422 @@
+"""
+Long-running local HTTP/JSON service for creating and publishing track cards.
+
+Unlike card_creator.py, which starts a new Python process, Chrome and platform
+logins for every card, the service keeps one headless Chrome, the HTTP session,
+the YouTube/Spotify clients and the logged-in platform clients warm between
+requests:
+
+    python card_service.py --port 8765
+
+    POST /cards                   {"url": "https://artist.bandcamp.com/track/..."}
+                                  or {"url": ".../album/...", "tracks": "1,3-5"}
+                                  plus "station": "kdzu" to use a station profile
+    GET  /cards/<id>              card details
+    GET  /cards/<id>/search       YouTube and Spotify candidates
+    POST /cards/<id>/links        {"youtube": "...", "spotify": "..."}
+    POST /cards/<id>/review       {"review": "..."}
+    POST /cards/<id>/publish      {"platforms": ["mastodon", "bluesky"], "hashtags": [...]}
+    GET  /health
+
+One service can work for every station in stations.toml: Chrome, the HTTP
+session and the caches are shared, while each card remembers its station and
+is written, rendered and posted with that station's paths and accounts.
+Logged-in clients and posting budgets are kept per station.
+
+The service only listens on 127.0.0.1 by default. If SERVICE_TOKEN is set,
+requests must send it as "Authorization: Bearer <token>".
+"""
+import os
+import re
+import json
+import hmac
+import logging
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+import card_creator
+from hashtags import build_hashtags, parse_tag_list
+from track_frontmatter import read_frontmatter
+from posters import get_registered_posters, is_poster_available, load_poster, create_poster_client
+from card_renderer import post_image_path
+from stations import get_setting, use_station, station_names, take_post_budget, refund_post_budget
+from logging_config import setup_logging
+from metrics import measure, setup_metrics
+from http_cassettes import setup_cassettes
+
+logger = logging.getLogger('cardcreator.service')
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+
+class ServiceError(Exception):
+    """Error returned to the client with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class CardService:
+    """Warm clients and the cards created by this service process."""
+
+    def __init__(self):
+        self.cards = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        # Chrome isn't safe to drive from several threads, so scrapes take turns
+        self.driver_lock = threading.Lock()
+        self.driver = None
+        # Keyed by (station, platform), so each station posts from its own accounts
+        self.clients = {}
+        self.client_locks = {}
+        # One publish per card at a time, so a repeated request can't post twice
+        self.publish_locks = {}
+
+    def warm_up(self):
+        """Start Chrome ahead of the first request."""
+        with self.driver_lock:
+            self._get_driver()
+
+    def close(self):
+        with self.driver_lock:
+            if self.driver is not None:
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
+                self.driver = None
+
+    def _get_driver(self):
+        if self.driver is not None:
+            try:
+                # Restart Chrome if it crashed or was closed
+                self.driver.current_url
+            except Exception:
+                logger.warning("Chrome is not responding, restarting it")
+                self.driver = None
+        if self.driver is None:
+            self.driver = card_creator.create_chrome_driver()
+        return self.driver
+
+    def get_card(self, card_id):
+        with self.lock:
+            card = self.cards.get(card_id)
+        if card is None:
+            raise ServiceError(404, f"Unknown card: {card_id}")
+        return card
+
+    def create_cards(self, url, tracks=None, station=None):
+        """
+        Scrape a Bandcamp track or album and write markdown cards and artwork.
+
+        Args:
+            url (str): Track or album URL
+            tracks (str, optional): Album tracks to create cards for, e.g. "1,3-5"
+            station (str, optional): Station profile (default: the service's station)
+
+        Returns:
+            list: The new cards (one for a track URL)
+        """
+        if not url or 'bandcamp.com' not in urlparse(url).netloc:
+            raise ServiceError(400, "A Bandcamp track or album URL is required")
+        if tracks is not None and not card_creator.is_album_url(url):
+            raise ServiceError(400, "Tracks can only be selected for album URLs")
+        if station is not None and station not in station_names():
+            raise ServiceError(400, f"Unknown station: {station}")
+
+        with use_station(station) as station, self.driver_lock:
+            driver = self._get_driver()
+            if card_creator.is_album_url(url):
+                created = card_creator.create_album_track_files(url, driver=driver, selection=tracks)
+            else:
+                filepath, title, artist = card_creator.create_track_file(url, driver=driver)
+                created = [(filepath, title, artist, url)] if filepath else []
+            if not created:
+                raise ServiceError(502, f"Could not scrape {url}")
+            return [self._add_card(*card, station=station) for card in created]
+
+    def _add_card(self, filepath, title, artist, url, station=None):
+        card = {
+            'id': str(next(self.ids)),
+            'station': station,
+            'url': url,
+            'markdown_path': filepath,
+            'image_path': card_creator.get_image_path(filepath),
+            'title': title,
+            'artist': artist,
+            'youtube': None,
+            'spotify': None,
+            'review': None,
+            'published': {},
+        }
+        with self.lock:
+            self.cards[card['id']] = card
+        return card
+
+    def search(self, card):
+        """Find YouTube and Spotify candidates for a card."""
+        query = f"{card['title']} {card['artist']}"
+        results = {'youtube': [], 'spotify': []}
+
+        api_key = get_setting('YOUTUBE_API_KEY')
+        if api_key:
+            results['youtube'] = [
+                {'title': title, 'channel': channel, 'url': link}
+                for title, channel, link in card_creator.search_youtube_api(query, api_key)
+            ]
+
+        client_id = get_setting('SPOTIPY_CLIENT_ID')
+        client_secret = get_setting('SPOTIPY_CLIENT_SECRET')
+        if client_id and client_secret:
+            results['spotify'] = [
+                {'title': title, 'url': link}
+                for title, link in card_creator.search_spotify(query, client_id, client_secret)
+            ]
+        return results
+
+    def set_links(self, card, youtube=None, spotify=None):
+        if (card['youtube'] and youtube) or (card['spotify'] and spotify):
+            raise ServiceError(409, "Links have already been set for this card")
+        card_creator.add_links_to_track_file(card['markdown_path'], youtube, spotify)
+        card['youtube'] = youtube or card['youtube']
+        card['spotify'] = spotify or card['spotify']
+        return card
+
+    def set_review(self, card, review):
+        if not review or not review.strip():
+            raise ServiceError(400, "A review is required")
+        if card['review']:
+            raise ServiceError(409, "A review has already been added to this card")
+        card_creator.add_review_to_track_file(card['markdown_path'], review.strip())
+        card['review'] = review.strip()
+        return card
+
+    def get_client(self, station, name):
+        """Return a station's logged-in client for a platform, logging in on first use."""
+        key = (station, name)
+        with self.lock:
+            lock = self.client_locks.setdefault(key, threading.Lock())
+        with lock:
+            if self.clients.get(key) is None:
+                with use_station(station):
+                    self.clients[key] = create_poster_client(name)
+            return self.clients[key]
+
+    def drop_client(self, station, name):
+        """Forget a client after a failed post so the next publish logs in again."""
+        self.clients.pop((station, name), None)
+
+    def publish(self, card, platforms, hashtags=None):
+        """
+        Post a card to the given platforms with its station's accounts.
+        Platforms the card has already been posted to are skipped.
+
+        Returns:
+            dict: Platform name -> True/False, or an error message
+        """
+        if not card['review']:
+            raise ServiceError(409, "Add a review before publishing")
+        if not os.path.exists(card['image_path']):
+            raise ServiceError(409, f"Image file not found at {card['image_path']}")
+
+        posters = get_registered_posters()
+        unknown = [name for name in platforms if name not in posters]
+        if unknown:
+            raise ServiceError(400, f"Unknown platforms: {', '.join(unknown)}")
+
+        if hashtags is None:
+            track_data = read_frontmatter(card['markdown_path'])
+            hashtags = build_hashtags(track_data.get('tags'), card['artist'], track_data.get('label'))
+        elif isinstance(hashtags, str):
+            hashtags = parse_tag_list(hashtags)
+
+        with self.lock:
+            publish_lock = self.publish_locks.setdefault(card['id'], threading.Lock())
+        results = {}
+        with publish_lock:
+            for name in platforms:
+                if card['published'].get(name):
+                    results[name] = "Already published to this platform"
+                    continue
+                if not is_poster_available(name):
+                    results[name] = f"Install {posters[name]['package']} to enable this platform"
+                    continue
+                if not take_post_budget(name):
+                    results[name] = "Hourly posting limit reached; try again later"
+                    continue
+                with measure('cardcreator_posts', help="Social media posts", platform=name) as outcome:
+                    try:
+                        create_post = load_poster(name)
+                        kwargs = {}
+                        client = self.get_client(card['station'], name)
+                        if client is not None:
+                            kwargs['client'] = client
+                        success = create_post(
+                            image_path=post_image_path(posters[name], card['markdown_path'], card['image_path']),
+                            title=card['title'],
+                            artist=card['artist'],
+                            review=card['review'],
+                            bandcamp_url=card['url'],
+                            spotify_url=card['spotify'],
+                            youtube_url=card['youtube'],
+                            hashtags=hashtags,
+                            **kwargs
+                        )
+                    except Exception as e:
+                        # A failed login or post shouldn't stop the other platforms
+                        logger.exception("Error publishing card %s to %s", card['id'], name)
+                        success = f"Error posting to {posters[name]['label']}: {e}"
+                    if success is not True:
+                        outcome['result'] = 'error'
+                        self.drop_client(card['station'], name)
+                        refund_post_budget(name)
+                results[name] = success
+                card['published'][name] = success is True
+        return results
+
+class CardServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ServiceError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ServiceError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ServiceError(400, "Request body must be a JSON object")
+        return body
+
+    def check_token(self):
+        token = self.server.token
+        if not token:
+            return
+        header = self.headers.get('Authorization', '')
+        if not hmac.compare_digest(header, f"Bearer {token}"):
+            raise ServiceError(401, "Missing or invalid token")
+
+    def _handle(self, method):
+        try:
+            # Read the body first so keep-alive connections stay in sync on errors
+            body = self.read_json() if method == 'POST' else {}
+            self.check_token()
+            status, payload = self.route(method, urlparse(self.path).path.rstrip('/'), body)
+        except ServiceError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            logger.exception("Error handling %s %s", method, self.path)
+            status, payload = 500, {'error': str(e)}
+        self.send_json(status, payload)
+
+    def route(self, method, path, body):
+        service = self.server.service
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'cards': len(service.cards), 'browser': service.driver is not None,
+                         'stations': station_names()}
+
+        if method == 'POST' and path == '/cards':
+            return 201, {'cards': service.create_cards(body.get('url'), body.get('tracks'), body.get('station'))}
+
+        match = re.fullmatch(r'/cards/([^/]+)(?:/(search|links|review|publish))?', path)
+        if not match:
+            raise ServiceError(404, f"Not found: {path}")
+        card = service.get_card(match.group(1))
+        action = match.group(2)
+        with use_station(card['station']):
+            return self.route_card(method, path, card, action, body)
+
+    def route_card(self, method, path, card, action, body):
+        service = self.server.service
+
+        if method == 'GET' and action is None:
+            return 200, card
+        if method == 'GET' and action == 'search':
+            return 200, service.search(card)
+        if method == 'POST' and action == 'links':
+            return 200, service.set_links(card, body.get('youtube'), body.get('spotify'))
+        if method == 'POST' and action == 'review':
+            return 200, service.set_review(card, body.get('review'))
+        if method == 'POST' and action == 'publish':
+            platforms = body.get('platforms') or []
+            if not platforms:
+                raise ServiceError(400, "List the platforms to publish to")
+            return 200, {'results': service.publish(card, platforms, body.get('hashtags'))}
+        raise ServiceError(405, f"{method} not allowed on {path}")
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+def make_server(port=DEFAULT_PORT, host='127.0.0.1', token=None, service=None):
+    """Create (but don't start) the card service's HTTP server."""
+    server = ThreadingHTTPServer((host, port), CardServiceHandler)
+    server.daemon_threads = True
+    server.service = service or CardService()
+    server.token = token
+    return server
+
+def start_service(port=DEFAULT_PORT, host='127.0.0.1', token=None, service=None):
+    """
+    Start the card service on a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its .service holds the warm state
+    """
+    server = make_server(port, host, token, service)
+    threading.Thread(target=server.serve_forever, name='card-service', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run CardCreator as a local HTTP/JSON service.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVICE_PORT', DEFAULT_PORT)))
+    parser.add_argument('--no-warm-up', action='store_true', help="start Chrome on the first request instead of at startup")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    setup_metrics()
+    setup_cassettes()
+    for station in station_names() or [None]:
+        with use_station(station):
+            if not card_creator.validate_paths():
+                return
+
+    service = CardService()
+    if not args.no_warm_up:
+        logger.info("Starting Chrome...")
+        service.warm_up()
+
+    server = make_server(args.port, args.host, os.getenv('SERVICE_TOKEN'), service)
+    logger.info("Card service listening on http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
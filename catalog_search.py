@@ -0,0 +1,304 @@
+"""
+Full-text search over the track cards.
+
+Builds an inverted index of the title, artist, label, tags and review of every
+markdown file in MARKDOWN_OUTPUT_PATH. Only files whose size or modification
+time changed since the last run are re-read, and the index is stored in the
+cache directory as gzipped JSON with delta-encoded posting lists.
+
+    python catalog_search.py dub
+    python catalog_search.py 'label:"some label" tag:ambient'
+    python catalog_search.py 'artist:bas* review:tape'
+
+Words are matched case- and accent-insensitively and all of them must match.
+A trailing * matches any word with that prefix, and field:word limits a word
+to one of title, artist, label, tag(s) or review. Quoted text is split into
+words like everything else.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+import hashlib
+import logging
+import argparse
+import tempfile
+import unicodedata
+
+from media_cache import get_cache_dir
+from track_frontmatter import parse_frontmatter
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.search')
+
+INDEX_VERSION = 1
+FIELDS = ('title', 'artist', 'label', 'tags', 'review')
+FIELD_ALIASES = {'tag': 'tags'}
+# Matches in the title or artist rank above matches in the review
+FIELD_WEIGHTS = {'title': 3, 'artist': 3, 'label': 2, 'tags': 2, 'review': 1}
+# Metadata kept per card so results can be shown without reading the files
+STORED_FIELDS = ('title', 'artist', 'label', 'pubDate', 'bandcamp')
+# Compact the index once this share of document slots belongs to changed or deleted files
+COMPACT_RATIO = 0.2
+
+QUERY_PATTERN = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+def tokenize(text):
+    """Split text into lowercase words with accents removed."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r'\w+', text)
+
+def scan_catalog(markdown_dir, known):
+    """
+    Compare the markdown files in a directory with previously seen ones.
+
+    Args:
+        markdown_dir (str): Catalog directory
+        known (dict): File name -> [size, mtime] from the last scan
+
+    Returns:
+        tuple: (names of new or changed files, names of deleted files,
+            file name -> [size, mtime] for every current file)
+    """
+    current = {}
+    with os.scandir(markdown_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.md') and entry.is_file():
+                stat = entry.stat()
+                current[entry.name] = [stat.st_size, stat.st_mtime]
+    changed = sorted(name for name, stat in current.items() if known.get(name) != stat)
+    removed = sorted(name for name in known if name not in current)
+    return changed, removed, current
+
+def _delta_encode(ids):
+    return [ids[0]] + [b - a for a, b in zip(ids, ids[1:])] if ids else []
+
+def _delta_decode(deltas):
+    ids, total = [], 0
+    for delta in deltas:
+        total += delta
+        ids.append(total)
+    return ids
+
+class SearchIndex:
+    """Inverted index of the catalog: field -> word -> sorted document ids."""
+
+    def __init__(self, markdown_dir, path=None):
+        self.markdown_dir = os.path.abspath(markdown_dir)
+        key = hashlib.sha1(self.markdown_dir.encode('utf-8')).hexdigest()[:12]
+        self.path = path or os.path.join(get_cache_dir(), f"search_index-{key}.json.gz")
+        self.docs = []
+        self.postings = {field: {} for field in FIELDS}
+        self.ids = {}
+        self._vocab = {}
+        self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != INDEX_VERSION or data.get('markdown_dir') != self.markdown_dir:
+            return
+        self.docs = data['docs']
+        self.postings = {field: {term: _delta_decode(deltas) for term, deltas in data['postings'][field].items()}
+                         for field in FIELDS}
+        self.ids = {doc['name']: doc_id for doc_id, doc in enumerate(self.docs) if doc}
+
+    def save(self):
+        if self.docs and self.docs.count(None) > len(self.docs) * COMPACT_RATIO:
+            self.compact()
+        data = {
+            'version': INDEX_VERSION,
+            'markdown_dir': self.markdown_dir,
+            'docs': self.docs,
+            'postings': {field: {term: _delta_encode(ids) for term, ids in sorted(terms.items())}
+                         for field, terms in self.postings.items()},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Forget every card, so the next update() re-indexes the whole catalog."""
+        self.docs, self.ids, self._vocab = [], {}, {}
+        self.postings = {field: {} for field in FIELDS}
+
+    def compact(self):
+        """Drop the slots of changed and deleted files and renumber the documents."""
+        remap, docs = {}, []
+        for old_id, doc in enumerate(self.docs):
+            if doc:
+                remap[old_id] = len(docs)
+                docs.append(doc)
+        for field, terms in self.postings.items():
+            self.postings[field] = {
+                term: new_ids for term, ids in terms.items()
+                if (new_ids := [remap[doc_id] for doc_id in ids if doc_id in remap])
+            }
+        self.docs = docs
+        self.ids = {doc['name']: doc_id for doc_id, doc in enumerate(docs)}
+        self._vocab = {}
+
+    def _remove(self, name):
+        # Postings of the old slot are skipped at query time and dropped by compact()
+        doc_id = self.ids.pop(name, None)
+        if doc_id is not None:
+            self.docs[doc_id] = None
+
+    def _add(self, name, content, stat, review_placeholder=None):
+        fields, body = parse_frontmatter(content)
+        doc_id = len(self.docs)
+        doc = {'name': name, 'stat': stat}
+        doc.update({key: fields.get(key, '') for key in STORED_FIELDS})
+        self.docs.append(doc)
+        self.ids[name] = doc_id
+
+        texts = {
+            'title': fields.get('title', ''),
+            'artist': fields.get('artist', ''),
+            'label': fields.get('label', ''),
+            'tags': ' '.join(fields['tags']) if isinstance(fields.get('tags'), list) else fields.get('tags', ''),
+            'review': '' if body == review_placeholder else body,
+        }
+        for field, text in texts.items():
+            terms = self.postings[field]
+            for term in set(tokenize(text)):
+                # New documents get the highest id, so posting lists stay sorted
+                terms.setdefault(term, []).append(doc_id)
+
+    def update(self):
+        """
+        Re-index new and changed cards and forget deleted ones.
+
+        Returns:
+            tuple: (number of cards indexed, number removed)
+        """
+        from card_creator import REVIEW_PLACEHOLDER
+
+        known = {doc['name']: doc['stat'] for doc in self.docs if doc}
+        changed, removed, current = scan_catalog(self.markdown_dir, known)
+        for name in removed:
+            self._remove(name)
+        for name in changed:
+            self._remove(name)
+            path = os.path.join(self.markdown_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._add(name, f.read(), current[name], REVIEW_PLACEHOLDER)
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping %s: %s", path, e)
+        if changed or removed:
+            self._vocab = {}
+            self.save()
+        return len(changed), len(removed)
+
+    def _matching_terms(self, field, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings[field] else []
+        if field not in self._vocab:
+            self._vocab[field] = sorted(self.postings[field])
+        vocab = self._vocab[field]
+        start = bisect.bisect_left(vocab, term)
+        end = bisect.bisect_left(vocab, term + '\U0010ffff')
+        return vocab[start:end]
+
+    def _match(self, fields, term, prefix):
+        """Return document id -> weight of the best field a word matches in."""
+        weights = {}
+        for field in fields:
+            weight = FIELD_WEIGHTS[field]
+            for matched in self._matching_terms(field, term, prefix):
+                for doc_id in self.postings[field][matched]:
+                    if weights.get(doc_id, 0) < weight:
+                        weights[doc_id] = weight
+        return weights
+
+    def search(self, query, limit=20):
+        """
+        Find the cards matching every word of a query.
+
+        Args:
+            query (str): Words, optionally prefixed with field: and ending in *
+            limit (int): Maximum number of results
+
+        Returns:
+            list: Stored card metadata (name, title, artist, label, pubDate,
+                bandcamp), best matches first, newest first among equals
+
+        Raises:
+            ValueError: If the query names an unknown field or has no words
+        """
+        clauses = []
+        for field, quoted, bare in QUERY_PATTERN.findall(query):
+            field = FIELD_ALIASES.get(field.lower(), field.lower()) if field else None
+            if field and field not in FIELDS:
+                raise ValueError(f"Unknown field '{field}' (use {', '.join(FIELDS)})")
+            text = quoted or bare
+            words = tokenize(text)
+            for i, word in enumerate(words):
+                prefix = i == len(words) - 1 and text.endswith('*')
+                clauses.append(((field,) if field else FIELDS, word, prefix))
+        if not clauses:
+            raise ValueError("Empty query")
+
+        # Intersect starting from the rarest word so the candidate set stays small
+        matches = sorted((self._match(*clause) for clause in clauses), key=len)
+        scores = matches[0]
+        for weights in matches[1:]:
+            scores = {doc_id: score + weights[doc_id] for doc_id, score in scores.items() if doc_id in weights}
+
+        results = [(score, self.docs[doc_id]) for doc_id, score in scores.items() if self.docs[doc_id]]
+        results.sort(key=lambda item: (item[0], item[1].get('pubDate') or ''), reverse=True)
+        return [{key: value for key, value in doc.items() if key != 'stat'} for _, doc in results[:limit]]
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Search the track cards' titles, artists, labels, tags and reviews.")
+    parser.add_argument('query', nargs='*', help="words to find, e.g. dub 'label:\"some label\"' tag:amb*")
+    parser.add_argument('--limit', type=int, default=20, help="maximum results (default: 20)")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index from scratch")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    markdown_dir = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    if not os.path.isdir(markdown_dir):
+        logger.error("Error: MARKDOWN_OUTPUT_PATH must point to the markdown catalog")
+        return
+
+    start = time.perf_counter()
+    index = SearchIndex(markdown_dir)
+    if args.rebuild:
+        index.clear()
+    indexed, removed = index.update()
+    if indexed or removed:
+        logger.info("Indexed %d cards, removed %d (%.0fms)", indexed, removed, (time.perf_counter() - start) * 1000)
+    if not args.query:
+        print(f"{len(index.ids)} cards indexed in {index.path}")
+        return
+
+    start = time.perf_counter()
+    try:
+        results = index.search(' '.join(args.query), limit=args.limit)
+    except ValueError as e:
+        logger.error("Error: %s", e)
+        return
+    elapsed = (time.perf_counter() - start) * 1000
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    for doc in results:
+        print(f"{doc['pubDate']:<10}  {doc['artist']} - {doc['title']}  [{doc['label']}]  {doc['name']}")
+    print(f"\n{len(results)} results ({elapsed:.1f}ms)")
+
+if __name__ == "__main__":
+    main()
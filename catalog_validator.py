@@ -0,0 +1,419 @@
+"""
+Lint the track cards against the schema in _track.md.template.
+
+Checks every markdown file in MARKDOWN_OUTPUT_PATH for broken quoting,
+missing required fields, malformed dates and URLs, heroImage files that are
+missing or smaller than 400x400, unwritten reviews and Bandcamp URLs used by
+more than one card. Results are cached in the cache directory by file size
+and modification time (of the card and its artwork), so repeat runs only
+re-check what changed, and large batches are checked on a process pool:
+
+    python catalog_validator.py                        # the whole catalog
+    python catalog_validator.py tracks/a.md tracks/b.md # report only these files
+    python catalog_validator.py --json
+
+Exits with status 1 if any card has errors (or warnings, with --strict), so
+it can run as a pre-commit hook in the site repository.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import datetime
+import functools
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from catalog_search import scan_catalog
+from stations import get_setting, get_hero_image_base_url
+
+logger = logging.getLogger('cardcreator.validator')
+
+VALIDATOR_CACHE_NAME = 'catalog_lint'
+# Bump when the checks change, so cached results are thrown away
+VALIDATOR_VERSION = 1
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_track.md.template')
+MIN_IMAGE_SIZE = 400
+# Fewer changed cards than this are checked in-process; a pool isn't worth starting
+POOL_THRESHOLD = 64
+# Fields written by the scraper and link_checker.py that the template doesn't list
+EXTRA_FIELDS = {
+    'releaseDate': {'kind': 'date', 'required': False, 'url': False},
+    'credits': {'kind': 'string', 'required': False, 'url': False},
+    'deadLinks': {'kind': 'list', 'required': False, 'url': False},
+}
+URL_HOSTS = {
+    'youtube': ('youtube.com', 'youtu.be'),
+    'spotify': ('open.spotify.com',),
+}
+
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+LINE_PATTERN = re.compile(r'([A-Za-z_][\w-]*):(?:\s+(.*?))?\s*')
+# Plain (unquoted) YAML values that YAML would read as something other than the string
+UNSAFE_PLAIN = re.compile(r'^[\[\]{}&*!|>\'"%@`#,?:-]|: | #')
+SINGLE_QUOTED = re.compile(r"'(?:[^']|'')*'")
+WHITESPACE = re.compile(r'\s')
+_decoder = json.JSONDecoder()
+
+@functools.lru_cache(maxsize=None)
+def load_schema(template_path=TEMPLATE_PATH):
+    """
+    Read the card fields from the track template.
+
+    A field's kind (string, list or date) comes from its example value, fields
+    under "# Required fields" are required unless their comment says
+    "Optional", and fields whose example is a URL must hold URLs.
+
+    Returns:
+        dict: Field name -> {'kind', 'required', 'url'}
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        frontmatter = f.read().split('---', 2)[1]
+    schema, required_section = {}, False
+    for line in frontmatter.split('\n'):
+        line = line.strip()
+        if line.startswith('#'):
+            required_section = 'required' in line.lower()
+            continue
+        match = LINE_PATTERN.fullmatch(line.split(' # ')[0])
+        if not match:
+            continue
+        example = match.group(2) or ''
+        comment = line.split(' # ', 1)[1] if ' # ' in line else ''
+        if example.startswith('['):
+            kind = 'list'
+        elif DATE_PATTERN.fullmatch(example):
+            kind = 'date'
+        else:
+            kind = 'string'
+        schema[match.group(1)] = {
+            'kind': kind,
+            'required': required_section and not comment.lower().startswith('optional'),
+            'url': example.strip('"').startswith(('http://', 'https://')),
+        }
+    return schema
+
+def _issue(level, field, message):
+    return [level, field, message]
+
+def _parse_value(field, spec, raw, issues):
+    """Check one raw frontmatter value for its kind and return the parsed value."""
+    kind = spec['kind']
+    if raw.startswith('"'):
+        try:
+            value, end = _decoder.raw_decode(raw)
+        except ValueError:
+            issues.append(_issue('error', field, "quoted value is broken (unescaped \" or bad escape)"))
+            return None
+        rest = raw[end:].strip()
+        if rest and not rest.startswith('#'):
+            issues.append(_issue('error', field, "text after the closing quote; escape the inner quotes as \\\""))
+            return None
+    elif raw.startswith("'"):
+        if not SINGLE_QUOTED.match(raw):
+            issues.append(_issue('error', field, "single-quoted value is broken (double inner ' as '')"))
+            return None
+        value = raw[1:SINGLE_QUOTED.match(raw).end() - 1].replace("''", "'")
+    elif raw.startswith('['):
+        try:
+            value = json.loads(raw.split(' #')[0])
+        except ValueError:
+            issues.append(_issue('error', field, "list isn't valid, write it as [\"a\", \"b\"]"))
+            return None
+    else:
+        value = raw.split(' #')[0].strip()
+        if kind == 'string' and value:
+            if UNSAFE_PLAIN.search(value):
+                issues.append(_issue('error', field, "unquoted value breaks the YAML; put it in double quotes"))
+                return None
+            issues.append(_issue('warning', field, "value should be in double quotes"))
+
+    if kind == 'list':
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            issues.append(_issue('error', field, "should be a list of strings"))
+            return None
+    elif not isinstance(value, str):
+        issues.append(_issue('error', field, f"should be a {kind}, not a list"))
+        return None
+    elif kind == 'date' and value:
+        try:
+            if not DATE_PATTERN.fullmatch(value):
+                raise ValueError(value)
+            datetime.date.fromisoformat(value)
+        except ValueError:
+            issues.append(_issue('error', field, f"'{value}' isn't a YYYY-MM-DD date"))
+            return None
+    return value
+
+def _check_url(field, value, issues):
+    parsed = urlparse(value)
+    if parsed.scheme not in ('http', 'https') or '.' not in parsed.netloc or WHITESPACE.search(value):
+        issues.append(_issue('error', field, f"'{value}' isn't an http(s) URL"))
+        return False
+    host = parsed.netloc.lower().split(':')[0]
+    hosts = URL_HOSTS.get(field)
+    if hosts and not any(host == allowed or host.endswith('.' + allowed) for allowed in hosts):
+        issues.append(_issue('error', field, f"'{value}' isn't a {field} URL"))
+    elif field == 'bandcamp' and not host.endswith('bandcamp.com'):
+        issues.append(_issue('warning', field, f"'{value}' isn't on bandcamp.com"))
+    return True
+
+def _image_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+@functools.lru_cache(maxsize=4096)
+def _image_size(path, size, mtime):
+    # Tracks of an album share artwork, so each worker reads a file's header once
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None
+
+def _check_image(value, context, issues):
+    """Check that heroImage points at local artwork of at least the minimum size."""
+    if not value.startswith(context['hero_base_url']):
+        issues.append(_issue('warning', 'heroImage', f"isn't under {context['hero_base_url']}"))
+    filename = os.path.basename(urlparse(value).path)
+    path = os.path.join(context['image_dir'], filename)
+    if not os.path.isfile(path):
+        issues.append(_issue('error', 'heroImage', f"{filename} not found in {context['image_dir']}"))
+        return filename
+    if context['check_size']:
+        stat = os.stat(path)
+        size = _image_size(path, stat.st_size, stat.st_mtime)
+        if size is None:
+            issues.append(_issue('error', 'heroImage', f"{filename} isn't a readable image"))
+            return filename
+        width, height = size
+        if min(width, height) < context['min_size']:
+            issues.append(_issue('error', 'heroImage', f"{filename} is {width}x{height}, "
+                                 f"smaller than {context['min_size']}x{context['min_size']}"))
+    return filename
+
+def normalize_bandcamp_url(url):
+    parsed = urlparse(url.strip())
+    return f"{parsed.netloc.lower()}{parsed.path.rstrip('/')}" if parsed.netloc else None
+
+def validate_card(path, context):
+    """
+    Check one card.
+
+    Args:
+        path (str): Markdown file
+        context (dict): image_dir, hero_base_url, min_size, check_size and
+            review_placeholder (passed in, since pool workers have no station)
+
+    Returns:
+        dict: issues ([level, field, message] lists), bandcamp (normalized
+            URL or None), image (artwork file name or None) and image_stat
+            ([size, mtime] of the artwork, or None if it's missing)
+    """
+    schema = dict(EXTRA_FIELDS, **load_schema())
+    issues, fields = [], {}
+    result = {'issues': issues, 'bandcamp': None, 'image': None, 'image_stat': None}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        issues.append(_issue('error', None, f"can't be read: {e}"))
+        return result
+    parts = content.split('\n---', 1) if content.startswith('---\n') else None
+    if not parts or len(parts) < 2:
+        issues.append(_issue('error', None, "frontmatter must start and end with a --- line"))
+        return result
+
+    for number, line in enumerate(parts[0][4:].split('\n'), 2):
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        match = LINE_PATTERN.fullmatch(stripped)
+        if not match:
+            issues.append(_issue('error', None, f"line {number} isn't a 'key: value' pair"))
+            continue
+        field, raw = match.group(1), match.group(2) or ''
+        if field in fields:
+            issues.append(_issue('error', field, f"set twice (again on line {number})"))
+            continue
+        spec = schema.get(field)
+        if spec is None:
+            issues.append(_issue('warning', field, "isn't in the track template"))
+            spec = {'kind': 'list' if raw.startswith('[') else 'string', 'required': False, 'url': False}
+        fields[field] = _parse_value(field, spec, raw, issues)
+
+    for field, spec in schema.items():
+        value = fields.get(field)
+        if spec['required'] and field not in fields:
+            issues.append(_issue('error', field, "is missing"))
+        elif spec['required'] and value == '':
+            issues.append(_issue('error', field, "is empty"))
+        elif value and spec['url']:
+            if _check_url(field, value, issues) and field == 'heroImage':
+                result['image'] = _check_image(value, context, issues)
+                result['image_stat'] = _image_stat(os.path.join(context['image_dir'], result['image']))
+
+    pub_date = fields.get('pubDate')
+    if pub_date and DATE_PATTERN.fullmatch(pub_date) and pub_date > (datetime.date.today() + datetime.timedelta(days=1)).isoformat():
+        issues.append(_issue('warning', 'pubDate', f"{pub_date} is in the future"))
+    if fields.get('bandcamp'):
+        result['bandcamp'] = normalize_bandcamp_url(fields['bandcamp'])
+    review = parts[1].strip()
+    if not review or review == context['review_placeholder']:
+        issues.append(_issue('warning', None, "review hasn't been written"))
+    return result
+
+def _validate_safe(args):
+    path, context = args
+    try:
+        return validate_card(path, context)
+    except Exception as e:
+        return {'issues': [_issue('error', None, f"validator failed: {e}")], 'bandcamp': None, 'image': None, 'image_stat': None}
+
+@functools.lru_cache(maxsize=None)
+def load_review_placeholder(template_path=TEMPLATE_PATH):
+    """Return the template's body, the placeholder new cards get instead of a review."""
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return f.read().split('---', 2)[2].strip()
+
+def get_context(image_dir):
+    check_size = importlib.util.find_spec('PIL') is not None
+    if not check_size:
+        logger.warning("Pillow isn't installed; image sizes won't be checked")
+    return {
+        'image_dir': os.path.abspath(image_dir),
+        'hero_base_url': get_hero_image_base_url(),
+        'min_size': MIN_IMAGE_SIZE,
+        'check_size': check_size,
+        'review_placeholder': load_review_placeholder(),
+    }
+
+def validate_catalog(markdown_dir, image_dir, workers=None, refresh=False):
+    """
+    Check every card in a catalog, re-checking only new and changed cards
+    and cards whose artwork changed.
+
+    Args:
+        markdown_dir (str): The markdown catalog
+        image_dir (str): Where the heroImage files are
+        workers (int, optional): Pool size (default: one per core)
+        refresh (bool): Ignore cached results
+
+    Returns:
+        tuple: (file name -> issues, including duplicate Bandcamp URLs;
+            number of cards checked this run)
+    """
+    markdown_dir = os.path.abspath(markdown_dir)
+    context = get_context(image_dir)
+    template_stat = os.stat(TEMPLATE_PATH)
+    fingerprint = [VALIDATOR_VERSION, template_stat.st_mtime, context['image_dir'], context['hero_base_url'],
+                   context['min_size'], context['check_size']]
+    cache_name = f"{VALIDATOR_CACHE_NAME}-{hashlib.sha1(markdown_dir.encode('utf-8')).hexdigest()[:12]}"
+    state = load_media_cache(cache_name)
+    if refresh or state.get('fingerprint') != fingerprint:
+        state = {'fingerprint': fingerprint, 'entries': {}}
+    entries = state['entries']
+
+    changed, removed, current = scan_catalog(markdown_dir, {name: entry['stat'] for name, entry in entries.items()})
+    for name in removed:
+        del entries[name]
+    # Cards whose artwork was replaced, added or deleted since they were checked
+    changed += [name for name, entry in entries.items() if name not in changed and entry['image_stat'] != (
+        _image_stat(os.path.join(context['image_dir'], entry['image'])) if entry.get('image') else None)]
+
+    jobs = [(os.path.join(markdown_dir, name), context) for name in changed]
+    if len(jobs) < POOL_THRESHOLD:
+        results = [_validate_safe(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_validate_safe, jobs, chunksize=32))
+    for name, result in zip(changed, results):
+        entries[name] = dict(result, stat=current[name])
+    if changed or removed:
+        with cache_lock:
+            save_media_cache(cache_name, state)
+
+    report = {name: list(entry['issues']) for name, entry in entries.items()}
+    by_url = {}
+    for name, entry in entries.items():
+        if entry['bandcamp']:
+            by_url.setdefault(entry['bandcamp'], []).append(name)
+    for names in by_url.values():
+        for name in names if len(names) > 1 else ():
+            others = ', '.join(other for other in sorted(names) if other != name)
+            report[name].append(_issue('error', 'bandcamp', f"same Bandcamp URL as {others}"))
+    return report, len(changed)
+
+def format_issue(path, issue):
+    level, field, message = issue
+    return f"{path}: {level}: {field + ' ' if field else ''}{message}"
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Check the track cards against the track template.")
+    parser.add_argument('paths', nargs='*', help="only report these cards (e.g. the files staged for a commit)")
+    parser.add_argument('--catalog', default=None, help="markdown catalog (default: MARKDOWN_OUTPUT_PATH)")
+    parser.add_argument('--images', default=None, help="artwork directory (default: IMAGE_OUTPUT_PATH)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--refresh', action='store_true', help="re-check every card, ignoring cached results")
+    parser.add_argument('--strict', action='store_true', help="fail on warnings too")
+    parser.add_argument('--json', action='store_true', help="print the issues as JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    paths = [os.path.abspath(path) for path in args.paths if path.endswith('.md')]
+    markdown_dir = os.path.expanduser(args.catalog or get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    if not markdown_dir and paths:
+        markdown_dir = os.path.commonpath([os.path.dirname(path) for path in paths])
+    image_dir = os.path.expanduser(args.images or get_setting('IMAGE_OUTPUT_PATH', ''))
+    if not os.path.isdir(markdown_dir) or not os.path.isdir(image_dir):
+        logger.error("Error: MARKDOWN_OUTPUT_PATH and IMAGE_OUTPUT_PATH (or --catalog and --images) must be directories")
+        return 2
+    if args.paths and not paths:
+        return 0
+
+    start = time.perf_counter()
+    report, checked = validate_catalog(markdown_dir, image_dir, workers=args.workers, refresh=args.refresh)
+    markdown_dir = os.path.abspath(markdown_dir)
+    if paths:
+        selected = {}
+        for path in paths:
+            if os.path.dirname(path) == markdown_dir:
+                selected[os.path.basename(path)] = report.get(os.path.basename(path), [])
+            else:
+                # Outside the catalog: checked on its own, without the duplicate check
+                selected[path] = validate_card(path, get_context(image_dir))['issues']
+        report = selected
+    elapsed = (time.perf_counter() - start) * 1000
+
+    failing = ('error', 'warning') if args.strict else ('error',)
+    counts = {'error': 0, 'warning': 0}
+    for issues in report.values():
+        for level, _, _ in issues:
+            counts[level] += 1
+    if args.json:
+        print(json.dumps({name: issues for name, issues in sorted(report.items()) if issues}, indent=2, ensure_ascii=False))
+    else:
+        for name, issues in sorted(report.items()):
+            path = name if os.path.isabs(name) else os.path.join(markdown_dir, name)
+            for issue in sorted(issues, key=lambda issue: (issue[0], issue[1] or '')):
+                print(format_issue(os.path.relpath(path), issue))
+        print(f"{len(report)} cards, {counts['error']} errors, {counts['warning']} warnings "
+              f"({checked} checked, {elapsed:.0f}ms)", file=sys.stderr)
+    return 1 if any(counts[level] for level in failing) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Find a ChromeDriver that matches the installed Chrome or Chromium.
+
+Detects the browser and its version, then looks for a driver with the same
+major version in the local caches of webdriver-manager (~/.wdm) and Selenium
+Manager (~/.cache/selenium) and on PATH, without touching the network. The
+result is remembered in the cache directory together with the browser
+binary's size and modification time, so later runs start Chrome without
+any lookups until the browser is updated. Only when no local driver matches
+is webdriver-manager asked to download one (or, without it, Selenium Manager).
+
+    python chromedriver_resolver.py            # show what would be used
+    python chromedriver_resolver.py --refresh  # forget the remembered driver and resolve again
+
+CHROME_BINARY and CHROMEDRIVER_PATH override the detection.
+"""
+import os
+import re
+import sys
+import glob
+import time
+import shutil
+import logging
+import argparse
+import platform
+import subprocess
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+
+logger = logging.getLogger('cardcreator.chromedriver')
+
+RESOLVER_CACHE_NAME = 'chromedriver'
+VERSION_PATTERN = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+)')
+
+CHROME_CANDIDATES = {
+    'mac': (
+        '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+        '/Applications/Chromium.app/Contents/MacOS/Chromium',
+        '~/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+    ),
+    'linux': ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser'),
+    'win': (
+        r'%PROGRAMFILES%\Google\Chrome\Application\chrome.exe',
+        r'%PROGRAMFILES(X86)%\Google\Chrome\Application\chrome.exe',
+        r'%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe',
+    ),
+}
+
+def detect_platform():
+    """Return the Chrome for Testing platform name: mac-arm64, mac-x64, linux64, win64 or win32."""
+    machine = platform.machine().lower()
+    if sys.platform == 'darwin':
+        return 'mac-arm64' if machine in ('arm64', 'aarch64') else 'mac-x64'
+    if sys.platform.startswith('win'):
+        return 'win64' if machine.endswith('64') else 'win32'
+    return 'linux64'
+
+def find_chrome_binary():
+    """Return the path of the installed Chrome or Chromium, or None."""
+    configured = os.getenv('CHROME_BINARY')
+    if configured:
+        return os.path.expanduser(configured)
+    family = detect_platform().split('-')[0].rstrip('0123456789')
+    for candidate in CHROME_CANDIDATES[family]:
+        path = os.path.expandvars(os.path.expanduser(candidate))
+        if os.path.isabs(path):
+            if os.path.exists(path):
+                return path
+        elif shutil.which(path):
+            return shutil.which(path)
+    return None
+
+def parse_version(text):
+    """Return the first a.b.c.d version in text as a tuple of ints, or None."""
+    match = VERSION_PATTERN.search(text or '')
+    return tuple(int(part) for part in match.groups()) if match else None
+
+def format_version(version):
+    return '.'.join(str(part) for part in version) if version else None
+
+def detect_chrome_version(binary):
+    """Ask a Chrome/Chromium binary for its version (tuple of ints), or None."""
+    if sys.platform.startswith('win'):
+        # chrome.exe --version opens a window instead of printing; read the registry
+        command = ['reg', 'query', r'HKCU\Software\Google\Chrome\BLBeacon', '/v', 'version']
+    else:
+        command = [binary, '--version']
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not get the Chrome version from %s: %s", binary, e)
+        return None
+    return parse_version(output)
+
+def driver_filename():
+    return 'chromedriver.exe' if sys.platform.startswith('win') else 'chromedriver'
+
+def local_drivers():
+    """
+    List the ChromeDriver binaries already on this machine.
+
+    Versions come from the cache directory layout, so nothing is executed.
+
+    Returns:
+        list: (version tuple or None, path) pairs
+    """
+    name = driver_filename()
+    patterns = (
+        # webdriver-manager: ~/.wdm/drivers/chromedriver/<os>/<version>/[chromedriver-<platform>/]chromedriver
+        os.path.join('~', '.wdm', 'drivers', 'chromedriver', '*', '*', name),
+        os.path.join('~', '.wdm', 'drivers', 'chromedriver', '*', '*', '*', name),
+        # Selenium Manager: ~/.cache/selenium/chromedriver/<platform>/<version>/chromedriver
+        os.path.join('~', '.cache', 'selenium', 'chromedriver', '*', '*', name),
+    )
+    drivers = []
+    for pattern in patterns:
+        for path in glob.glob(os.path.expanduser(pattern)):
+            if os.access(path, os.X_OK):
+                drivers.append((parse_version(path), path))
+    on_path = shutil.which(name)
+    if on_path:
+        drivers.append((None, on_path))
+    return drivers
+
+def driver_platform_matches(path, platform_name):
+    """Reject drivers cached for another platform (e.g. mac-x64 on an arm64 Mac)."""
+    parts = path.replace('\\', '/').split('/')
+    platforms = ('mac-arm64', 'mac-x64', 'linux64', 'win64', 'win32')
+    named = [part for part in parts if any(part.endswith(p) for p in platforms)]
+    return not named or any(part.endswith(platform_name) for part in named)
+
+def pick_driver(chrome_version, platform_name, drivers):
+    """
+    Choose the driver for a Chrome version: same major version, the exact
+    version if available, otherwise the newest build of that major.
+
+    Drivers whose version isn't in their path are asked with --version.
+    """
+    candidates = []
+    for version, path in drivers:
+        if not driver_platform_matches(path, platform_name):
+            continue
+        if version is None:
+            try:
+                output = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=10).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            version = parse_version(output)
+        if version and chrome_version and version[0] == chrome_version[0]:
+            candidates.append((version == chrome_version, version, path))
+    return max(candidates)[2] if candidates else None
+
+def download_driver(chrome_binary):
+    """Download a matching driver with webdriver-manager; returns its path or None."""
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        from webdriver_manager.core.os_manager import ChromeType
+    except ImportError:
+        return None
+    chrome_type = ChromeType.CHROMIUM if chrome_binary and 'chromium' in chrome_binary.lower() else ChromeType.GOOGLE
+    try:
+        return ChromeDriverManager(chrome_type=chrome_type).install()
+    except Exception as e:
+        logger.warning("webdriver-manager could not install ChromeDriver: %s", e)
+        return None
+
+def _binary_stat(path):
+    try:
+        stat = os.stat(os.path.realpath(path))
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, stat.st_mtime]
+
+def resolve_chromedriver():
+    """
+    Return the browser binary and the ChromeDriver to use.
+
+    Uses the remembered result while the browser binary is unchanged and the
+    driver still exists; otherwise detects, searches locally and downloads
+    only as a last resort.
+
+    Returns:
+        dict: chrome_binary, chrome_version, platform and driver_path (None
+            means leave it to Selenium Manager)
+    """
+    configured = os.getenv('CHROMEDRIVER_PATH')
+    chrome_binary = find_chrome_binary()
+    if configured:
+        return {'chrome_binary': chrome_binary, 'chrome_version': None, 'platform': detect_platform(),
+                'driver_path': os.path.expanduser(configured)}
+
+    key = chrome_binary or 'default'
+    stat = _binary_stat(chrome_binary)
+    remembered = load_media_cache(RESOLVER_CACHE_NAME).get(key)
+    if remembered and remembered.get('binary_stat') == stat and remembered.get('driver_path') \
+            and os.path.exists(remembered['driver_path']):
+        return remembered
+
+    platform_name = detect_platform()
+    chrome_version = detect_chrome_version(chrome_binary) if chrome_binary else None
+    driver_path = pick_driver(chrome_version, platform_name, local_drivers())
+    if driver_path:
+        logger.info("Using cached ChromeDriver %s", driver_path)
+    else:
+        logger.info("No local ChromeDriver for Chrome %s; downloading one", format_version(chrome_version) or '(unknown)')
+        driver_path = download_driver(chrome_binary)
+
+    resolution = {
+        'chrome_binary': chrome_binary,
+        'chrome_version': format_version(chrome_version),
+        'platform': platform_name,
+        'driver_path': driver_path,
+        'binary_stat': stat,
+        'resolved_at': time.time(),
+    }
+    if driver_path:
+        with cache_lock:
+            cache = load_media_cache(RESOLVER_CACHE_NAME)
+            cache[key] = resolution
+            save_media_cache(RESOLVER_CACHE_NAME, cache)
+    return resolution
+
+def forget_resolution():
+    """Drop the remembered drivers, e.g. after Chrome refused to start with one."""
+    with cache_lock:
+        save_media_cache(RESOLVER_CACHE_NAME, {})
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Show or refresh the ChromeDriver used for scraping.")
+    parser.add_argument('--refresh', action='store_true', help="forget the remembered driver and resolve again")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    if args.refresh:
+        forget_resolution()
+    start = time.perf_counter()
+    resolution = resolve_chromedriver()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Platform:     {resolution['platform']}")
+    print(f"Browser:      {resolution['chrome_binary'] or 'not found'} ({resolution['chrome_version'] or 'version unknown'})")
+    print(f"ChromeDriver: {resolution['driver_path'] or 'left to Selenium Manager'}")
+    print(f"Resolved in {elapsed:.1f}ms")
+
+if __name__ == "__main__":
+    main()
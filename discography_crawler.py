@@ -0,0 +1,426 @@
+"""
+Crawl a Bandcamp label or artist's discography and queue its tracks for cards.
+
+Starting from a Bandcamp root (e.g. https://somelabel.bandcamp.com), the crawler
+reads the /music page, fetches every release page concurrently and collects
+their track URLs. Requests to each host are limited in number and spaced
+out, robots.txt is respected and Retry-After is honoured.
+
+Crawl state (seen URLs, ETags, Last-Modified and last-crawled times, and the
+tracks already queued) is kept in the cache directory, so later crawls
+revalidate the discography page and only fetch releases they haven't seen:
+
+    python discography_crawler.py https://somelabel.bandcamp.com --inbox ~/kdzu/inbox.jsonl
+
+New tracks can be appended to a watch-mode inbox (--inbox), turned into cards
+right away (--create-cards) or just listed.
+"""
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
+from urllib.robotparser import RobotFileParser
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from metrics import inc, measure
+from page_archive import archive_page, archive_enabled
+
+logger = logging.getLogger('cardcreator.crawler')
+
+CRAWL_STATE_CACHE_NAME = 'crawl_state'
+USER_AGENT = 'CardCreator discography crawler (+https://kdzu.org)'
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+DEFAULT_DELAY = 1.0
+MAX_RETRIES = 3
+
+def normalize_root(url):
+    """Return the scheme://host root of a Bandcamp label or artist URL."""
+    if '://' not in url:
+        url = f"https://{url}"
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def release_kind(url):
+    """Return 'album', 'track' or None for a Bandcamp URL."""
+    match = re.match(r'/(album|track)/', urlparse(url).path)
+    return match.group(1) if match else None
+
+def strip_url(url):
+    """Drop query strings and fragments so the same release is only seen once."""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+class HostLimiter:
+    """
+    Per-host politeness: at most `per_host` requests in flight to a host and
+    at least `delay` seconds between the starts of consecutive requests.
+    """
+
+    def __init__(self, per_host=DEFAULT_PER_HOST, delay=DEFAULT_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_start = {}
+
+    def _semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+    def acquire(self, host):
+        self._semaphore(host).acquire()
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self._semaphore(host).release()
+
+    def back_off(self, host, seconds):
+        """Push back every later request to a host (after a 429 or 503)."""
+        with self.lock:
+            self.next_start[host] = max(self.next_start.get(host, 0), time.monotonic() + seconds)
+
+def load_crawl_state():
+    """
+    Return the saved crawl state.
+
+    Returns:
+        dict: 'pages' (URL -> etag, last_modified, last_crawled, tracks) and
+            'queued' (track URL -> time it was handed to card generation)
+    """
+    state = load_media_cache(CRAWL_STATE_CACHE_NAME)
+    state.setdefault('pages', {})
+    state.setdefault('queued', {})
+    return state
+
+def save_crawl_state(state):
+    with cache_lock:
+        save_media_cache(CRAWL_STATE_CACHE_NAME, state)
+
+class DiscographyCrawler:
+    """Discover the releases and tracks under a Bandcamp root."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, delay=DEFAULT_DELAY,
+                 refresh=False, state=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.workers = workers
+        self.refresh = refresh
+        self.limiter = HostLimiter(per_host, delay)
+        self.state = state if state is not None else load_crawl_state()
+        self.state_lock = threading.Lock()
+        self.robots = {}
+        self.robots_lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def allowed(self, url):
+        """Check robots.txt for the URL's host (fetched once per host)."""
+        root = normalize_root(url)
+        with self.robots_lock:
+            parser = self.robots.get(root)
+            if parser is None:
+                parser = RobotFileParser()
+                host = urlparse(root).netloc
+                self.limiter.acquire(host)
+                try:
+                    response = self.session.get(f"{root}/robots.txt", timeout=30)
+                    parser.parse(response.text.splitlines() if response.status_code == 200 else [])
+                except Exception:
+                    parser.parse([])
+                finally:
+                    self.limiter.release(host)
+                self.robots[root] = parser
+        return parser.can_fetch(USER_AGENT, url)
+
+    def fetch(self, url, conditional=True):
+        """
+        Fetch a page politely, revalidating it with the saved ETag/Last-Modified.
+
+        Returns:
+            str: The page HTML, or None if it is unchanged (304), disallowed or failed
+        """
+        if not self.allowed(url):
+            logger.info("Skipping %s (disallowed by robots.txt)", url)
+            return None
+
+        host = urlparse(url).netloc
+        with self.state_lock:
+            saved = dict(self.state['pages'].get(url, {}))
+        headers = {}
+        if conditional and saved.get('etag'):
+            headers['If-None-Match'] = saved['etag']
+        if conditional and saved.get('last_modified'):
+            headers['If-Modified-Since'] = saved['last_modified']
+
+        for attempt in range(MAX_RETRIES):
+            self.limiter.acquire(host)
+            try:
+                with measure('cardcreator_crawl_requests', help="Crawler page fetches") as outcome:
+                    response = self.session.get(url, headers=headers, timeout=30)
+                    if response.status_code >= 400:
+                        outcome['result'] = 'error'
+            except Exception as e:
+                logger.warning("Error fetching %s: %s", url, e, extra={'url': url})
+                response = None
+            finally:
+                self.limiter.release(host)
+
+            if response is None or response.status_code in (429, 500, 502, 503, 504):
+                retry_after = response.headers.get('Retry-After') if response is not None else None
+                wait = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt * 5
+                self.limiter.back_off(host, wait)
+                continue
+
+            if response.status_code == 304:
+                inc('cardcreator_crawl_not_modified_total', help="Crawler pages unchanged since the last crawl")
+                self._remember(url, last_crawled=time.time())
+                return None
+            if response.status_code != 200:
+                logger.warning("Fetching %s returned HTTP %s", url, response.status_code, extra={'url': url})
+                return None
+
+            if archive_enabled():
+                try:
+                    archive_page(url, response.text)
+                except Exception as e:
+                    logger.warning("Could not archive %s: %s", url, e)
+            self._remember(
+                url,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                last_crawled=time.time(),
+            )
+            return response.text
+
+        logger.error("Giving up on %s after %d attempts", url, MAX_RETRIES, extra={'url': url})
+        return None
+
+    def _remember(self, url, **fields):
+        with self.state_lock:
+            self.state['pages'].setdefault(url, {}).update(fields)
+
+    def discover_releases(self, root):
+        """
+        Read a label or artist's /music page.
+
+        The release list is remembered with the page, so an unchanged page
+        (or an older crawl state without the list) doesn't lose track of it.
+
+        Returns:
+            list: Release (album and standalone track) URLs, or None if the page
+                is unchanged since the last crawl (or couldn't be fetched)
+        """
+        from bs4 import BeautifulSoup
+
+        music_url = f"{root}/music"
+        with self.state_lock:
+            known = 'releases' in self.state['pages'].get(music_url, {})
+        html = self.fetch(music_url, conditional=known and not self.refresh)
+        if html is None:
+            return None
+
+        soup = BeautifulSoup(html, 'html.parser')
+        releases = []
+        for link in soup.select('#music-grid a[href], .music-grid a[href]'):
+            releases.append(strip_url(urljoin(root + '/', link['href'])))
+
+        # Bandcamp only renders part of a long discography; the rest is in data-client-items
+        grid = soup.find(attrs={'data-client-items': True})
+        if grid is not None:
+            try:
+                for item in json.loads(grid['data-client-items']):
+                    if item.get('page_url'):
+                        releases.append(strip_url(urljoin(root + '/', item['page_url'])))
+            except ValueError:
+                pass
+
+        # A root without a /music grid redirects to its only release
+        if not releases:
+            releases = [strip_url(meta['content']) for meta in soup.find_all('meta', property='og:url')
+                        if release_kind(meta.get('content', ''))]
+        releases = [url for url in dict.fromkeys(releases) if release_kind(url)]
+        self._remember(music_url, releases=releases)
+        return releases
+
+    def crawl_release(self, url):
+        """
+        Fetch a release page and return its track URLs.
+
+        Returns:
+            list: Track URLs (the URL itself for a standalone track)
+        """
+        from bs4 import BeautifulSoup
+
+        if release_kind(url) == 'track':
+            self._remember(url, last_crawled=time.time(), tracks=[url])
+            return [url]
+
+        html = self.fetch(url, conditional=not self.refresh)
+        if html is None:
+            with self.state_lock:
+                return list(self.state['pages'].get(url, {}).get('tracks', []))
+
+        soup = BeautifulSoup(html, 'html.parser')
+        tracks = []
+        element = soup.find(attrs={'data-tralbum': True})
+        if element is not None:
+            try:
+                for info in json.loads(element['data-tralbum']).get('trackinfo') or []:
+                    if info.get('title_link'):
+                        tracks.append(strip_url(urljoin(url, info['title_link'])))
+            except ValueError:
+                pass
+        if not tracks:
+            tracks = [strip_url(urljoin(url, link['href'])) for link in soup.select('#track_table a[href*="/track/"]')]
+        tracks = list(dict.fromkeys(tracks))
+        self._remember(url, tracks=tracks)
+        return tracks
+
+    def crawl(self, roots):
+        """
+        Crawl one or more label/artist roots.
+
+        Releases seen in earlier crawls are not fetched again unless the crawler
+        was created with refresh=True; their saved tracks are returned again
+        as long as they haven't been queued (e.g. when an earlier run was cut
+        short by --limit or a card failed).
+
+        Returns:
+            list: Track URLs not yet handed to card generation, in discovery order
+        """
+        roots = [normalize_root(root) for root in roots]
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawl') as executor:
+            release_lists = list(executor.map(self.discover_releases, roots))
+
+            releases = []
+            new = []
+            for root, found in zip(roots, release_lists):
+                with self.state_lock:
+                    if found is None:
+                        found = list(self.state['pages'].get(f"{root}/music", {}).get('releases', []))
+                        logger.info("%s: discography unchanged since the last crawl", root)
+                    unseen = [url for url in found if self.refresh or url not in self.state['pages']]
+                logger.info("%s: %d releases, %d new", root, len(found), len(unseen))
+                releases.extend(found)
+                new.extend(unseen)
+
+            new = list(dict.fromkeys(new))
+            fetched = dict(zip(new, executor.map(self.crawl_release, new)))
+
+        with self.state_lock:
+            tracks = []
+            for release in dict.fromkeys(releases):
+                found = fetched[release] if release in fetched else self.state['pages'].get(release, {}).get('tracks', [])
+                tracks.extend(url for url in found if url not in self.state['queued'])
+        save_crawl_state(self.state)
+        return list(dict.fromkeys(tracks))
+
+    def mark_queued(self, track_urls):
+        """Record that tracks were handed to card generation, so they aren't queued again."""
+        now = time.time()
+        with self.state_lock:
+            for url in track_urls:
+                self.state['queued'][url] = now
+        save_crawl_state(self.state)
+
+def append_to_inbox(inbox, track_urls, source, station=None):
+    """Append tracks to a watch-mode inbox file as JSON lines, tagged with a station if given."""
+    inbox = os.path.expanduser(inbox)
+    os.makedirs(os.path.dirname(os.path.abspath(inbox)), exist_ok=True)
+    with open(inbox, 'a', encoding='utf-8') as f:
+        for url in track_urls:
+            entry = {'url': url, 'source': source}
+            if station:
+                entry['station'] = station
+            f.write(json.dumps(entry) + '\n')
+
+def create_cards(track_urls):
+    """
+    Create cards for tracks one after another in a single warm Chrome.
+
+    Returns:
+        list: Track URLs whose cards were created
+    """
+    import card_creator
+
+    created = []
+    driver = card_creator.create_chrome_driver()
+    try:
+        for url in track_urls:
+            filepath, _, _ = card_creator.create_track_file(url, driver=driver)
+            if filepath:
+                created.append(url)
+    finally:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    return created
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+    from metrics import setup_metrics
+    from stations import set_default_station
+
+    # Before the parser, whose defaults come from INBOX_PATH and CRAWL_DELAY
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Crawl Bandcamp label/artist discographies for new tracks.")
+    parser.add_argument('roots', nargs='+', help="Bandcamp label or artist URLs, e.g. https://somelabel.bandcamp.com")
+    parser.add_argument('--inbox', default=os.getenv('INBOX_PATH'), help="append new tracks to this watch-mode inbox")
+    parser.add_argument('--create-cards', action='store_true', help="create cards for new tracks right away")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="concurrent requests overall")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help="concurrent requests per host")
+    parser.add_argument('--delay', type=float, default=float(os.getenv('CRAWL_DELAY', DEFAULT_DELAY)),
+                        help="seconds between requests to the same host")
+    parser.add_argument('--refresh', action='store_true', help="refetch every release, not just new ones")
+    parser.add_argument('--limit', type=int, default=None, help="queue at most this many new tracks")
+    parser.add_argument('--station', default=None, help="station profile the new tracks are for (default: STATION)")
+    args = parser.parse_args()
+
+    setup_logging()
+    setup_metrics()
+    try:
+        set_default_station(args.station)
+    except ValueError as e:
+        logger.error("Error: %s", e)
+        return
+
+    crawler = DiscographyCrawler(workers=args.workers, per_host=args.per_host, delay=args.delay, refresh=args.refresh)
+    tracks = crawler.crawl(args.roots)
+    if args.limit is not None:
+        tracks = tracks[:args.limit]
+    logger.info("%d new tracks", len(tracks))
+
+    if args.create_cards:
+        import card_creator
+        if not card_creator.validate_paths():
+            return
+        crawler.mark_queued(create_cards(tracks))
+    elif args.inbox:
+        append_to_inbox(args.inbox, tracks, source='crawl', station=args.station)
+        crawler.mark_queued(tracks)
+        logger.info("Added %d tracks to %s", len(tracks), args.inbox)
+    else:
+        for url in tracks:
+            print(url)
+
+if __name__ == "__main__":
+    main()
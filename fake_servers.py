@@ -0,0 +1,400 @@
+"""
+Local stand-ins for the Mastodon, Bluesky (atproto XRPC) and Instagram APIs.
+
+They implement just enough of each API for the posters to log in, upload an
+image and publish a post, with optional latency and error injection, so the
+posting path can be tested and benchmarked without posting anything publicly.
+
+Run this file to start all three servers and print the environment variables
+that point the posters at them:
+
+    python fake_servers.py --latency-ms 50 --error-rate 0.01
+"""
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class FakeServer(ThreadingHTTPServer):
+    """HTTP server that injects latency and errors before routing a request."""
+    daemon_threads = True
+
+    def __init__(self, address, handler_class, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 media_processing_ms=0):
+        super().__init__(address, handler_class)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.media_processing_ms = media_processing_ms
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.request_counts = {}
+        self.media = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_id(self):
+        with self.lock:
+            return next(self.ids)
+
+    def count(self, route):
+        with self.lock:
+            self.request_counts[route] = self.request_counts.get(route, 0) + 1
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Base handler: subclasses implement route(method, path, body)."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = urlparse(self.path).path
+
+        delay = self.server.latency_ms + random.uniform(0, self.server.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count('injected_error')
+            return self.send_json(503, {'error': 'Injected failure'})
+
+        try:
+            status, payload, headers = self.route(method, path, body)
+        except Exception as e:
+            status, payload, headers = 500, {'error': str(e)}, {}
+        self.server.count(f"{method} {self.route_name(path)}")
+        self.send_json(status, payload, headers)
+
+    def route_name(self, path):
+        return re.sub(r'/\d[^/]*', '/{id}', path)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+def _now_iso():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+class MastodonHandler(FakeHandler):
+    """Mastodon REST API: instance info, async media upload and statuses."""
+
+    def media_entry(self, media_id):
+        media = self.server.media[media_id]
+        ready = time.monotonic() >= media['ready_at']
+        url = f"{self.server.base_url}/media/{media_id}.jpg" if ready else None
+        return {
+            'id': str(media_id),
+            'type': 'image',
+            'url': url,
+            'preview_url': url,
+            'remote_url': None,
+            'description': media['description'],
+            'blurhash': None,
+            'meta': {},
+        }
+
+    def route(self, method, path, body):
+        path = path.rstrip('/')
+        if method == 'GET' and path in ('/api/v1/instance', '/api/v2/instance'):
+            return 200, {'uri': 'localhost', 'title': 'Fake Mastodon', 'version': '4.2.0'}, {}
+
+        if method == 'POST' and path in ('/api/v1/media', '/api/v2/media'):
+            media_id = self.server.next_id()
+            processing = path.startswith('/api/v2') and self.server.media_processing_ms
+            self.server.media[media_id] = {
+                'ready_at': time.monotonic() + (self.server.media_processing_ms / 1000 if processing else 0),
+                'description': None,
+                'attached': False,
+            }
+            entry = self.media_entry(media_id)
+            return (202 if entry['url'] is None else 200), entry, {}
+
+        match = re.fullmatch(r'/api/v1/media/(\d+)', path)
+        if method == 'GET' and match:
+            media_id = int(match.group(1))
+            if media_id not in self.server.media:
+                return 404, {'error': 'Record not found'}, {}
+            entry = self.media_entry(media_id)
+            return (206 if entry['url'] is None else 200), entry, {}
+
+        if method == 'POST' and path == '/api/v1/statuses':
+            fields = _parse_form(body, self.headers.get('Content-Type', ''))
+            media_ids = [int(m) for m in fields.get('media_ids[]', [])]
+            for media_id in media_ids:
+                media = self.server.media.get(media_id)
+                if not media or media['attached']:
+                    return 422, {'error': 'Validation failed: media already attached or missing'}, {}
+                if time.monotonic() < media['ready_at']:
+                    return 422, {'error': 'Cannot attach files that have not finished processing'}, {}
+            for media_id in media_ids:
+                self.server.media[media_id]['attached'] = True
+            status_id = self.server.next_id()
+            return 200, {
+                'id': str(status_id),
+                'created_at': _now_iso(),
+                'url': f"{self.server.base_url}/@fake/{status_id}",
+                'content': (fields.get('status') or [''])[0],
+                'visibility': (fields.get('visibility') or ['public'])[0],
+                'media_attachments': [self.media_entry(m) for m in media_ids],
+            }, {}
+
+        return 404, {'error': 'Not found'}, {}
+
+def _parse_form(body, content_type):
+    """Parse urlencoded or JSON request bodies into a dict of lists."""
+    if 'json' in content_type:
+        data = json.loads(body or b'{}')
+        return {k: (v if isinstance(v, list) else [v]) for k, v in data.items()}
+    return parse_qs(body.decode('utf-8', 'replace'))
+
+def _fake_jwt(subject):
+    """Unverified JWT; every segment, signature included, must still be valid base64url for atproto."""
+    def encode(part):
+        return base64.urlsafe_b64encode(part).rstrip(b'=').decode()
+    now = int(time.time())
+    payload = {'scope': 'com.atproto.access', 'sub': subject, 'iat': now, 'exp': now + 3600}
+    header = json.dumps({'typ': 'JWT', 'alg': 'HS256'}).encode()
+    return f"{encode(header)}.{encode(json.dumps(payload).encode())}.{encode(b'fake-signature')}"
+
+def _blob_cid(data):
+    """CIDv1 (raw codec, sha2-256) in base32, as a PDS would return for a blob."""
+    raw = bytes([0x01, 0x55, 0x12, 0x20]) + hashlib.sha256(data).digest()
+    return 'b' + base64.b32encode(raw).decode().lower().rstrip('=')
+
+class BlueskyHandler(FakeHandler):
+    """atproto XRPC endpoints used by login, uploadBlob and send_post."""
+    DID = 'did:plc:fakecardcreator0000000000'
+    HANDLE = 'fake.bsky.social'
+
+    def route(self, method, path, body):
+        if not path.startswith('/xrpc/'):
+            return 404, {'error': 'NotFound'}, {}
+        nsid = path[len('/xrpc/'):]
+
+        if nsid in ('com.atproto.server.createSession', 'com.atproto.server.refreshSession'):
+            return 200, {
+                'accessJwt': _fake_jwt(self.DID),
+                'refreshJwt': _fake_jwt(self.DID),
+                'handle': self.HANDLE,
+                'did': self.DID,
+            }, {}
+
+        if nsid == 'app.bsky.actor.getProfile':
+            return 200, {'did': self.DID, 'handle': self.HANDLE, 'displayName': 'Fake Station'}, {}
+
+        if nsid == 'com.atproto.repo.uploadBlob':
+            cid = _blob_cid(body)
+            self.server.media[cid] = len(body)
+            return 200, {'blob': {
+                '$type': 'blob',
+                'ref': {'$link': cid},
+                'mimeType': self.headers.get('Content-Type', 'application/octet-stream'),
+                'size': len(body),
+            }}, {}
+
+        if nsid == 'com.atproto.repo.createRecord':
+            record = json.loads(body or b'{}')
+            for image in record.get('record', {}).get('embed', {}).get('images', []):
+                cid = image.get('image', {}).get('ref', {}).get('$link')
+                if cid not in self.server.media:
+                    return 400, {'error': 'BlobNotFound', 'message': f'Could not find blob: {cid}'}, {}
+            rkey = f"3kfake{self.server.next_id():08d}"
+            return 200, {
+                'uri': f"at://{self.DID}/app.bsky.feed.post/{rkey}",
+                'cid': _blob_cid(body),
+            }, {}
+
+        return 501, {'error': 'MethodNotImplemented', 'message': nsid}, {}
+
+# RSA public key (and its id) handed out by the fake Instagram pre-login sync.
+# instagrapi encrypts the login password against it; the fake never decrypts.
+INSTAGRAM_PASSWORD_KEY_ID = 41
+INSTAGRAM_PASSWORD_PUB_KEY = """-----BEGIN PUBLIC KEY-----
+MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAzUxKwaZymy5rwq8tqTdh
+7PkUuwUgguF7TsNBwdL/bVXgiBKaU6lRURQNnJll0g5ISvECIOgyNRMFxbXzwpII
+IUvzwL8i8qyRTrN88qjW9crXhr0cjWpajQIDbnfdjtZMZYnJCkEilM7k8tL5vEnJ
+7CpzXsOEHfCYE0aaJb8Nh2WXgf1qCJ9VEgYxKPhz1qdAg8dh5zjQe6lkGpwuYpul
+UpxCBM28bRiW4CZOhfeL054OAka6BM0eov4kjoIsL0nH9rWf9hlph+hULBtuIkLt
+cuJUIPHez+prifTQ2Pl6Fvih0Ud+9IKUnr3HaFPALJqm1Gw3R1g74CoDDF41oayM
+RwIDAQAB
+-----END PUBLIC KEY-----
+"""
+
+class InstagramHandler(FakeHandler):
+    """
+    Private API endpoints used by instagrapi for login, photo upload and logout.
+
+    Requests arrive through instagram_poster.RewritingAdapter, so paths look like
+    /i.instagram.com/api/v1/accounts/login/. The pre-login qe/sync hands out
+    the password encryption key, as Instagram does; endpoints that aren't
+    modelled (other syncs, feeds) answer with a bare {"status": "ok"}.
+    Modelled on instagrapi 2.1.2, the version pinned in requirements.txt.
+    """
+    USER_PK = '1234567890'
+    USERNAME = 'fake_station'
+
+    def user(self):
+        return {
+            'pk': self.USER_PK,
+            'username': self.USERNAME,
+            'full_name': 'Fake Station',
+            'profile_pic_url': f"{self.server.base_url}/avatar.jpg",
+            'is_private': False,
+        }
+
+    def route(self, method, path, body):
+        # Drop the original host segment added by the rewriting adapter
+        endpoint = re.sub(r'^/[^/]+\.(?:instagram|facebook)\.com', '', path)
+
+        if endpoint.startswith('/rupload_igphoto/'):
+            upload_id = re.sub(r'\D', '', endpoint.split('/')[-1].split('_')[0]) or str(int(time.time() * 1000))
+            self.server.media[upload_id] = len(body)
+            return 200, {'upload_id': upload_id, 'xsharing_nonces': {}, 'status': 'ok'}, {}
+
+        if endpoint.rstrip('/') == '/api/v1/qe/sync':
+            return 200, {'experiments': [], 'status': 'ok'}, {
+                'ig-set-password-encryption-key-id': str(INSTAGRAM_PASSWORD_KEY_ID),
+                'ig-set-password-encryption-pub-key': base64.b64encode(INSTAGRAM_PASSWORD_PUB_KEY.encode()).decode(),
+            }
+
+        if endpoint.rstrip('/') == '/api/v1/accounts/login':
+            auth = base64.b64encode(json.dumps({
+                'ds_user_id': self.USER_PK,
+                'sessionid': f"{self.USER_PK}%3Afake%3A{self.server.next_id()}",
+            }).encode()).decode()
+            return 200, {'logged_in_user': self.user(), 'status': 'ok'}, {
+                'ig-set-authorization': f"Bearer IGT:2:{auth}",
+                'ig-set-ig-u-ds-user-id': self.USER_PK,
+            }
+
+        if endpoint.rstrip('/') == '/api/v1/media/configure':
+            media_pk = str(10 ** 18 + self.server.next_id())
+            fields = _parse_form(body, self.headers.get('Content-Type', ''))
+            caption = ''
+            signed = (fields.get('signed_body') or [''])[0]
+            if '.' in signed:
+                try:
+                    caption = json.loads(signed.split('.', 1)[1]).get('caption', '')
+                except ValueError:
+                    pass
+            return 200, {'media': {
+                'pk': media_pk,
+                'id': f"{media_pk}_{self.USER_PK}",
+                'code': f"Fake{media_pk[-6:]}",
+                'taken_at': int(time.time()),
+                'media_type': 1,
+                'product_type': 'feed',
+                'user': self.user(),
+                'caption': {'text': caption},
+                'image_versions2': {'candidates': [{
+                    'url': f"{self.server.base_url}/media/{media_pk}.jpg",
+                    'width': 1080,
+                    'height': 1080,
+                }]},
+                'like_count': 0,
+                'comment_count': 0,
+                'usertags': {'in': []},
+            }, 'status': 'ok'}, {}
+
+        return 200, {'status': 'ok'}, {}
+
+def start_fake_servers(latency_ms=0, jitter_ms=0, error_rate=0.0, media_processing_ms=0, host='127.0.0.1'):
+    """
+    Start the three fake servers on free ports in background threads.
+
+    Args:
+        latency_ms (float): Fixed delay added to every request
+        jitter_ms (float): Extra random delay of up to this many milliseconds
+        error_rate (float): Fraction of requests answered with HTTP 503
+        media_processing_ms (float): How long Mastodon v2 uploads stay "processing"
+        host (str): Interface to bind
+
+    Returns:
+        dict: Servers keyed by 'mastodon', 'bluesky' and 'instagram'
+    """
+    servers = {}
+    for name, handler in (('mastodon', MastodonHandler), ('bluesky', BlueskyHandler), ('instagram', InstagramHandler)):
+        server = FakeServer((host, 0), handler, latency_ms, jitter_ms, error_rate, media_processing_ms)
+        threading.Thread(target=server.serve_forever, name=f"fake-{name}", daemon=True).start()
+        servers[name] = server
+    return servers
+
+def stop_fake_servers(servers):
+    """Shut down servers started by start_fake_servers."""
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+def fake_server_env(servers):
+    """Return the environment variables that point the posters at the fake servers."""
+    return {
+        'MASTODON_URL': servers['mastodon'].base_url,
+        'MASTODON_ACCESS_TOKEN': 'fake-mastodon-token',
+        'BLUESKY_SERVICE_URL': f"{servers['bluesky'].base_url}/xrpc",
+        'BLUESKY_HANDLE': BlueskyHandler.HANDLE,
+        'BLUESKY_PASSWORD': 'fake-password',
+        'INSTAGRAM_API_BASE_URL': servers['instagram'].base_url,
+        'INSTAGRAM_USERNAME': InstagramHandler.USERNAME,
+        'INSTAGRAM_PASSWORD': 'fake-password',
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local fake Mastodon, Bluesky and Instagram servers.")
+    parser.add_argument('--latency-ms', type=float, default=0, help="fixed delay per request")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="random extra delay per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests that fail with 503")
+    parser.add_argument('--media-processing-ms', type=float, default=0,
+                        help="how long Mastodon async uploads stay in processing")
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    servers = start_fake_servers(args.latency_ms, args.jitter_ms, args.error_rate,
+                                 args.media_processing_ms, args.host)
+    print("Fake servers running. Point the posters at them with:\n")
+    for key, value in fake_server_env(servers).items():
+        print(f"export {key}={value}")
+    print("\nPress Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for name, server in servers.items():
+            print(f"{name}: {json.dumps(server.request_counts, sort_keys=True)}")
+        stop_fake_servers(servers)
+
+if __name__ == "__main__":
+    main()
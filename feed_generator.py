@@ -0,0 +1,320 @@
+"""
+Generate RSS and JSON feeds and a weekly digest of the tracks we love.
+
+Keeps an index of the cards in MARKDOWN_OUTPUT_PATH sorted by pubDate in
+the cache directory. Each run only re-reads cards that are new or changed,
+and only the reviews of the items actually written out are read, so a run
+takes about as long with thousands of cards as with a hundred:
+
+    python feed_generator.py                    # rss.xml and feed.json in FEED_OUTPUT_PATH
+    python feed_generator.py --digest           # plus digest-<year>-W<week>.md for last week
+    python feed_generator.py --digest 2026-W41  # digest for a given ISO week
+
+Cards whose review hasn't been written yet are left out.
+"""
+import os
+import json
+import bisect
+import hashlib
+import logging
+import argparse
+import datetime
+import xml.etree.ElementTree as ET
+from email.utils import format_datetime
+from html import escape
+
+import pytz
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from catalog_search import scan_catalog
+from track_frontmatter import parse_frontmatter
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.feeds')
+
+FEED_CACHE_NAME = 'feed_index'
+DEFAULT_FEED_LIMIT = 50
+DEFAULT_FEED_TITLE = 'KDZU Tracks We Love'
+# Card fields kept in the index
+INDEX_FIELDS = ('title', 'artist', 'label', 'heroImage', 'bandcamp', 'pubDate', 'tags')
+# Bumped when the index format or what counts as a draft changes, so old indexes are rebuilt
+FEED_INDEX_VERSION = 2
+
+def get_site_url():
+    return get_setting('MORE_TRACKS_URL', 'https://kdzu.org/tracks-we-love').rstrip('/')
+
+def is_valid_pub_date(value):
+    """True for a pubDate written as YYYY-MM-DD, the only form the index can sort by."""
+    try:
+        # strptime alone also takes 2025-6-6, which would sort after 2025-06-10
+        return datetime.datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d') == value
+    except (TypeError, ValueError):
+        return False
+
+def card_url(name):
+    """Link to a card's page on the site (MORE_TRACKS_URL/<file name without .md>)."""
+    return f"{get_site_url()}/{os.path.splitext(name)[0]}"
+
+class FeedIndex:
+    """The cards' metadata plus a list of (pubDate, file name) kept in sorted order."""
+
+    def __init__(self, markdown_dir):
+        self.markdown_dir = os.path.abspath(markdown_dir)
+        # One index per catalog, so stations with their own catalogs don't evict each other
+        key = hashlib.sha1(self.markdown_dir.encode('utf-8')).hexdigest()[:12]
+        self.cache_name = f"{FEED_CACHE_NAME}-{key}"
+        state = load_media_cache(self.cache_name)
+        if state.get('markdown_dir') != self.markdown_dir or state.get('version') != FEED_INDEX_VERSION:
+            state = {}
+        self.entries = state.get('entries', {})
+        self.order = [tuple(item) for item in state.get('order', [])]
+
+    def save(self):
+        with cache_lock:
+            save_media_cache(self.cache_name, {
+                'version': FEED_INDEX_VERSION,
+                'markdown_dir': self.markdown_dir,
+                'entries': self.entries,
+                'order': self.order,
+            })
+
+    def _remove(self, name):
+        entry = self.entries.pop(name, None)
+        if entry and not entry['draft']:
+            position = bisect.bisect_left(self.order, (entry['pubDate'], name))
+            if position < len(self.order) and self.order[position] == (entry['pubDate'], name):
+                del self.order[position]
+
+    def update(self):
+        """
+        Re-read new and changed cards and drop deleted ones.
+
+        Returns:
+            tuple: (number of cards read, number removed)
+        """
+        from card_creator import REVIEW_PLACEHOLDER
+
+        known = {name: entry['stat'] for name, entry in self.entries.items()}
+        changed, removed, current = scan_catalog(self.markdown_dir, known)
+        for name in removed:
+            self._remove(name)
+        for name in changed:
+            self._remove(name)
+            path = os.path.join(self.markdown_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    fields, body = parse_frontmatter(f.read())
+            except (OSError, ValueError) as e:
+                logger.warning("Skipping %s: %s", path, e)
+                continue
+            entry = {key: fields.get(key, '') for key in INDEX_FIELDS}
+            entry['stat'] = current[name]
+            entry['draft'] = not body or body == REVIEW_PLACEHOLDER or not entry['pubDate']
+            if entry['pubDate'] and not is_valid_pub_date(entry['pubDate']):
+                # Would sort in the wrong place and can't be dated in the feeds
+                logger.warning("Leaving %s out of the feeds: pubDate %r is not YYYY-MM-DD", path, entry['pubDate'])
+                entry['draft'] = True
+            self.entries[name] = entry
+            if not entry['draft']:
+                bisect.insort(self.order, (entry['pubDate'], name))
+        if changed or removed:
+            self.save()
+        return len(changed), len(removed)
+
+    def latest(self, limit):
+        """Return the file names of the newest published cards, newest first."""
+        return [name for _, name in reversed(self.order[-limit:])] if limit else []
+
+    def between(self, start, end):
+        """Return the file names of cards published from start to end (inclusive dates), newest first."""
+        low = bisect.bisect_left(self.order, (start.isoformat(), ''))
+        high = bisect.bisect_right(self.order, (end.isoformat(), '\U0010ffff'))
+        return [name for _, name in reversed(self.order[low:high])]
+
+    def item(self, name):
+        """Return a card's indexed fields plus its review, read from disk."""
+        with open(os.path.join(self.markdown_dir, name), 'r', encoding='utf-8') as f:
+            _, body = parse_frontmatter(f.read())
+        return dict(self.entries[name], name=name, review=body, url=card_url(name))
+
+def _published_at(item):
+    """A card's pubDate as an aware datetime (midnight Pacific, as create_track_file dates it)."""
+    date = datetime.date.fromisoformat(item['pubDate'])
+    return pytz.timezone('US/Pacific').localize(datetime.datetime(date.year, date.month, date.day))
+
+def _review_html(item):
+    paragraphs = [f"<p>{escape(p.strip())}</p>" for p in item['review'].split('\n\n') if p.strip()]
+    image = f'<p><img src="{escape(item["heroImage"])}" alt="{escape(item["title"])} artwork"></p>' if item['heroImage'] else ''
+    listen = f'<p><a href="{escape(item["bandcamp"])}">Listen on Bandcamp</a></p>' if item['bandcamp'] else ''
+    return image + ''.join(paragraphs) + listen
+
+def build_rss(items, title):
+    """Render items as an RSS 2.0 document."""
+    rss = ET.Element('rss', version='2.0')
+    channel = ET.SubElement(rss, 'channel')
+    ET.SubElement(channel, 'title').text = title
+    ET.SubElement(channel, 'link').text = get_site_url()
+    ET.SubElement(channel, 'description').text = f"New reviews from {title}"
+    if items:
+        # The newest card's date, so unchanged feeds render byte-for-byte the same
+        ET.SubElement(channel, 'lastBuildDate').text = format_datetime(_published_at(items[0]))
+    for item in items:
+        entry = ET.SubElement(channel, 'item')
+        ET.SubElement(entry, 'title').text = f"{item['artist']} - {item['title']}"
+        ET.SubElement(entry, 'link').text = item['url']
+        ET.SubElement(entry, 'guid', isPermaLink='false').text = item['bandcamp'] or item['url']
+        ET.SubElement(entry, 'pubDate').text = format_datetime(_published_at(item))
+        for tag in item['tags'] or []:
+            ET.SubElement(entry, 'category').text = tag
+        ET.SubElement(entry, 'description').text = _review_html(item)
+    ET.indent(rss)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(rss, encoding='unicode') + '\n'
+
+def build_json_feed(items, title):
+    """Render items as a JSON Feed 1.1 document."""
+    feed = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': get_site_url(),
+        'items': [{
+            'id': item['bandcamp'] or item['url'],
+            'url': item['url'],
+            'external_url': item['bandcamp'] or None,
+            'title': f"{item['artist']} - {item['title']}",
+            'content_html': _review_html(item),
+            'content_text': item['review'],
+            'image': item['heroImage'] or None,
+            'date_published': _published_at(item).isoformat(),
+            'authors': [{'name': item['artist']}],
+            'tags': item['tags'] or [],
+        } for item in items],
+    }
+    if get_setting('FEED_BASE_URL'):
+        feed['feed_url'] = f"{get_setting('FEED_BASE_URL').rstrip('/')}/feed.json"
+    for item in feed['items']:
+        for key in [key for key, value in item.items() if value is None]:
+            del item[key]
+    return json.dumps(feed, indent=2, ensure_ascii=False) + '\n'
+
+def parse_week(value):
+    """Return the Monday and Sunday of an ISO week like '2026-W41'."""
+    year, week = value.upper().split('-W')
+    monday = datetime.date.fromisocalendar(int(year), int(week), 1)
+    return monday, monday + datetime.timedelta(days=6)
+
+def last_week(today=None):
+    """Return the ISO week before the current one, e.g. '2026-W41'."""
+    year, week, _ = ((today or datetime.date.today()) - datetime.timedelta(days=7)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+def build_digest(items, week, title):
+    """Render a week's cards as a markdown digest, oldest first."""
+    monday, sunday = parse_week(week)
+    lines = [
+        '---',
+        f'title: "{title}: week of {monday.strftime("%B")} {monday.day}, {monday.year}"',
+        f'pubDate: {sunday.isoformat()}',
+        f'week: "{week}"',
+        f'tracks: {len(items)}',
+        '---',
+        '',
+    ]
+    for item in reversed(items):
+        lines.append(f"## {item['artist']} - {item['title']}")
+        lines.append('')
+        details = [item['label']] if item['label'] else []
+        details.append(f"[Review]({item['url']})")
+        if item['bandcamp']:
+            details.append(f"[Bandcamp]({item['bandcamp']})")
+        lines.append(' · '.join(details))
+        lines.append('')
+        lines.append(item['review'])
+        lines.append('')
+    return '\n'.join(lines)
+
+def write_if_changed(path, content):
+    """Write a file only when its content changes, so the site repo isn't touched needlessly."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+def generate_feeds(markdown_dir, output_dir, limit=DEFAULT_FEED_LIMIT, digest_week=None):
+    """
+    Update the index and write rss.xml, feed.json and optionally a weekly digest.
+
+    Args:
+        markdown_dir (str): The markdown catalog
+        output_dir (str): Where to write the feeds
+        limit (int): Number of newest cards in the feeds
+        digest_week (str, optional): ISO week ('2026-W41') to write a digest for
+
+    Returns:
+        list: Paths of the files that changed
+    """
+    title = get_setting('FEED_TITLE', DEFAULT_FEED_TITLE)
+    index = FeedIndex(markdown_dir)
+    read, removed = index.update()
+    logger.info("Feed index: %d cards read, %d removed, %d published", read, removed, len(index.order))
+
+    os.makedirs(output_dir, exist_ok=True)
+    items = [index.item(name) for name in index.latest(limit)]
+    outputs = {
+        'rss.xml': build_rss(items, title),
+        'feed.json': build_json_feed(items, title),
+    }
+    if digest_week:
+        monday, sunday = parse_week(digest_week)
+        week_items = [index.item(name) for name in index.between(monday, sunday)]
+        outputs[f"digest-{digest_week}.md"] = build_digest(week_items, digest_week, title)
+
+    changed = []
+    for filename, content in outputs.items():
+        path = os.path.join(output_dir, filename)
+        if write_if_changed(path, content):
+            changed.append(path)
+    return changed
+
+def main():
+    import time
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Generate RSS/JSON feeds and weekly digests of the track cards.")
+    parser.add_argument('--output', default=None, help="output directory (default: FEED_OUTPUT_PATH or ./feeds)")
+    parser.add_argument('--limit', type=int, default=None, help=f"cards per feed (default: FEED_LIMIT or {DEFAULT_FEED_LIMIT})")
+    parser.add_argument('--digest', nargs='?', const='last', default=None, metavar='YEAR-Wweek',
+                        help="also write a weekly digest (default week: last week)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    markdown_dir = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    if not os.path.isdir(markdown_dir):
+        logger.error("Error: MARKDOWN_OUTPUT_PATH must point to the markdown catalog")
+        return
+    output_dir = os.path.expanduser(args.output or get_setting('FEED_OUTPUT_PATH', 'feeds'))
+    limit = args.limit if args.limit is not None else int(get_setting('FEED_LIMIT', DEFAULT_FEED_LIMIT))
+    week = last_week() if args.digest == 'last' else args.digest
+    if week:
+        try:
+            parse_week(week)
+        except ValueError:
+            logger.error("Error: --digest takes an ISO week like 2026-W41")
+            return
+
+    start = time.perf_counter()
+    changed = generate_feeds(markdown_dir, output_dir, limit=limit, digest_week=week)
+    for path in changed:
+        print(f"Wrote {path}")
+    print(f"{len(changed)} files changed in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import re
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from track_frontmatter import parse_frontmatter_value
+from stations import get_setting
+
+TAG_SETS_CACHE_NAME = 'hashtag_sets'
+
+DEFAULT_MAX_HASHTAGS = 10
+
+def normalize_hashtag(tag):
+    """
+    Turn a free-form tag (e.g. a Bandcamp genre tag) into a hashtag body.
+
+    "Drum & Bass" becomes "drumandbass" and "#Lo-Fi" becomes "lofi".
+    Returns an empty string for tags that can't be used as hashtags.
+    """
+    tag = tag.strip().lstrip('#').lower().replace('&', 'and')
+    tag = re.sub(r'[^\w]', '', tag)
+    # Hashtags made only of digits (or underscores) aren't linked by the platforms
+    if not re.search(r'[^\d_]', tag):
+        return ''
+    return tag
+
+def parse_tag_list(value):
+    """
+    Parse tags given as a list, a frontmatter flow list or a separated string.
+
+    Strings containing commas are split on commas (so "Drum & Bass, Dub" keeps
+    multi-word tags together); otherwise they are split on whitespace.
+    """
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    value = value.strip()
+    if value.startswith('['):
+        return parse_frontmatter_value(value)
+    separator = r'\s*,\s*' if ',' in value else r'\s+'
+    return [tag for tag in re.split(separator, value) if tag]
+
+def get_default_hashtags():
+    """Return the station's default hashtags from DEFAULT_HASHTAGS (comma separated)."""
+    return parse_tag_list(get_setting('DEFAULT_HASHTAGS', ''))
+
+def get_cached_tag_sets(artist=None, label=None):
+    """
+    Return tags previously used for this artist and label.
+
+    Returns:
+        tuple: (artist tags, label tags)
+    """
+    cache = load_media_cache(TAG_SETS_CACHE_NAME)
+    artist_tags = cache.get('artist', {}).get((artist or '').lower(), [])
+    label_tags = cache.get('label', {}).get((label or '').lower(), [])
+    return artist_tags, label_tags
+
+def remember_tag_sets(tags, artist=None, label=None):
+    """Remember the normalized tags seen for an artist and label."""
+    tags = [normalize_hashtag(tag) for tag in tags]
+    tags = [tag for tag in dict.fromkeys(tags) if tag]
+    if not tags or not (artist or label):
+        return
+
+    with cache_lock:
+        cache = load_media_cache(TAG_SETS_CACHE_NAME)
+        for kind, name in (('artist', artist), ('label', label)):
+            if not name:
+                continue
+            known = cache.setdefault(kind, {}).get(name.lower(), [])
+            cache[kind][name.lower()] = list(dict.fromkeys(known + tags))
+        save_media_cache(TAG_SETS_CACHE_NAME, cache)
+
+def build_hashtags(tags=None, artist=None, label=None, max_tags=None):
+    """
+    Build the hashtag list for a track without prompting.
+
+    Station defaults come first, then the track's own tags. When the track has
+    no tags, the tags cached for its artist and label are used instead.
+
+    Args:
+        tags (list, optional): Raw tags for the track (e.g. scraped from Bandcamp)
+        artist (str, optional): Artist name
+        label (str, optional): Label name
+        max_tags (int, optional): Maximum number of hashtags (default MAX_HASHTAGS or 10)
+
+    Returns:
+        list: Hashtags including the leading '#'
+    """
+    if max_tags is None:
+        max_tags = int(get_setting('MAX_HASHTAGS', DEFAULT_MAX_HASHTAGS))
+
+    tags = parse_tag_list(tags)
+    if tags:
+        remember_tag_sets(tags, artist, label)
+    else:
+        artist_tags, label_tags = get_cached_tag_sets(artist, label)
+        tags = artist_tags + label_tags
+
+    merged = [normalize_hashtag(tag) for tag in get_default_hashtags() + tags]
+    merged = [tag for tag in dict.fromkeys(merged) if tag]
+    return ['#' + tag for tag in merged[:max_tags]]
+
+def format_hashtags(hashtags):
+    """Join a hashtag list into the space-separated form used in captions."""
+    return ' '.join(hashtags)
+
+def prompt_hashtag_override(hashtags):
+    """
+    Show the suggested hashtags and let the user accept or replace them.
+
+    Pressing Enter keeps the suggestions; typing tags (separated by spaces or
+    commas) replaces them, and a leading '+' adds to them instead.
+    """
+    print(f"\nSuggested hashtags: {format_hashtags(hashtags) or '(none)'}")
+    answer = input("Press Enter to accept, type hashtags to replace them, or start with + to add: ").strip()
+    if not answer:
+        return hashtags
+
+    extend = answer.startswith('+')
+    entered = [normalize_hashtag(tag) for tag in parse_tag_list(answer.lstrip('+'))]
+    entered = ['#' + tag for tag in entered if tag]
+    if extend:
+        return list(dict.fromkeys(hashtags + entered))
+    return list(dict.fromkeys(entered))
+
+def hashtag_prompt_enabled():
+    """Whether to offer the interactive override (disable with HASHTAG_PROMPT=0)."""
+    return os.getenv('HASHTAG_PROMPT', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def get_track_hashtags(tags=None, artist=None, label=None):
+    """Build hashtags for a track, offering the interactive override if enabled."""
+    hashtags = build_hashtags(tags, artist, label)
+    if hashtag_prompt_enabled():
+        hashtags = prompt_hashtag_override(hashtags)
+    return hashtags
@@ -0,0 +1,401 @@
+"""
+Record the HTTP traffic of card runs into cassettes and replay it later, so
+a run can be repeated and timed without Bandcamp, YouTube, Spotify or the
+social platforms:
+
+    HTTP_CASSETTE_MODE=record HTTP_CASSETTE=~/cassettes/kdzu.json.gz python card_creator.py
+    HTTP_CASSETTE_MODE=replay HTTP_CASSETTE=~/cassettes/kdzu.json.gz python card_creator.py
+
+The cassette hooks into the transports the clients share rather than into
+each client: requests (artwork downloads, spotipy, Mastodon.py, instagrapi),
+httplib2 (the YouTube client) and httpx (atproto). Bandcamp pages are
+rendered in Chrome rather than fetched, so load_page() records and replays
+the page source itself and no browser is started in replay mode.
+
+Modes:
+    record   Send everything to the network and record the answers
+    replay   Answer only from the cassette; anything not in it raises CassetteMiss
+    update   Replay what is recorded, send the rest and record it
+
+Requests match on method and URL (host in lower case, query parameters
+sorted, API keys and tokens dropped, upload ids wildcarded); bodies and
+headers are not compared.
+Requests that repeat are answered in the order they were recorded, and the
+last answers start over once used up. In replay, HTTP_REPLAY_LATENCY_MS
+(plus up to HTTP_REPLAY_JITTER_MS) is waited before each answer; set it to
+"recorded" to wait as long as the original request took.
+
+Request bodies are never written to a cassette, but response bodies are, and
+those include the session tokens the platforms hand out at login, so treat
+cassettes of real runs like .env.
+"""
+import os
+import re
+import json
+import gzip
+import time
+import base64
+import random
+import atexit
+import logging
+import tempfile
+import threading
+import contextlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from media_cache import get_cache_dir
+
+logger = logging.getLogger('cardcreator.cassettes')
+
+MODES = ('record', 'replay', 'update')
+CASSETTE_VERSION = 1
+# Query parameters that carry credentials; left out of matching and of the file
+SECRET_PARAMS = {'key', 'api_key', 'access_token', 'client_secret', 'token'}
+# Path segments generated per request (instagrapi's upload ids are a timestamp
+# and a random number); matched as '*' so a replayed upload finds its answer
+VOLATILE_PATHS = [
+    (re.compile(r'(/rupload_ig(?:photo|video)/)[^/]+'), r'\1*'),
+]
+# Headers that describe the original transfer rather than the (decoded) body we keep
+TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+class CassetteMiss(Exception):
+    """A replayed request has no recorded answer."""
+
+def normalize_url(url):
+    """Return the form of a URL requests are matched on (and recorded under)."""
+    parts = urlsplit(url)
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name.lower() not in SECRET_PARAMS)
+    path = parts.path or '/'
+    for pattern, replacement in VOLATILE_PATHS:
+        path = pattern.sub(replacement, path)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+def _encode_body(body):
+    try:
+        return {'text': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(body).decode('ascii')}
+
+def _decode_body(entry):
+    if 'base64' in entry:
+        return base64.b64decode(entry['base64'])
+    return entry.get('text', '').encode('utf-8')
+
+class Cassette:
+    """
+    Recorded interactions plus the replay position of each request.
+
+    Args:
+        path (str): Cassette file (gzip-compressed if it ends in .gz)
+        mode (str): 'record', 'replay' or 'update'
+        latency_ms (float or str): Delay before each replayed answer, or
+            'recorded' for the original duration
+        jitter_ms (float): Extra random delay of up to this many milliseconds
+        origin (callable, optional): origin(method, url) returning (status,
+            headers, body) or None; answers requests that would go to the
+            network, e.g. to record synthetic responses
+    """
+    def __init__(self, path, mode='replay', latency_ms=0, jitter_ms=0, origin=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}' (use {', '.join(MODES)})")
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.origin = origin
+        self.meta = {}
+        self.interactions = []
+        self.changed = False
+        self._lock = threading.Lock()
+        self._index = {}
+        self._played = {}
+        if mode != 'record' and os.path.exists(self.path):
+            self._load()
+        elif mode == 'replay':
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        self.meta = data.get('meta', {})
+        for interaction in data.get('interactions', []):
+            self._add(interaction)
+        logger.info("Loaded %d recorded interactions from %s", len(self.interactions), self.path)
+
+    def _add(self, interaction):
+        self.interactions.append(interaction)
+        key = (interaction['kind'], interaction['method'], interaction['url'])
+        self._index.setdefault(key, []).append(interaction)
+
+    def save(self):
+        """Write the cassette to disk (atomically) if anything was recorded."""
+        with self._lock:
+            if not self.changed:
+                return
+            data = {'version': CASSETTE_VERSION, 'meta': self.meta, 'interactions': self.interactions}
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            os.close(fd)
+            try:
+                opener = gzip.open if self.path.endswith('.gz') else open
+                with opener(tmp_path, 'wt', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self.changed = False
+        logger.info("Saved %d interactions to %s", len(self.interactions), self.path)
+
+    def record(self, kind, method, url, status, headers, body, elapsed):
+        """Add an answer; body is bytes and elapsed the original duration in seconds."""
+        interaction = {
+            'kind': kind,
+            'method': method.upper(),
+            'url': normalize_url(url),
+            'status': status,
+            'headers': {name: value for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS},
+            'body': _encode_body(body),
+            'elapsed_ms': round(elapsed * 1000, 1),
+        }
+        with self._lock:
+            self._add(interaction)
+            # Count it as played, so update mode doesn't answer the next request with it
+            key = (interaction['kind'], interaction['method'], interaction['url'])
+            self._played[key] = self._played.get(key, 0) + 1
+            self.changed = True
+
+    def next_answer(self, kind, method, url):
+        """
+        Return the next recorded answer for a request, or None if it should go
+        to the network (record mode, or update mode once the answers are used up).
+
+        Raises:
+            CassetteMiss: In replay mode when nothing was recorded for the request
+        """
+        if self.mode == 'record':
+            return None
+        key = (kind, method.upper(), normalize_url(url))
+        with self._lock:
+            answers = self._index.get(key)
+            played = self._played.get(key, 0)
+            if not answers or (self.mode == 'update' and played >= len(answers)):
+                if self.mode == 'replay':
+                    raise CassetteMiss(f"No recorded answer for {key[1]} {key[2]} in {self.path}")
+                return None
+            self._played[key] = played + 1
+            interaction = answers[played % len(answers)]
+        self._wait(interaction)
+        return interaction['status'], dict(interaction['headers']), _decode_body(interaction['body'])
+
+    def _wait(self, interaction):
+        if self.latency_ms == 'recorded':
+            delay = interaction.get('elapsed_ms', 0)
+        else:
+            delay = float(self.latency_ms or 0)
+        if self.jitter_ms:
+            delay += random.uniform(0, float(self.jitter_ms))
+        if delay:
+            time.sleep(delay / 1000)
+
+    def fetch(self, kind, method, url, send):
+        """
+        Answer a request from the cassette, the origin or send().
+
+        Args:
+            send (callable): Performs the request; returns (status, headers, body)
+
+        Returns:
+            tuple: (status, headers, body)
+        """
+        answer = self.next_answer(kind, method, url)
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        answer = self.origin(method, url) if self.origin else None
+        if answer is None:
+            answer = send()
+        self.record(kind, method, url, *answer, time.perf_counter() - start)
+        return answer
+
+_cassette = None
+_patched = False
+
+def get_cassette():
+    """Return the cassette in use, or None."""
+    return _cassette
+
+def is_replaying():
+    """True if requests are only answered from a cassette (no browser or network needed)."""
+    return _cassette is not None and _cassette.mode == 'replay'
+
+def replay_page(url):
+    """Return a recorded page source for a URL, or None if the page should be loaded."""
+    if _cassette is None:
+        return None
+    answer = _cassette.next_answer('page', 'GET', url)
+    return answer[2].decode('utf-8') if answer else None
+
+def record_page(url, page_source, elapsed):
+    """Record a page source loaded in the browser (elapsed in seconds)."""
+    if _cassette is not None and _cassette.mode != 'replay':
+        _cassette.record('page', 'GET', url, 200, {'Content-Type': 'text/html; charset=utf-8'},
+                         page_source.encode('utf-8'), elapsed)
+
+def _patch_requests():
+    try:
+        from requests.adapters import HTTPAdapter
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+    except ImportError:
+        return
+    original_send = HTTPAdapter.send
+
+    def send(adapter, request, **kwargs):
+        cassette = _cassette
+        if cassette is None:
+            return original_send(adapter, request, **kwargs)
+        live = []
+
+        def send_live():
+            response = original_send(adapter, request, **kwargs)
+            live.append(response)
+            return response.status_code, dict(response.headers), response.content
+
+        status, headers, body = cassette.fetch('http', request.method, request.url, send_live)
+        if live:
+            return live[0]
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+    HTTPAdapter.send = send
+
+def _patch_httplib2():
+    try:
+        import httplib2
+    except ImportError:
+        return
+    original_request = httplib2.Http.request
+
+    def request(http, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        cassette = _cassette
+        if cassette is None:
+            return original_request(http, uri, method, body, headers, *args, **kwargs)
+
+        def send_live():
+            response, content = original_request(http, uri, method, body, headers, *args, **kwargs)
+            # httplib2 keeps the status, the request URL (with its API key) and '-' keys in the header dict
+            fields = {name: value for name, value in response.items()
+                      if name not in ('status', 'content-location') and not name.startswith('-')}
+            return response.status, fields, content
+
+        status, fields, content = cassette.fetch('http', method, uri, send_live)
+        return httplib2.Response({**fields, 'status': str(status)}), content
+
+    httplib2.Http.request = request
+
+def _patch_httpx():
+    try:
+        import httpx
+    except ImportError:
+        return
+    original_handle = httpx.HTTPTransport.handle_request
+
+    def handle_request(transport, request):
+        cassette = _cassette
+        if cassette is None:
+            return original_handle(transport, request)
+
+        def send_live():
+            response = original_handle(transport, request)
+            try:
+                # Decode here (the transport returns the raw stream) so the body is stored uncompressed
+                body = httpx.Response(response.status_code, headers=response.headers, stream=response.stream).read()
+            finally:
+                response.close()
+            return response.status_code, dict(response.headers), body
+
+        status, headers, body = cassette.fetch('http', request.method, str(request.url), send_live)
+        headers = {name: value for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS}
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+    httpx.HTTPTransport.handle_request = handle_request
+
+def _install():
+    global _patched
+    if not _patched:
+        _patch_requests()
+        _patch_httplib2()
+        _patch_httpx()
+        _patched = True
+
+def start_cassette(path, mode='replay', latency_ms=0, jitter_ms=0, origin=None):
+    """
+    Route this process's HTTP traffic through a cassette until stop_cassette().
+
+    Returns:
+        Cassette: The cassette in use
+    """
+    global _cassette
+    if _cassette is not None:
+        stop_cassette()
+    cassette = Cassette(path, mode, latency_ms, jitter_ms, origin)
+    _install()
+    _cassette = cassette
+    logger.info("HTTP cassette %s in %s mode", cassette.path, mode)
+    return cassette
+
+def stop_cassette():
+    """Stop using the cassette, saving anything recorded."""
+    global _cassette
+    cassette, _cassette = _cassette, None
+    if cassette is not None:
+        cassette.save()
+
+@contextlib.contextmanager
+def use_cassette(path, mode='replay', latency_ms=0, jitter_ms=0, origin=None):
+    """Context manager form of start_cassette() / stop_cassette()."""
+    cassette = start_cassette(path, mode, latency_ms, jitter_ms, origin)
+    try:
+        yield cassette
+    finally:
+        stop_cassette()
+
+def _latency_setting(value):
+    if value is None or value == '':
+        return 0
+    return value if value == 'recorded' else float(value)
+
+def setup_cassettes():
+    """
+    Start a cassette if HTTP_CASSETTE_MODE is set (called from the entry points).
+
+    The cassette file is HTTP_CASSETTE, by default cassette.json.gz in the
+    cache directory. Recorded interactions are saved when the process exits.
+
+    Returns:
+        Cassette: The cassette in use, or None
+    """
+    mode = os.getenv('HTTP_CASSETTE_MODE', '').lower()
+    if not mode or mode in ('0', 'off', 'none'):
+        return None
+    path = os.getenv('HTTP_CASSETTE') or os.path.join(get_cache_dir(), 'cassette.json.gz')
+    cassette = start_cassette(path, mode, _latency_setting(os.getenv('HTTP_REPLAY_LATENCY_MS')),
+                              float(os.getenv('HTTP_REPLAY_JITTER_MS') or 0))
+    atexit.register(stop_cassette)
+    return cassette
@@ -0,0 +1,259 @@
+"""
+Generate responsive, web-ready versions of the track artwork.
+
+For every image in IMAGE_OUTPUT_PATH this writes several widths as WebP (and
+AVIF when Pillow can encode it) next to the original, e.g. song-320w.webp,
+and records them in images.manifest.json, which the site can turn into
+srcset attributes:
+
+    {
+      "song.jpg": {
+        "sha256": "...", "width": 1200, "height": 1200,
+        "derivatives": {"webp": [{"file": "song-320w.webp", "width": 320, "bytes": 14210}, ...]},
+        "srcset": {"webp": "song-320w.webp 320w, song-640w.webp 640w, ..."}
+      }
+    }
+
+Images whose contents and settings haven't changed since the last run are
+skipped, and the rest are processed in parallel:
+
+    python image_derivatives.py --workers 8
+
+Requires Pillow (pip install Pillow); AVIF needs Pillow 11.2+ or pillow-avif-plugin.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from media_cache import file_sha256
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.images')
+
+MANIFEST_FILENAME = 'images.manifest.json'
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_WIDTHS = (320, 640, 1080)
+DEFAULT_FORMATS = ('webp', 'avif')
+SAVE_OPTIONS = {
+    'webp': {'quality': 80, 'method': 6},
+    'avif': {'quality': 55},
+}
+
+_manifest_lock = threading.Lock()
+
+def get_widths():
+    """Return the derivative widths from IMAGE_WIDTHS (comma separated)."""
+    value = os.getenv('IMAGE_WIDTHS')
+    if not value:
+        return DEFAULT_WIDTHS
+    return tuple(sorted({int(width) for width in value.split(',') if width.strip()}))
+
+def get_formats():
+    """Return the requested formats (IMAGE_FORMATS) that this Pillow can write."""
+    requested = [fmt.strip().lower() for fmt in os.getenv('IMAGE_FORMATS', ','.join(DEFAULT_FORMATS)).split(',') if fmt.strip()]
+    available = [fmt for fmt in requested if can_encode(fmt)]
+    for fmt in set(requested) - set(available):
+        logger.info("Skipping %s derivatives: this Pillow can't encode %s", fmt, fmt.upper())
+    return tuple(available)
+
+def can_encode(fmt):
+    """Check whether Pillow can save a format (loading the AVIF plugin if installed)."""
+    from PIL import Image
+
+    if fmt == 'avif':
+        try:
+            import pillow_avif  # noqa: F401 (registers the AVIF plugin)
+        except ImportError:
+            pass
+    Image.init()
+    return fmt.upper() in Image.SAVE
+
+def derivative_widths(source_width, widths):
+    """Widths to generate for a source image; never upscales."""
+    usable = [width for width in widths if width < source_width]
+    if source_width <= max(widths):
+        usable.append(source_width)
+    return usable
+
+def derivative_filename(image_filename, width, fmt):
+    stem = os.path.splitext(image_filename)[0]
+    return f"{stem}-{width}w.{fmt}"
+
+def render_derivatives(source_path, widths, formats):
+    """
+    Write the derivatives of one image next to it.
+
+    Runs in a worker process.
+
+    Returns:
+        tuple: (image file name, manifest entry)
+    """
+    from PIL import Image
+
+    image_filename = os.path.basename(source_path)
+    out_dir = os.path.dirname(source_path)
+    digest = file_sha256(source_path)
+    with Image.open(source_path) as image:
+        image.load()
+        source_width, source_height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+
+        derivatives = {fmt: [] for fmt in formats}
+        for width in derivative_widths(source_width, widths):
+            height = round(source_height * width / source_width)
+            resized = image if width == source_width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                filename = derivative_filename(image_filename, width, fmt)
+                path = os.path.join(out_dir, filename)
+                resized.save(path, fmt.upper(), **SAVE_OPTIONS.get(fmt, {}))
+                derivatives[fmt].append({'file': filename, 'width': width, 'height': height, 'bytes': os.path.getsize(path)})
+
+    return image_filename, {
+        'sha256': digest,
+        'width': source_width,
+        'height': source_height,
+        'bytes': os.path.getsize(source_path),
+        'widths': list(widths),
+        'derivatives': derivatives,
+        'srcset': {fmt: ', '.join(f"{item['file']} {item['width']}w" for item in items) for fmt, items in derivatives.items()},
+        'generated_at': time.time(),
+    }
+
+def load_manifest(image_dir):
+    try:
+        with open(os.path.join(image_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(image_dir, manifest):
+    """Atomically write the manifest so the site never reads a half-written file."""
+    fd, tmp_path = tempfile.mkstemp(dir=image_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(image_dir, MANIFEST_FILENAME))
+
+def is_up_to_date(entry, source_path, widths, formats):
+    """Check a manifest entry against the source's hash, the settings and the files on disk."""
+    if not entry or entry.get('widths') != list(widths) or set(entry.get('derivatives', {})) != set(formats):
+        return False
+    # Cheap size check first; hash only when the size matches
+    if entry.get('bytes') != os.path.getsize(source_path) or entry.get('sha256') != file_sha256(source_path):
+        return False
+    image_dir = os.path.dirname(source_path)
+    return all(os.path.exists(os.path.join(image_dir, item['file']))
+               for items in entry['derivatives'].values() for item in items)
+
+def list_source_images(image_dir):
+    """Return the original artwork files (not derivatives) in a directory."""
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(SOURCE_EXTENSIONS) and not name.startswith('.')
+    )
+
+def build_derivatives(image_dir, workers=None, force=False):
+    """
+    Generate derivatives for every changed image in a directory.
+
+    Args:
+        image_dir (str): Directory with the track artwork
+        workers (int, optional): Worker processes (default: one per core)
+        force (bool): Regenerate everything, even unchanged images
+
+    Returns:
+        tuple: (images processed, images skipped as unchanged)
+    """
+    widths = get_widths()
+    formats = get_formats()
+    if not formats:
+        logger.error("Error: none of the requested image formats can be written by this Pillow")
+        return 0, 0
+
+    manifest = load_manifest(image_dir)
+    sources = list_source_images(image_dir)
+    pending = [path for path in sources
+               if force or not is_up_to_date(manifest.get(os.path.basename(path)), path, widths, formats)]
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_derivatives, path, widths, formats) for path in pending]
+            for path, future in zip(pending, futures):
+                try:
+                    image_filename, entry = future.result()
+                except Exception as e:
+                    logger.error("Error creating derivatives for %s: %s", path, e, extra={'path': path})
+                    continue
+                manifest[image_filename] = entry
+                logger.info("Derivatives written for %s", image_filename, extra={'path': path})
+
+    # Drop entries for images that no longer exist
+    names = {os.path.basename(path) for path in sources}
+    for name in [name for name in manifest if name not in names]:
+        del manifest[name]
+
+    with _manifest_lock:
+        save_manifest(image_dir, manifest)
+    return len(pending), len(sources) - len(pending)
+
+def update_image_derivatives(source_path):
+    """
+    Generate derivatives for a single newly downloaded image and update the manifest.
+
+    Used after download_image when IMAGE_DERIVATIVES is enabled.
+    """
+    widths = get_widths()
+    formats = get_formats()
+    if not formats:
+        return None
+    image_dir = os.path.dirname(source_path)
+    image_filename, entry = render_derivatives(source_path, widths, formats)
+    with _manifest_lock:
+        manifest = load_manifest(image_dir)
+        manifest[image_filename] = entry
+        save_manifest(image_dir, manifest)
+    return entry
+
+def derivatives_enabled():
+    """Create derivatives right after each artwork download (IMAGE_DERIVATIVES=1)."""
+    return os.getenv('IMAGE_DERIVATIVES', '0').lower() in ('1', 'true', 'yes', 'on')
+
+def summarize(manifest):
+    """Return total bytes of the originals and of the smallest derivative of each image."""
+    original = sum(entry['bytes'] for entry in manifest.values())
+    smallest = sum(min(item['bytes'] for items in entry['derivatives'].values() for item in items)
+                   for entry in manifest.values() if any(entry['derivatives'].values()))
+    return original, smallest
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Generate WebP/AVIF srcset derivatives of the track artwork.")
+    parser.add_argument('image_dir', nargs='?', default=None, help="artwork directory (default: IMAGE_OUTPUT_PATH)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="regenerate unchanged images too")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    image_dir = os.path.expanduser(args.image_dir or get_setting('IMAGE_OUTPUT_PATH', ''))
+    if not os.path.isdir(image_dir):
+        logger.error("Error: image directory does not exist: %s", image_dir)
+        return
+
+    start = time.perf_counter()
+    processed, skipped = build_derivatives(image_dir, workers=args.workers, force=args.force)
+    original, smallest = summarize(load_manifest(image_dir))
+    print(f"Processed {processed} images, skipped {skipped} unchanged in {time.perf_counter() - start:.1f}s")
+    if original:
+        print(f"Originals: {original / 1024:.0f} KB; smallest derivatives: {smallest / 1024:.0f} KB "
+              f"({100 - smallest * 100 / original:.0f}% less for listing thumbnails)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Follow an inbox of Bandcamp URLs and turn each new entry into a track card.
+
+The inbox is a file, or a directory of *.jsonl / *.txt files, with one entry
+per line: either a bare URL or a JSON object with a "url" field (album
+entries can add "tracks": "1,3-5" to feature only some tracks, and any entry
+can name a station profile with "station": "kdzu"). Only lines
+appended since the last run are read. The byte offset of each file is
+checkpointed in the cache directory once its entries have been processed,
+so a restart picks up where it left off without rescanning.
+
+    python inbox_watcher.py ~/kdzu/inbox.jsonl --workers 2
+
+Changes are picked up through inotify (via the optional watchdog package)
+when it is installed, and by polling otherwise.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import card_creator
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from stations import use_station, set_default_station, station_names
+from metrics import inc
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger('cardcreator.inbox')
+
+CHECKPOINT_CACHE_NAME = 'inbox_checkpoints'
+INBOX_EXTENSIONS = ('.jsonl', '.txt')
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_INTERVAL = 2.0
+
+def parse_inbox_line(line):
+    """
+    Parse one inbox line.
+
+    Returns:
+        dict: The entry (always with a 'url'), or None for blank lines,
+            comments and lines without a URL
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            logger.warning("Skipping malformed inbox line: %s", line)
+            return None
+        return entry if isinstance(entry, dict) and entry.get('url') else None
+    if not line.startswith(('http://', 'https://')):
+        logger.warning("Skipping inbox line that isn't a URL: %s", line)
+        return None
+    return {'url': line}
+
+def list_inbox_files(inbox):
+    """Return the inbox files to follow for a file or directory path."""
+    if os.path.isdir(inbox):
+        return sorted(
+            os.path.join(inbox, name) for name in os.listdir(inbox)
+            if name.endswith(INBOX_EXTENSIONS) and not name.startswith('.')
+        )
+    return [inbox] if os.path.exists(inbox) else []
+
+def load_checkpoint(path):
+    """Return the saved {'offset', 'inode'} for an inbox file."""
+    return load_media_cache(CHECKPOINT_CACHE_NAME).get(os.path.abspath(path), {'offset': 0, 'inode': None})
+
+def save_checkpoint(path, offset, inode):
+    with cache_lock:
+        checkpoints = load_media_cache(CHECKPOINT_CACHE_NAME)
+        checkpoints[os.path.abspath(path)] = {'offset': offset, 'inode': inode, 'updated_at': time.time()}
+        save_media_cache(CHECKPOINT_CACHE_NAME, checkpoints)
+
+def read_new_entries(path, offset, inode):
+    """
+    Read complete lines appended to a file since the given offset.
+
+    A different inode or a file shorter than the offset means the inbox was
+    replaced or truncated, so it is read again from the start. A trailing
+    line without a newline is left for the next read, as it may still be
+    being written.
+
+    Returns:
+        tuple: (list of (end offset, entry) pairs, inode)
+    """
+    stat = os.stat(path)
+    if stat.st_ino != inode or stat.st_size < offset:
+        if inode is not None:
+            logger.info("Inbox %s was replaced or truncated, reading it from the start", path)
+        offset = 0
+    if stat.st_size == offset:
+        return [], stat.st_ino
+
+    entries = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            entry = parse_inbox_line(raw.decode('utf-8', errors='replace'))
+            entries.append((offset, entry))
+    return entries, stat.st_ino
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, changed):
+        self.changed = changed
+
+    def on_any_event(self, event):
+        self.changed.set()
+
+class InboxWatcher:
+    """
+    Feed new inbox entries to create_track_file on a bounded worker pool.
+
+    Each worker thread keeps its own Chrome for the lifetime of the watcher.
+    Offsets only move past an entry once it and every entry before it in the
+    same file have finished, so a crash never skips unprocessed URLs.
+    """
+
+    def __init__(self, inbox, workers=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.inbox = inbox
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inbox')
+        # At most two entries waiting per worker; reading pauses until they drain
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.changed = threading.Event()
+        self.stopping = threading.Event()
+        self.local = threading.local()
+        self.drivers = []
+        self.drivers_lock = threading.Lock()
+        self.pending = {}
+        self.inodes = {}
+        self.read_offsets = {}
+
+    def _get_driver(self):
+        driver = getattr(self.local, 'driver', None)
+        if driver is None:
+            driver = self.local.driver = card_creator.create_chrome_driver()
+            with self.drivers_lock:
+                self.drivers.append(driver)
+        return driver
+
+    def _process(self, entry):
+        url = entry['url']
+        if entry.get('station') is not None and entry['station'] not in station_names():
+            logger.error("Skipping %s: unknown station %s", url, entry['station'], extra={'url': url})
+            inc('cardcreator_inbox_entries_total', help="Inbox entries processed by result", result='error')
+            return []
+        try:
+            with use_station(entry.get('station')):
+                if card_creator.is_album_url(url):
+                    # Album entries may list the tracks to feature, e.g. "tracks": "1,3"
+                    cards = card_creator.create_album_track_files(url, driver=self._get_driver(), selection=entry.get('tracks'))
+                else:
+                    filepath, title, artist = card_creator.create_track_file(url, driver=self._get_driver())
+                    cards = [(filepath, title, artist, url)] if filepath else []
+        except Exception as e:
+            logger.error("Error creating card for %s: %s", url, e, extra={'url': url})
+            cards = []
+            # Start a fresh Chrome for the next entry in case this one broke it
+            self._discard_driver()
+        for filepath, title, artist, track_url in cards:
+            logger.info("Created card for %s by %s: %s", title, artist, filepath, extra={'url': track_url, 'path': filepath})
+        inc('cardcreator_inbox_entries_total', help="Inbox entries processed by result", result='ok' if cards else 'error')
+        return [card[0] for card in cards]
+
+    def _discard_driver(self):
+        driver = getattr(self.local, 'driver', None)
+        self.local.driver = None
+        if driver is not None:
+            with self.drivers_lock:
+                self.drivers.remove(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def _commit(self, path):
+        """Checkpoint the offset of the longest run of finished entries."""
+        queue = self.pending[path]
+        offset = None
+        while queue and queue[0][1].done():
+            offset = queue.popleft()[0]
+        if offset is not None:
+            save_checkpoint(path, offset, self.inodes[path])
+
+    def scan(self):
+        """Submit entries appended to any inbox file since the last scan."""
+        for path in list_inbox_files(self.inbox):
+            if path not in self.read_offsets:
+                checkpoint = load_checkpoint(path)
+                self.read_offsets[path] = checkpoint['offset']
+                self.inodes[path] = checkpoint['inode']
+                self.pending[path] = deque()
+            self._commit(path)
+
+            try:
+                entries, inode = read_new_entries(path, self.read_offsets[path], self.inodes[path])
+            except OSError as e:
+                logger.warning("Could not read inbox %s: %s", path, e)
+                continue
+            if inode != self.inodes[path]:
+                self.pending[path].clear()
+                self.inodes[path] = inode
+
+            for offset, entry in entries:
+                if self.stopping.is_set():
+                    return
+                self.read_offsets[path] = offset
+                if entry is None:
+                    future = Future()
+                    future.set_result(None)
+                else:
+                    self.slots.acquire()
+                    future = self.executor.submit(self._process, entry)
+                    future.add_done_callback(lambda _: self.slots.release())
+                    logger.info("Queued %s", entry['url'], extra={'url': entry['url'], 'inbox': path})
+                future.add_done_callback(lambda _: self.changed.set())
+                self.pending[path].append((offset, future))
+
+    def run(self, once=False):
+        """
+        Process the inbox until stop() is called (or once, draining what is there).
+        """
+        observer = None
+        if Observer is not None and not once:
+            watch_dir = self.inbox if os.path.isdir(self.inbox) else os.path.dirname(os.path.abspath(self.inbox))
+            observer = Observer()
+            observer.schedule(_ChangeHandler(self.changed), watch_dir, recursive=False)
+            observer.start()
+            logger.info("Watching %s for new entries", self.inbox)
+        elif not once:
+            logger.info("Polling %s every %.1fs (install watchdog for inotify support)", self.inbox, self.poll_interval)
+
+        try:
+            while not self.stopping.is_set():
+                self.changed.clear()
+                self.scan()
+                if once:
+                    break
+                # inotify wakes us immediately; the timeout is only a safety net
+                self.changed.wait(self.poll_interval * 5 if observer else self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Stopping, waiting for queued cards to finish...")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self.executor.shutdown(wait=True)
+            for path in self.pending:
+                self._commit(path)
+            with self.drivers_lock:
+                for driver in self.drivers:
+                    try:
+                        driver.quit()
+                    except Exception:
+                        pass
+                self.drivers.clear()
+
+    def stop(self):
+        self.stopping.set()
+        self.changed.set()
+
+def watch_inbox(inbox, workers=DEFAULT_WORKERS, poll_interval=DEFAULT_POLL_INTERVAL, once=False, station=None):
+    """
+    Create track cards for every new URL in an inbox file or directory.
+
+    Args:
+        inbox (str): Inbox file or directory
+        workers (int): Number of cards scraped at the same time (one Chrome each)
+        poll_interval (float): Seconds between checks when watchdog isn't installed
+        once (bool): Process the entries that are there and exit
+        station (str, optional): Station profile for entries that don't name one
+    """
+    try:
+        set_default_station(station)
+    except ValueError as e:
+        logger.error("Error: %s", e)
+        return
+    if not card_creator.validate_paths():
+        return
+    watcher = InboxWatcher(os.path.expanduser(inbox), workers=workers, poll_interval=poll_interval)
+    watcher.run(once=once)
+
+def main():
+    from logging_config import setup_logging
+    from metrics import setup_metrics
+    from http_cassettes import setup_cassettes
+
+    # Before the parser, whose defaults come from INBOX_PATH and INBOX_WORKERS
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Create track cards from an inbox of Bandcamp URLs.")
+    parser.add_argument('inbox', nargs='?', default=os.getenv('INBOX_PATH'), help="inbox file or directory (default: INBOX_PATH)")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('INBOX_WORKERS', DEFAULT_WORKERS)))
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument('--once', action='store_true', help="process new entries and exit instead of watching")
+    parser.add_argument('--station', default=None, help="station profile for entries without one (default: STATION)")
+    args = parser.parse_args()
+    if not args.inbox:
+        parser.error("an inbox path (or INBOX_PATH) is required")
+
+    setup_logging()
+    setup_metrics()
+    setup_cassettes()
+    watch_inbox(args.inbox, workers=args.workers, poll_interval=args.poll_interval, once=args.once, station=args.station)
+
+if __name__ == "__main__":
+    main()
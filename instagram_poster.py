@@ -1,7 +1,16 @@
 import os
 import re
+import logging
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from instagrapi import Client
 from dotenv import load_dotenv
+from stations import get_setting, get_hero_image_base_url
+from hashtags import format_hashtags, get_track_hashtags, parse_tag_list
+from track_frontmatter import parse_frontmatter_value
+from logging_config import setup_logging
+
+logger = logging.getLogger('cardcreator.instagram')
 
 def read_track_from_markdown(markdown_file_path):
     """
@@ -32,7 +41,7 @@ def read_track_from_markdown(markdown_file_path):
             if ':' in line and not line.startswith('#'):
                 key, value = line.split(':', 1)
                 key = key.strip()
-                value = value.strip().strip('"').strip("'")
+                value = parse_frontmatter_value(value)
                 track_data[key] = value
         
         # Extract review (remove the placeholder text)
@@ -43,10 +52,10 @@ def read_track_from_markdown(markdown_file_path):
         
         # Get image path from heroImage
         hero_image = track_data.get('heroImage', '')
-        if hero_image.startswith('https://static.kdzu.org/images/tracks/'):
+        if hero_image.startswith(get_hero_image_base_url()):
             # Convert to local path
             image_filename = os.path.basename(hero_image)
-            image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH', '')), image_filename)
+            image_path = os.path.join(os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH', '')), image_filename)
         else:
             image_path = None
         
@@ -57,11 +66,13 @@ def read_track_from_markdown(markdown_file_path):
             'bandcamp_url': track_data.get('bandcamp', ''),
             'spotify_url': track_data.get('spotify', ''),
             'youtube_url': track_data.get('youtube', ''),
+            'label': track_data.get('label', ''),
+            'tags': parse_tag_list(track_data.get('tags', '')),
             'image_path': image_path
         }
         
     except Exception as e:
-        print(f"Error reading markdown file: {str(e)}")
+        logger.error("Error reading markdown file: %s", e)
         return None
 
 def get_hashtags():
@@ -86,7 +97,56 @@ def get_hashtags():
     
     return ' '.join(hashtags)
 
-def create_instagram_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None):
+class RewritingAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends every request to another base URL.
+
+    The original host is kept as the first path segment, so
+    https://i.instagram.com/api/v1/... becomes {base_url}/i.instagram.com/api/v1/...
+    """
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+    
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        request.url = f"{self.base_url}/{parsed.netloc}{parsed.path}"
+        if parsed.query:
+            request.url += f"?{parsed.query}"
+        return super().send(request, **kwargs)
+
+def redirect_client(client, base_url):
+    """
+    Point an instagrapi client at another server, e.g. the local fake from fake_servers.py.
+    
+    Args:
+        client (Client): instagrapi client
+        base_url (str): Base URL to send all Instagram traffic to
+    """
+    for session in (client.private, client.public):
+        session.mount('https://', RewritingAdapter(base_url))
+        session.mount('http://', RewritingAdapter(base_url))
+
+def login_instagram():
+    """
+    Create an Instagram client and log in with the current station's credentials (see stations.py).
+    
+    Returns:
+        Client: Logged-in client, or None if the credentials are missing
+    """
+    username = get_setting('INSTAGRAM_USERNAME')
+    password = get_setting('INSTAGRAM_PASSWORD')
+    if not username or not password:
+        logger.error("Error: Instagram credentials not found in .env file")
+        return None
+    
+    client = Client()
+    if get_setting('INSTAGRAM_API_BASE_URL'):
+        redirect_client(client, get_setting('INSTAGRAM_API_BASE_URL'))
+    client.login(username, password)
+    return client
+
+def create_instagram_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None, hashtags=None, client=None):
     """
     Create an Instagram post for a track review.
     
@@ -98,26 +158,23 @@ def create_instagram_post(image_path, title, artist, review, bandcamp_url, spoti
         bandcamp_url (str): Bandcamp URL
         spotify_url (str, optional): Spotify URL
         youtube_url (str, optional): YouTube URL
+        hashtags (list, optional): Hashtags to use; prompts for them if not given
+        client (Client, optional): Logged-in client to reuse (see login_instagram());
+            it stays logged in afterwards
     """
-    # Load environment variables
-    load_dotenv()
-    
-    # Initialize Instagram client
-    client = Client()
-    
+    owns_client = client is None
     try:
         # Login to Instagram
-        username = os.getenv('INSTAGRAM_USERNAME')
-        password = os.getenv('INSTAGRAM_PASSWORD')
-        
-        if not username or not password:
-            print("Error: Instagram credentials not found in .env file")
-            return False
-            
-        client.login(username, password)
+        if owns_client:
+            client = login_instagram()
+            if client is None:
+                return False
         
-        # Get hashtags from user
-        hashtags = get_hashtags()
+        # Get hashtags from user unless they were provided
+        if hashtags is None:
+            hashtags = get_hashtags()
+        else:
+            hashtags = format_hashtags(hashtags)
         
         # Create caption
         caption = f"""{title} by {artist}
@@ -135,18 +192,19 @@ Link in bio 🔗
             caption=caption
         )
         
-        print(f"Successfully posted to Instagram! Media ID: {media.id}")
+        logger.info("Successfully posted to Instagram! Media ID: %s", media.id, extra={'platform': 'instagram', 'post_id': media.id})
         return True
         
     except Exception as e:
-        print(f"Error posting to Instagram: {str(e)}")
+        logger.error("Error posting to Instagram: %s", e, extra={'platform': 'instagram'})
         return False
     finally:
-        # Logout
-        try:
-            client.logout()
-        except:
-            pass
+        # Logout a session we opened
+        if owns_client and client is not None:
+            try:
+                client.logout()
+            except:
+                pass
 
 def create_instagram_post_from_markdown(markdown_file_path):
     """
@@ -155,39 +213,42 @@ def create_instagram_post_from_markdown(markdown_file_path):
     Args:
         markdown_file_path (str): Path to the markdown file
     """
-    # Load environment variables
-    load_dotenv()
-    
     # Read track data from markdown
     track_data = read_track_from_markdown(markdown_file_path)
     if not track_data:
-        print("Error: Could not read track data from markdown file")
+        logger.error("Error: Could not read track data from markdown file")
         return False
     
     # Check if image exists
     if not track_data['image_path'] or not os.path.exists(track_data['image_path']):
-        print(f"Error: Image file not found at {track_data['image_path']}")
+        logger.error("Error: Image file not found at %s", track_data['image_path'])
         return False
     
+    # Post the rendered card rather than the bare artwork when possible
+    from card_renderer import post_image_path
+    from posters import POSTERS
+    image_path = post_image_path(POSTERS['instagram'], markdown_file_path, track_data['image_path'])
+    
     # Create Instagram post
     return create_instagram_post(
-        image_path=track_data['image_path'],
+        image_path=image_path,
         title=track_data['title'],
         artist=track_data['artist'],
         review=track_data['review'],
         bandcamp_url=track_data['bandcamp_url'],
         spotify_url=track_data['spotify_url'],
-        youtube_url=track_data['youtube_url']
+        youtube_url=track_data['youtube_url'],
+        hashtags=get_track_hashtags(track_data['tags'], track_data['artist'], track_data['label'])
     )
 
 if __name__ == "__main__":
+    # Load environment variables first, so LOG_LEVEL/LOG_FORMAT apply
+    load_dotenv()
+    setup_logging()
     print("Instagram Poster for CardCreator")
     print("=" * 40)
     
-    # Load environment variables
-    load_dotenv()
-    
-    if not os.getenv('INSTAGRAM_USERNAME') or not os.getenv('INSTAGRAM_PASSWORD'):
+    if not get_setting('INSTAGRAM_USERNAME') or not get_setting('INSTAGRAM_PASSWORD'):
         print("Error: Instagram credentials not found in .env file")
         print("Please add INSTAGRAM_USERNAME and INSTAGRAM_PASSWORD to your .env file")
     else:
@@ -0,0 +1,299 @@
+"""
+Check the links in every track card and report the ones that have gone dead.
+
+Reads the bandcamp, spotify, youtube and artistLink fields of each markdown
+file in MARKDOWN_OUTPUT_PATH and checks every distinct URL concurrently with
+aiohttp: a HEAD request first, then a GET when the server rejects HEAD or
+reports an error. Requests per host are limited, 429 responses are retried
+after Retry-After, and results are cached (LINK_CHECK_TTL), so reruns only
+check links that are new or due again:
+
+    python link_checker.py --report links.json
+    python link_checker.py --flag          # also set deadLinks in the frontmatter
+
+A link is dead when it returns 404 or 410, or when a Bandcamp release
+redirects back to the artist's front page. Timeouts, 403s and server errors
+are reported as unknown and checked again on the next run. Requires aiohttp
+(pip install aiohttp).
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from urllib.parse import urlparse, quote
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+from metrics import inc
+from track_frontmatter import read_frontmatter, update_frontmatter
+from stations import get_setting
+
+logger = logging.getLogger('cardcreator.links')
+
+LINK_FIELDS = ('bandcamp', 'spotify', 'youtube', 'artistLink')
+LINK_CACHE_NAME = 'link_health'
+USER_AGENT = 'CardCreator link checker (+https://kdzu.org)'
+DEFAULT_CONCURRENCY = 64
+DEFAULT_PER_HOST = 8
+DEFAULT_TIMEOUT = 20
+DEFAULT_TTL = 7 * 24 * 60 * 60
+MAX_RETRIES = 3
+MAX_RETRY_AFTER = 60
+DEAD_STATUSES = (404, 410)
+
+def get_link_check_ttl():
+    """Seconds a link's result is reused before it is checked again (LINK_CHECK_TTL)."""
+    return float(os.getenv('LINK_CHECK_TTL', DEFAULT_TTL))
+
+def collect_links(markdown_dir):
+    """
+    Read the link fields of every card.
+
+    Returns:
+        dict: Markdown path -> {field: URL} for the non-empty http(s) links
+    """
+    cards = {}
+    for name in sorted(os.listdir(markdown_dir)):
+        if not name.endswith('.md'):
+            continue
+        path = os.path.join(markdown_dir, name)
+        try:
+            fields = read_frontmatter(path)
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping %s: %s", path, e)
+            continue
+        links = {field: fields[field] for field in LINK_FIELDS
+                 if isinstance(fields.get(field), str) and fields[field].startswith(('http://', 'https://'))}
+        if links:
+            cards[path] = links
+    return cards
+
+def check_target(url):
+    """
+    Return the URL to request for a link and whether it's a YouTube oEmbed check.
+
+    YouTube answers 200 for removed videos, so those are checked through its
+    oEmbed endpoint, which returns 404 (or 400) once a video is gone.
+    """
+    host = urlparse(url).netloc.lower()
+    if host.endswith(('youtube.com', 'youtu.be')):
+        return f"https://www.youtube.com/oembed?format=json&url={quote(url, safe='')}", True
+    return url, False
+
+def classify(url, code, final_url, oembed=False):
+    """Return 'ok', 'dead' or 'unknown' for an HTTP response to a link."""
+    if oembed:
+        # 401/403: the video exists but can't be embedded
+        if code in (200, 401, 403):
+            return 'ok'
+        return 'dead' if code in (400, 404) else 'unknown'
+    if code in DEAD_STATUSES:
+        return 'dead'
+    if 200 <= code < 300:
+        original = urlparse(url).path
+        if original.startswith(('/track/', '/album/')) and urlparse(final_url).path in ('', '/'):
+            # Bandcamp sends removed releases back to the artist's front page
+            return 'dead'
+        return 'ok'
+    return 'unknown'
+
+class LinkChecker:
+    """Checks URLs concurrently with a limit on open requests per host."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self._hosts = {}
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _request(self, session, method, url):
+        """Make one request, following redirects; returns (status, final URL, Retry-After)."""
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.request(method, url, allow_redirects=True, timeout=timeout) as response:
+            if method == 'GET':
+                # Only the status matters; don't download whole pages
+                await response.content.readany()
+            return response.status, str(response.url), response.headers.get('Retry-After')
+
+    async def check(self, session, url):
+        """
+        Check one link.
+
+        Returns:
+            dict: url, status ('ok', 'dead' or 'unknown'), code, final_url, error, checked_at
+        """
+        target, oembed = check_target(url)
+        result = {'url': url, 'status': 'unknown', 'code': None, 'final_url': None, 'error': None}
+        # Wait for the host's slot before taking one of the overall slots
+        async with self._host_semaphore(target), self._slots:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    code, final_url, retry_after = await self._request(session, 'HEAD', target)
+                    if code >= 400 and code != 429:
+                        # Many servers reject or mishandle HEAD; GET has the final say
+                        code, final_url, retry_after = await self._request(session, 'GET', target)
+                except Exception as e:
+                    result['error'] = str(e) or type(e).__name__
+                    if attempt < MAX_RETRIES - 1:
+                        await asyncio.sleep(2 ** attempt)
+                    continue
+                result.update(code=code, final_url=final_url, error=None)
+                if code == 429 and attempt < MAX_RETRIES - 1:
+                    wait = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt * 5
+                    await asyncio.sleep(min(wait, MAX_RETRY_AFTER))
+                    continue
+                result['status'] = classify(url, code, final_url, oembed)
+                break
+        result['checked_at'] = time.time()
+        inc('cardcreator_link_checks_total', help="Links checked", result=result['status'])
+        return result
+
+    async def check_all(self, urls):
+        """Check URLs concurrently; returns {url: result}."""
+        import aiohttp
+
+        self._slots = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT}) as session:
+            results = await asyncio.gather(*(self.check(session, url) for url in urls))
+        return {result['url']: result for result in results}
+
+def check_links(urls, refresh=False, **options):
+    """
+    Check links, reusing cached results that are younger than LINK_CHECK_TTL.
+
+    Unknown results (timeouts, server errors) are not cached.
+
+    Args:
+        urls (iterable): Links to check
+        refresh (bool): Ignore cached results
+        **options: concurrency, per_host and timeout for LinkChecker
+
+    Returns:
+        tuple: ({url: result}, number of links actually requested)
+    """
+    urls = sorted(set(urls))
+    now = time.time()
+    ttl = get_link_check_ttl()
+    cache = load_media_cache(LINK_CACHE_NAME)
+    results = {} if refresh else {
+        url: cache[url] for url in urls if url in cache and now - cache[url].get('checked_at', 0) <= ttl
+    }
+    pending = [url for url in urls if url not in results]
+    if pending:
+        checked = asyncio.run(LinkChecker(**options).check_all(pending))
+        results.update(checked)
+        with cache_lock:
+            cache = load_media_cache(LINK_CACHE_NAME)
+            for url in [url for url, entry in cache.items() if now - entry.get('checked_at', 0) > ttl]:
+                del cache[url]
+            cache.update({url: result for url, result in checked.items() if result['status'] != 'unknown'})
+            save_media_cache(LINK_CACHE_NAME, cache)
+    return results, len(pending)
+
+def build_report(cards, results):
+    """
+    Combine the cards' links with their results.
+
+    Returns:
+        dict: summary counts plus 'dead' and 'unknown' lists of
+            {file, field, url, code, final_url, error}
+    """
+    report = {'generated_at': time.time(), 'summary': {'cards': len(cards), 'links': 0, 'ok': 0, 'dead': 0, 'unknown': 0},
+              'dead': [], 'unknown': []}
+    for path, links in sorted(cards.items()):
+        for field, url in links.items():
+            result = results[url]
+            report['summary']['links'] += 1
+            report['summary'][result['status']] += 1
+            if result['status'] != 'ok':
+                report[result['status']].append({
+                    'file': os.path.basename(path),
+                    'field': field,
+                    'url': url,
+                    'code': result['code'],
+                    'final_url': result['final_url'],
+                    'error': result['error'],
+                })
+    return report
+
+def flag_dead_links(cards, results):
+    """
+    Record each card's dead link fields in a deadLinks frontmatter list.
+
+    Cards that were flagged before and whose links now work get an empty list.
+
+    Returns:
+        int: Number of cards updated
+    """
+    updated = 0
+    for path, links in sorted(cards.items()):
+        dead = [field for field, url in links.items() if results[url]['status'] == 'dead']
+        previous = read_frontmatter(path).get('deadLinks')
+        if previous is None and not dead:
+            continue
+        # Unknown results don't clear an existing flag
+        unknown = [field for field in (previous or []) if field in links and results[links[field]]['status'] == 'unknown']
+        flagged = sorted(set(dead) | set(unknown))
+        if flagged != sorted(previous or []):
+            update_frontmatter(path, {'deadLinks': flagged})
+            updated += 1
+    return updated
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Check the links in every track card.")
+    parser.add_argument('--report', default=None, help="write a JSON report of dead and unknown links to this file")
+    parser.add_argument('--flag', action='store_true', help="record dead links in each card's deadLinks field")
+    parser.add_argument('--refresh', action='store_true', help="recheck every link, ignoring cached results")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="requests in flight overall")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help="requests in flight per host")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="seconds per request")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        logger.error("Error: the link checker needs aiohttp (pip install aiohttp)")
+        return
+    markdown_dir = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    if not os.path.isdir(markdown_dir):
+        logger.error("Error: MARKDOWN_OUTPUT_PATH must point to the markdown catalog")
+        return
+
+    start = time.perf_counter()
+    cards = collect_links(markdown_dir)
+    results, requested = check_links(
+        [url for links in cards.values() for url in links.values()],
+        refresh=args.refresh, concurrency=args.concurrency, per_host=args.per_host, timeout=args.timeout,
+    )
+    report = build_report(cards, results)
+
+    for item in report['dead']:
+        print(f"DEAD  {item['file']}  {item['field']}: {item['url']} ({item['code'] or item['error']})")
+    summary = report['summary']
+    print(f"\n{summary['links']} links in {summary['cards']} cards: {summary['ok']} ok, {summary['dead']} dead, "
+          f"{summary['unknown']} unknown ({requested} checked, the rest cached) in {time.perf_counter() - start:.1f}s")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+    if args.flag:
+        print(f"Updated deadLinks in {flag_dead_links(cards, results)} cards")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Offline load generator for the posting pipeline.
+
+Starts the fake servers from fake_servers.py, points the posters at them and
+publishes many synthetic cards concurrently, then reports posts per second and
+latency percentiles per platform and per card:
+
+    python load_test.py --cards 200 --concurrency 8 --latency-ms 40 --jitter-ms 20
+"""
+import os
+import io
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from fake_servers import start_fake_servers, stop_fake_servers, fake_server_env
+from posters import load_poster
+
+PLATFORMS = ('instagram', 'mastodon', 'bluesky')
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize_latencies(values):
+    """
+    Summarize a list of latencies in seconds.
+
+    Returns:
+        dict: count, mean, p50, p90, p99 and max in milliseconds
+    """
+    values = sorted(values)
+    if not values:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p90_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values) * 1000,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p90_ms': percentile(values, 90) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+def format_summary_row(name, summary, extra=''):
+    return (f"{name:<12} n={summary['count']:<6} mean={summary['mean_ms']:8.1f}ms "
+            f"p50={summary['p50_ms']:8.1f}ms p90={summary['p90_ms']:8.1f}ms "
+            f"p99={summary['p99_ms']:8.1f}ms max={summary['max_ms']:8.1f}ms {extra}")
+
+def make_card_images(directory, count, unique=True):
+    """
+    Write synthetic 1080x1080 JPEG artwork for the load test.
+
+    With unique=True every card gets different bytes, so upload caches don't
+    short-circuit the uploads being measured.
+    """
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (1080, 1080), (30, 30, 60)).save(buffer, 'JPEG', quality=85)
+    base = buffer.getvalue()
+
+    paths = []
+    for i in range(count if unique else 1):
+        path = os.path.join(directory, f"card_{i:05d}.jpg")
+        with open(path, 'wb') as f:
+            # Bytes after the JPEG end marker are ignored by decoders
+            f.write(base + (f"card-{i}".encode() if unique else b''))
+        paths.append(path)
+    return [paths[i % len(paths)] for i in range(count)]
+
+def load_posters(platforms):
+    return {name: load_poster(name) for name in platforms}
+
+def publish_card(posters, index, image_path):
+    """Publish one synthetic card to every selected platform, timing each post."""
+    timings = {}
+    results = {}
+    card_start = time.perf_counter()
+    for name, poster in posters.items():
+        start = time.perf_counter()
+        results[name] = poster(
+            image_path=image_path,
+            title=f"Synthetic Track {index}",
+            artist="Load Test Artist",
+            review="A synthetic review used to exercise the posting path.",
+            bandcamp_url=f"https://loadtest.bandcamp.com/track/synthetic-track-{index}",
+            spotify_url="https://open.spotify.com/track/loadtest",
+            youtube_url="https://www.youtube.com/watch?v=loadtest",
+            hashtags=['#kdzu', '#loadtest']
+        )
+        timings[name] = time.perf_counter() - start
+    return timings, results, time.perf_counter() - card_start
+
+def run_load_test(cards=50, concurrency=4, platforms=PLATFORMS, latency_ms=0, jitter_ms=0,
+                  error_rate=0.0, media_processing_ms=0, unique_images=True, verbose=False):
+    """
+    Run the load test and return a report dict.
+
+    Args:
+        cards (int): Number of synthetic cards to publish
+        concurrency (int): Number of cards published in parallel
+        platforms (tuple): Platforms to post each card to
+        latency_ms, jitter_ms, error_rate, media_processing_ms: Fake server behaviour
+        unique_images (bool): Give every card its own artwork bytes
+        verbose (bool): Show the posters' own output
+
+    Returns:
+        dict: Throughput, per-platform and per-card latency summaries, failures
+    """
+    work_dir = tempfile.mkdtemp(prefix='cardcreator-load-')
+    servers = start_fake_servers(latency_ms, jitter_ms, error_rate, media_processing_ms)
+    saved_env = dict(os.environ)
+    try:
+        os.environ.update(fake_server_env(servers))
+        os.environ['CARDCREATOR_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+        os.environ['HASHTAG_PROMPT'] = '0'
+
+        posters = load_posters(platforms)
+        images = make_card_images(work_dir, cards, unique_images)
+
+        latencies = {name: [] for name in posters}
+        failures = {name: 0 for name in posters}
+        card_latencies = []
+
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(publish_card, posters, i, images[i]) for i in range(cards)]
+            for future in futures:
+                timings, results, card_time = future.result()
+                card_latencies.append(card_time)
+                for name, elapsed in timings.items():
+                    latencies[name].append(elapsed)
+                    if not results[name]:
+                        failures[name] += 1
+        elapsed = time.perf_counter() - start
+
+        total_posts = sum(len(values) for values in latencies.values())
+        return {
+            'cards': cards,
+            'concurrency': concurrency,
+            'elapsed_s': elapsed,
+            'posts_per_second': total_posts / elapsed if elapsed else 0.0,
+            'cards_per_second': cards / elapsed if elapsed else 0.0,
+            'platforms': {name: summarize_latencies(values) for name, values in latencies.items()},
+            'failures': failures,
+            'card': summarize_latencies(card_latencies),
+            'server_requests': {name: dict(server.request_counts) for name, server in servers.items()},
+        }
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        stop_fake_servers(servers)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_report(report):
+    print(f"\n{report['cards']} cards at concurrency {report['concurrency']} in {report['elapsed_s']:.2f}s")
+    print(f"Throughput: {report['posts_per_second']:.1f} posts/s, {report['cards_per_second']:.1f} cards/s\n")
+    for name, summary in report['platforms'].items():
+        print(format_summary_row(name, summary, f"failures={report['failures'][name]}"))
+    print(format_summary_row('card', report['card']))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the posting pipeline against local fake servers.")
+    parser.add_argument('--cards', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--platforms', default=','.join(PLATFORMS),
+                        help="comma-separated subset of instagram,mastodon,bluesky")
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--media-processing-ms', type=float, default=0)
+    parser.add_argument('--same-image', action='store_true', help="reuse one image so upload caches are hit")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the posters' output")
+    args = parser.parse_args()
+
+    platforms = tuple(p.strip() for p in args.platforms.split(',') if p.strip())
+    unknown = set(platforms) - set(PLATFORMS)
+    if unknown:
+        parser.error(f"unknown platforms: {', '.join(sorted(unknown))}")
+
+    report = run_load_test(args.cards, args.concurrency, platforms, args.latency_ms, args.jitter_ms,
+                           args.error_rate, args.media_processing_ms, not args.same_image, args.verbose)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
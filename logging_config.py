@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import logging
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def setup_logging(level=None, fmt=None, stream=None):
+    """
+    Configure CardCreator's log output.
+
+    Args:
+        level (str, optional): Log level; defaults to LOG_LEVEL or INFO
+        fmt (str, optional): 'text' (plain messages, like the old print output)
+            or 'json' (one object per line); defaults to LOG_FORMAT or text
+        stream (file, optional): Where to write logs; defaults to stdout for text
+            and stderr for JSON, so JSON logs don't mix with the prompts
+    """
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'text')).lower()
+
+    if fmt == 'json':
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # Keep third-party client chatter out of our output unless debugging
+    if level != 'DEBUG':
+        for noisy in ('urllib3', 'selenium', 'WDM', 'googleapiclient', 'httpx', 'instagrapi', 'public_request', 'private_request'):
+            logging.getLogger(noisy).setLevel(logging.WARNING)
@@ -1,7 +1,24 @@
 import os
 import re
+import logging
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from mastodon import Mastodon
 from dotenv import load_dotenv
+from stations import get_setting, get_hero_image_base_url
+from hashtags import format_hashtags, get_track_hashtags, parse_tag_list
+from track_frontmatter import parse_frontmatter_value
+from logging_config import setup_logging
+from media_cache import file_sha256, get_cached_media, remember_media, forget_media
+
+logger = logging.getLogger('cardcreator.mastodon')
+
+MEDIA_CACHE_NAME = 'mastodon_media'
+
+# Mastodon deletes media that was never attached to a status after about a day,
+# so cached IDs are only trusted for a little less than that by default.
+DEFAULT_MEDIA_CACHE_TTL = 23 * 60 * 60
 
 def read_track_from_markdown(markdown_file_path):
     """
@@ -32,7 +49,7 @@ def read_track_from_markdown(markdown_file_path):
             if ':' in line and not line.startswith('#'):
                 key, value = line.split(':', 1)
                 key = key.strip()
-                value = value.strip().strip('"').strip("'")
+                value = parse_frontmatter_value(value)
                 track_data[key] = value
         
         # Extract review (remove the placeholder text)
@@ -43,10 +60,10 @@ def read_track_from_markdown(markdown_file_path):
         
         # Get image path from heroImage
         hero_image = track_data.get('heroImage', '')
-        if hero_image.startswith('https://static.kdzu.org/images/tracks/'):
+        if hero_image.startswith(get_hero_image_base_url()):
             # Convert to local path
             image_filename = os.path.basename(hero_image)
-            image_path = os.path.join(os.path.expanduser(os.getenv('IMAGE_OUTPUT_PATH', '')), image_filename)
+            image_path = os.path.join(os.path.expanduser(get_setting('IMAGE_OUTPUT_PATH', '')), image_filename)
         else:
             image_path = None
         
@@ -57,11 +74,13 @@ def read_track_from_markdown(markdown_file_path):
             'bandcamp_url': track_data.get('bandcamp', ''),
             'spotify_url': track_data.get('spotify', ''),
             'youtube_url': track_data.get('youtube', ''),
+            'label': track_data.get('label', ''),
+            'tags': parse_tag_list(track_data.get('tags', '')),
             'image_path': image_path
         }
         
     except Exception as e:
-        print(f"Error reading markdown file: {str(e)}")
+        logger.error("Error reading markdown file: %s", e)
         return None
 
 def get_hashtags():
@@ -86,7 +105,84 @@ def get_hashtags():
     
     return ' '.join(hashtags)
 
-def create_mastodon_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None):
+def get_media_cache_key(mastodon_url, access_token, image_hash):
+    """
+    Build the media cache key for an image on a specific account.
+
+    Media IDs belong to the account that uploaded them, so the key includes the
+    instance and a digest of the access token (never the token itself).
+    """
+    account = hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+    return f"{mastodon_url.rstrip('/')}|{account}|{image_hash}"
+
+def wait_for_media(mastodon, media, timeout=60, interval=0.5):
+    """
+    Poll an uploaded attachment until the server has finished processing it.
+
+    Args:
+        mastodon (Mastodon): Authenticated client
+        media (dict): Attachment returned by media_post
+        timeout (float): Seconds to wait before giving up
+        interval (float): Initial delay between polls, doubled up to 5 seconds
+
+    Returns:
+        dict: The processed attachment
+    """
+    deadline = time.monotonic() + timeout
+    while media.get('url') is None:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Media {media['id']} was still processing after {timeout} seconds")
+        time.sleep(interval)
+        interval = min(interval * 2, 5)
+        media = mastodon.media(media['id'])
+    return media
+
+def upload_media(mastodon, image_path, description):
+    """
+    Upload an image without waiting for server-side processing, then poll for it.
+
+    Returns:
+        dict: The processed attachment
+    """
+    media = mastodon.media_post(image_path, description=description, synchronous=False)
+    return wait_for_media(mastodon, media)
+
+def get_or_upload_media(mastodon, mastodon_url, access_token, image_path, description):
+    """
+    Return a processed media attachment for image_path, reusing a cached upload if possible.
+
+    Returns:
+        tuple: (attachment dict, cache key, whether it came from the cache)
+    """
+    cache_key = get_media_cache_key(mastodon_url, access_token, file_sha256(image_path))
+    ttl = float(os.getenv('MASTODON_MEDIA_CACHE_TTL', DEFAULT_MEDIA_CACHE_TTL))
+    cached = get_cached_media(MEDIA_CACHE_NAME, cache_key, max_age=ttl)
+    if cached:
+        return cached, cache_key, True
+    
+    media = upload_media(mastodon, image_path, description)
+    remember_media(MEDIA_CACHE_NAME, cache_key, {'id': media['id'], 'url': media['url']})
+    return media, cache_key, False
+
+def get_mastodon_client():
+    """
+    Create a Mastodon client from the current station's credentials (see stations.py).
+    
+    Returns:
+        Mastodon: Client, or None if the credentials are missing
+    """
+    mastodon_url = get_setting('MASTODON_URL')
+    access_token = get_setting('MASTODON_ACCESS_TOKEN')
+    if not mastodon_url or not access_token:
+        logger.error("Error: Mastodon credentials not found in .env file")
+        logger.error("Please add MASTODON_URL and MASTODON_ACCESS_TOKEN to your .env file")
+        return None
+    return Mastodon(
+        access_token=access_token,
+        api_base_url=mastodon_url
+    )
+
+def create_mastodon_post(image_path, title, artist, review, bandcamp_url, spotify_url=None, youtube_url=None, hashtags=None, client=None):
     """
     Create a Mastodon post for a track review.
     
@@ -98,28 +194,35 @@ def create_mastodon_post(image_path, title, artist, review, bandcamp_url, spotif
         bandcamp_url (str): Bandcamp URL
         spotify_url (str, optional): Spotify URL
         youtube_url (str, optional): YouTube URL
+        hashtags (list, optional): Hashtags to use; prompts for them if not given
+        client (Mastodon, optional): Client to reuse (see get_mastodon_client())
     """
-    # Load environment variables
-    load_dotenv()
-    
     try:
-        # Get Mastodon credentials
-        mastodon_url = os.getenv('MASTODON_URL')
-        access_token = os.getenv('MASTODON_ACCESS_TOKEN')
-        
-        if not mastodon_url or not access_token:
-            print("Error: Mastodon credentials not found in .env file")
-            print("Please add MASTODON_URL and MASTODON_ACCESS_TOKEN to your .env file")
+        # Initialize Mastodon client
+        mastodon = client or get_mastodon_client()
+        if mastodon is None:
             return False
+        mastodon_url = get_setting('MASTODON_URL')
+        access_token = get_setting('MASTODON_ACCESS_TOKEN')
         
-        # Initialize Mastodon client
-        mastodon = Mastodon(
-            access_token=access_token,
-            api_base_url=mastodon_url
+        # Start the upload in the background so it overlaps with the hashtag prompt
+        logger.info("Uploading image to Mastodon in the background...")
+        executor = ThreadPoolExecutor(max_workers=1)
+        upload_future = executor.submit(
+            get_or_upload_media,
+            mastodon,
+            mastodon_url,
+            access_token,
+            image_path,
+            f"Album artwork for {title} by {artist}"
         )
+        executor.shutdown(wait=False)
         
-        # Get hashtags from user
-        hashtags = get_hashtags()
+        # Get hashtags from user unless they were provided
+        if hashtags is None:
+            hashtags = get_hashtags()
+        else:
+            hashtags = format_hashtags(hashtags)
         
         # Create status text
         status = f"""{title} by {artist}
@@ -139,27 +242,47 @@ Listen on Bandcamp: {bandcamp_url}"""
             status += f"\n\n{hashtags}"
         
         # Add tracks web page link
-        more_tracks_url = os.getenv('MORE_TRACKS_URL', 'https://kdzu.org/tracks-we-love')
+        more_tracks_url = get_setting('MORE_TRACKS_URL', 'https://kdzu.org/tracks-we-love')
         status += f"\n\nCheck out more tracks we love at {more_tracks_url}"
         
-        # Upload media first
-        print("Uploading image to Mastodon...")
-        media = mastodon.media_post(image_path, description=f"Album artwork for {title} by {artist}")
+        # Wait for the upload (and server-side processing) to finish
+        media, cache_key, from_cache = upload_future.result()
+        if from_cache:
+            logger.info("Reusing previously uploaded Mastodon media %s", media['id'])
         
         # Post status with media
-        print("Posting to Mastodon...")
-        result = mastodon.status_post(
-            status,
-            media_ids=[media['id']],
-            visibility='public'  # Options: public, unlisted, private, direct
-        )
+        logger.info("Posting to Mastodon...")
+        try:
+            result = mastodon.status_post(
+                status,
+                media_ids=[media['id']],
+                visibility='public'  # Options: public, unlisted, private, direct
+            )
+        except Exception:
+            if not from_cache:
+                raise
+            # The cached attachment expired or was already used; upload it again
+            logger.info("Cached Mastodon media was rejected, uploading again...")
+            forget_media(MEDIA_CACHE_NAME, cache_key)
+            media, cache_key, _ = get_or_upload_media(
+                mastodon, mastodon_url, access_token, image_path,
+                f"Album artwork for {title} by {artist}"
+            )
+            result = mastodon.status_post(
+                status,
+                media_ids=[media['id']],
+                visibility='public'
+            )
         
-        print(f"Successfully posted to Mastodon! Post ID: {result['id']}")
-        print(f"Post URL: {result['url']}")
+        # Attached media can't be attached to another status
+        forget_media(MEDIA_CACHE_NAME, cache_key)
+        
+        logger.info("Successfully posted to Mastodon! Post ID: %s", result['id'], extra={'platform': 'mastodon', 'post_id': result['id']})
+        logger.info("Post URL: %s", result['url'])
         return True
         
     except Exception as e:
-        print(f"Error posting to Mastodon: {str(e)}")
+        logger.error("Error posting to Mastodon: %s", e, extra={'platform': 'mastodon'})
         return False
 
 def create_mastodon_post_from_markdown(markdown_file_path):
@@ -169,18 +292,15 @@ def create_mastodon_post_from_markdown(markdown_file_path):
     Args:
         markdown_file_path (str): Path to the markdown file
     """
-    # Load environment variables
-    load_dotenv()
-    
     # Read track data from markdown
     track_data = read_track_from_markdown(markdown_file_path)
     if not track_data:
-        print("Error: Could not read track data from markdown file")
+        logger.error("Error: Could not read track data from markdown file")
         return False
     
     # Check if image exists
     if not track_data['image_path'] or not os.path.exists(track_data['image_path']):
-        print(f"Error: Image file not found at {track_data['image_path']}")
+        logger.error("Error: Image file not found at %s", track_data['image_path'])
         return False
     
     # Create Mastodon post
@@ -191,7 +311,8 @@ def create_mastodon_post_from_markdown(markdown_file_path):
         review=track_data['review'],
         bandcamp_url=track_data['bandcamp_url'],
         spotify_url=track_data['spotify_url'],
-        youtube_url=track_data['youtube_url']
+        youtube_url=track_data['youtube_url'],
+        hashtags=get_track_hashtags(track_data['tags'], track_data['artist'], track_data['label'])
     )
 
 def setup_mastodon_app():
@@ -216,12 +337,13 @@ def setup_mastodon_app():
     return True
 
 if __name__ == "__main__":
+    load_dotenv()
+    setup_logging()
     print("Mastodon Poster for CardCreator")
     print("=" * 40)
     
     # Check if setup is needed
-    load_dotenv()
-    if not os.getenv('MASTODON_ACCESS_TOKEN'):
+    if not get_setting('MASTODON_ACCESS_TOKEN'):
         print("Mastodon access token not found. Running setup...")
         setup_mastodon_app()
     else:
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+# Serializes read-modify-write updates from threads in the same process
+cache_lock = threading.RLock()
+
+def get_cache_dir():
+    """
+    Return the directory used for CardCreator's local caches, creating it if needed.
+
+    Defaults to ~/.cache/cardcreator and can be changed with CARDCREATOR_CACHE_DIR.
+    """
+    cache_dir = os.path.expanduser(os.getenv('CARDCREATOR_CACHE_DIR', '~/.cache/cardcreator'))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Hash a file's contents without reading it into memory all at once.
+
+    Args:
+        path (str): Path to the file
+        chunk_size (int): Number of bytes to read per chunk
+
+    Returns:
+        str: Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_path(name):
+    return os.path.join(get_cache_dir(), f"{name}.json")
+
+def load_media_cache(name):
+    """
+    Load a named media cache from disk.
+
+    Args:
+        name (str): Cache name, e.g. 'mastodon_media'
+
+    Returns:
+        dict: Mapping of cache key to entry (empty if missing or unreadable)
+    """
+    try:
+        with open(_cache_path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_media_cache(name, cache):
+    """Atomically write a named media cache to disk."""
+    path = _cache_path(name)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def get_cached_media(name, key, max_age=None):
+    """
+    Look up a cache entry, ignoring it if it is older than max_age seconds.
+
+    Args:
+        name (str): Cache name
+        key (str): Cache key
+        max_age (float, optional): Maximum entry age in seconds
+
+    Returns:
+        dict: The cached entry, or None if missing or expired
+    """
+    entry = load_media_cache(name).get(key)
+    if not entry:
+        return None
+    if max_age is not None and time.time() - entry.get('cached_at', 0) > max_age:
+        forget_media(name, key)
+        return None
+    return entry
+
+def remember_media(name, key, entry):
+    """Store an entry in a named cache, stamping it with the current time."""
+    with cache_lock:
+        cache = load_media_cache(name)
+        cache[key] = dict(entry, cached_at=time.time())
+        save_media_cache(name, cache)
+
+def forget_media(name, key):
+    """Remove an entry from a named cache if present."""
+    with cache_lock:
+        cache = load_media_cache(name)
+        if cache.pop(key, None) is not None:
+            save_media_cache(name, cache)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import atexit
+import functools
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default histogram buckets in seconds, from fast API calls to slow Chrome scrapes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, value=1, help=None, **labels):
+    """Increment a counter, e.g. inc('cardcreator_posts_total', platform='mastodon', result='ok')."""
+    with _lock:
+        if help:
+            _help.setdefault(name, ('counter', help))
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, help=None, buckets=DEFAULT_BUCKETS, **labels):
+    """Record a value (usually seconds) in a histogram."""
+    with _lock:
+        if help:
+            _help.setdefault(name, ('histogram', help))
+        key = _key(name, labels)
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(hist['buckets']):
+            if value <= bound:
+                hist['counts'][i] += 1
+        hist['sum'] += value
+        hist['count'] += 1
+
+@contextlib.contextmanager
+def measure(name, help=None, **labels):
+    """
+    Count and time an operation.
+
+    Records {name}_total with a result label and {name}_duration_seconds.
+    The result is 'error' if the block raises; the block can also set it:
+
+        with measure('cardcreator_scrapes') as outcome:
+            if not title:
+                outcome['result'] = 'error'
+    """
+    outcome = {'result': 'ok'}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except BaseException:
+        outcome['result'] = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        inc(f"{name}_total", help=f"{help or name} attempts by result", result=outcome['result'], **labels)
+        observe(f"{name}_duration_seconds", elapsed, help=f"{help or name} duration in seconds", **labels)
+
+def measured(name, help=None, success=None, **labels):
+    """
+    Decorator version of measure().
+
+    Args:
+        success (callable, optional): Given the return value, decides whether
+            the call counts as 'ok' (for functions that signal failure by value)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name, help=help, **labels) as outcome:
+                result = func(*args, **kwargs)
+                if success is not None and not success(result):
+                    outcome['result'] = 'error'
+                return result
+        return wrapper
+    return decorator
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(value, counts=list(value['counts'])) for key, value in _histograms.items()}
+        help_text = dict(_help)
+
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            if name in help_text:
+                lines.append(f"# HELP {name} {help_text[name][1]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            if name in help_text:
+                lines.append(f"# HELP {name} {help_text[name][1]}")
+            lines.append(f"# TYPE {name} histogram")
+        for bound, count in zip(hist['buckets'], hist['counts']):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return '\n'.join(lines) + '\n'
+
+def _state_path(textfile_path):
+    return textfile_path + '.state.json'
+
+def _load_state(path):
+    """Fold previous runs' totals into the in-memory metrics."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    with _lock:
+        for entry in state.get('counters', []):
+            key = (entry['name'], tuple(tuple(pair) for pair in entry['labels']))
+            _counters[key] = _counters.get(key, 0) + entry['value']
+        for entry in state.get('histograms', []):
+            key = (entry['name'], tuple(tuple(pair) for pair in entry['labels']))
+            hist = _histograms.setdefault(key, {
+                'buckets': entry['buckets'], 'counts': [0] * len(entry['buckets']), 'sum': 0.0, 'count': 0,
+            })
+            if hist['buckets'] == entry['buckets']:
+                hist['counts'] = [a + b for a, b in zip(hist['counts'], entry['counts'])]
+                hist['sum'] += entry['sum']
+                hist['count'] += entry['count']
+        for name, value in state.get('help', {}).items():
+            _help.setdefault(name, tuple(value))
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def write_textfile(path):
+    """
+    Write metrics for node-exporter's textfile collector.
+
+    Totals are kept in a state file next to it, so counters keep increasing
+    across separate card_creator runs instead of resetting with every process.
+    """
+    with _lock:
+        state = {
+            'counters': [{'name': n, 'labels': list(l), 'value': v} for (n, l), v in _counters.items()],
+            'histograms': [dict(h, name=n, labels=list(l)) for (n, l), h in _histograms.items()],
+            'help': _help,
+        }
+    _atomic_write(_state_path(path), json.dumps(state))
+    _atomic_write(path, render_metrics())
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics from a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+def setup_metrics():
+    """
+    Enable metrics export from the environment.
+
+    METRICS_TEXTFILE: path of a .prom file (e.g. in node-exporter's textfile
+    directory) written when the process exits.
+    METRICS_PORT: serve http://127.0.0.1:PORT/metrics while the process runs.
+    """
+    textfile = os.getenv('METRICS_TEXTFILE')
+    if textfile:
+        textfile = os.path.expanduser(textfile)
+        _load_state(_state_path(textfile))
+        atexit.register(write_textfile, textfile)
+
+    port = os.getenv('METRICS_PORT')
+    if port:
+        return start_metrics_server(int(port))
+    return None
@@ -0,0 +1,273 @@
+"""
+Append-only archive of every Bandcamp page CardCreator fetches.
+
+Pages are stored as independently compressed records (zstd when the optional
+zstandard package is installed, gzip otherwise) appended to pages.archive, with
+one JSON line per record in index.jsonl giving its URL, byte offset and length.
+Any page can be read back with a single seek, and the latest copy of a URL wins.
+
+The archive lets the extractor be re-run over the whole catalog without
+touching the network:
+
+    python page_archive.py reextract --workers 8
+    python page_archive.py stats
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from media_cache import get_cache_dir
+from stations import get_setting
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger('cardcreator.archive')
+
+ARCHIVE_FILENAME = 'pages.archive'
+INDEX_FILENAME = 'index.jsonl'
+
+_lock = threading.Lock()
+# Archive dir -> {url: sha256 of its latest copy}, so appends don't reread the index
+_latest_digests = {}
+
+def get_archive_dir():
+    """Return the archive directory (PAGE_ARCHIVE_DIR, default <cache dir>/page_archive)."""
+    archive_dir = os.getenv('PAGE_ARCHIVE_DIR')
+    archive_dir = os.path.expanduser(archive_dir) if archive_dir else os.path.join(get_cache_dir(), 'page_archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    return archive_dir
+
+def archive_enabled():
+    """Archiving is on unless PAGE_ARCHIVE is set to 0."""
+    return os.getenv('PAGE_ARCHIVE', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def page_kind(url):
+    """Return 'track', 'album' or 'other' for a Bandcamp URL."""
+    path = urlparse(url).path
+    if path.startswith('/track/'):
+        return 'track'
+    if path.startswith('/album/'):
+        return 'album'
+    return 'other'
+
+def _compress(data):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=6, mtime=0)
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This archive record is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def archive_page(url, html, archive_dir=None):
+    """
+    Append a fetched page to the archive.
+
+    Pages identical to the URL's latest archived copy are not stored again.
+
+    Args:
+        url (str): Page URL
+        html (str): Page source
+        archive_dir (str, optional): Archive directory (default: get_archive_dir())
+
+    Returns:
+        dict: The new index entry, or None if the page was unchanged
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    data = html.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    with _lock:
+        if archive_dir not in _latest_digests:
+            _latest_digests[archive_dir] = {u: e['sha256'] for u, e in load_index(archive_dir).items()}
+        if _latest_digests[archive_dir].get(url) == digest:
+            return None
+
+    codec, compressed = _compress(data)
+    archive_path = os.path.join(archive_dir, ARCHIVE_FILENAME)
+    index_path = os.path.join(archive_dir, INDEX_FILENAME)
+    with _lock, open(archive_path, 'ab') as archive, open(index_path, 'a', encoding='utf-8') as index:
+        # Other processes (the watcher, the crawler) may append at the same time
+        if fcntl is not None:
+            fcntl.flock(archive.fileno(), fcntl.LOCK_EX)
+        try:
+            archive.seek(0, os.SEEK_END)
+            entry = {
+                'url': url,
+                'kind': page_kind(url),
+                'offset': archive.tell(),
+                'length': len(compressed),
+                'codec': codec,
+                'sha256': digest,
+                'fetched_at': time.time(),
+            }
+            archive.write(compressed)
+            archive.flush()
+            index.write(json.dumps(entry) + '\n')
+            index.flush()
+            _latest_digests[archive_dir][url] = digest
+        finally:
+            if fcntl is not None:
+                fcntl.flock(archive.fileno(), fcntl.LOCK_UN)
+    return entry
+
+def load_index(archive_dir=None):
+    """
+    Read the archive index.
+
+    Returns:
+        dict: URL -> index entry of its most recently archived copy
+    """
+    index_path = os.path.join(archive_dir or get_archive_dir(), INDEX_FILENAME)
+    latest = {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn last line from an interrupted write
+                    continue
+                latest[entry['url']] = entry
+    except OSError:
+        pass
+    return latest
+
+def read_page(entry, archive_dir=None):
+    """Read an archived page back from its index entry."""
+    archive_path = os.path.join(archive_dir or get_archive_dir(), ARCHIVE_FILENAME)
+    with open(archive_path, 'rb') as f:
+        f.seek(entry['offset'])
+        data = f.read(entry['length'])
+    return _decompress(entry['codec'], data).decode('utf-8')
+
+def _extract(args):
+    """Worker: parse one archived page (runs in a separate process)."""
+    import card_creator
+
+    entry, archive_dir = args
+    html = read_page(entry, archive_dir)
+    if entry['kind'] == 'album':
+        return entry['url'], card_creator.parse_album_page(html, entry['url'])
+    return entry['url'], card_creator.parse_track_page(html, entry['url'])
+
+def extract_archive(archive_dir=None, workers=None):
+    """
+    Re-run the extractor over the latest archived copy of every track and album page.
+
+    Returns:
+        dict: URL -> parsed track or album (None where parsing failed)
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    entries = [entry for entry in load_index(archive_dir).values() if entry['kind'] in ('track', 'album')]
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for url, parsed in executor.map(_extract, [(entry, archive_dir) for entry in entries], chunksize=16):
+            results[url] = parsed
+    return results
+
+def reextract_catalog(markdown_dir, archive_dir=None, workers=None, dry_run=False):
+    """
+    Backfill the extracted fields of every card from the archived pages.
+
+    Only fields that come from the page (see card_creator.EXTRACTED_FIELDS) are
+    updated; titles, links and reviews are left alone. Cards without an archived
+    track page get release-level fields from their album's page.
+
+    Returns:
+        tuple: (number of cards updated, number of cards without an archived page)
+    """
+    from card_creator import EXTRACTED_FIELDS
+    from track_frontmatter import read_frontmatter, update_frontmatter
+
+    parsed = extract_archive(archive_dir, workers)
+
+    # Map each track URL on an archived album page to that album's data
+    albums = {}
+    for url, album in parsed.items():
+        if album and page_kind(url) == 'album':
+            for track in album['tracks']:
+                if track['url']:
+                    albums[track['url']] = album
+
+    updated = missing = 0
+    for name in sorted(os.listdir(markdown_dir)):
+        if not name.endswith('.md'):
+            continue
+        path = os.path.join(markdown_dir, name)
+        try:
+            fields = read_frontmatter(path)
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping %s: %s", path, e)
+            continue
+        url = fields.get('bandcamp')
+        source = parsed.get(url) or albums.get(url)
+        if not source:
+            missing += 1
+            continue
+
+        changes = {}
+        for key, source_key in EXTRACTED_FIELDS.items():
+            value = source.get(source_key)
+            if value and value != fields.get(key):
+                changes[key] = value
+        if changes:
+            logger.info("%s: %s", name, ', '.join(sorted(changes)), extra={'path': path})
+            if not dry_run:
+                update_frontmatter(path, changes)
+            updated += 1
+    return updated, missing
+
+def main():
+    from dotenv import load_dotenv
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Inspect the page archive or re-extract the catalog from it.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reextract = subparsers.add_parser('reextract', help="update the markdown catalog from archived pages")
+    reextract.add_argument('--workers', type=int, default=None, help="parser processes (default: one per core)")
+    reextract.add_argument('--dry-run', action='store_true', help="show what would change without writing")
+    subparsers.add_parser('stats', help="show what the archive holds")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+
+    if args.command == 'stats':
+        index = load_index()
+        kinds = {}
+        for entry in index.values():
+            kinds[entry['kind']] = kinds.get(entry['kind'], 0) + 1
+        size = os.path.getsize(os.path.join(get_archive_dir(), ARCHIVE_FILENAME)) if index else 0
+        print(f"{len(index)} URLs ({', '.join(f'{n} {kind}' for kind, n in sorted(kinds.items()))}), "
+              f"{size / 1024 / 1024:.1f} MB compressed, in {get_archive_dir()}")
+        return
+
+    markdown_dir = os.path.expanduser(get_setting('MARKDOWN_OUTPUT_PATH', ''))
+    if not os.path.isdir(markdown_dir):
+        logger.error("Error: MARKDOWN_OUTPUT_PATH must point to the markdown catalog")
+        return
+    start = time.perf_counter()
+    updated, missing = reextract_catalog(markdown_dir, workers=args.workers, dry_run=args.dry_run)
+    print(f"{'Would update' if args.dry_run else 'Updated'} {updated} cards in {time.perf_counter() - start:.1f}s; "
+          f"{missing} cards have no archived page")
+
+if __name__ == "__main__":
+    main()
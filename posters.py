@@ -0,0 +1,105 @@
+import importlib
+import importlib.util
+from importlib.metadata import entry_points
+
+# Third-party posters can register themselves under this entry point group, e.g.
+#   [project.entry-points."cardcreator.posters"]
+#   threads = "threads_poster:create_threads_post"
+ENTRY_POINT_GROUP = 'cardcreator.posters'
+
+# Built-in posters. Nothing here is imported until a poster is selected.
+# client_factory names a function returning a logged-in client that the create
+# function accepts as client=..., so long-running processes can keep it warm.
+# card_format, if set, posts a rendered card of that format (see card_renderer.py)
+# instead of the bare artwork.
+POSTERS = {
+    'instagram': {
+        'label': 'Instagram',
+        'module': 'instagram_poster',
+        'function': 'create_instagram_post',
+        'client_factory': 'login_instagram',
+        'card_format': 'instagram',
+        'dependency': 'instagrapi',
+        'package': 'instagrapi',
+    },
+    'mastodon': {
+        'label': 'Mastodon',
+        'module': 'mastodon_poster',
+        'function': 'create_mastodon_post',
+        'client_factory': 'get_mastodon_client',
+        'card_format': None,
+        'dependency': 'mastodon',
+        'package': 'mastodon.py',
+    },
+    'bluesky': {
+        'label': 'Bluesky',
+        'module': 'bluesky_poster',
+        'function': 'create_bluesky_post',
+        'client_factory': 'login_bluesky',
+        'card_format': None,
+        'dependency': 'atproto',
+        'package': 'atproto',
+    },
+}
+
+_loaded_posters = {}
+
+def get_registered_posters():
+    """
+    Return the built-in posters plus any registered through entry points.
+
+    Returns:
+        dict: Poster name -> manifest entry (label, module, function, client_factory,
+            card_format, dependency, package)
+    """
+    posters = dict(POSTERS)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        module, _, function = entry_point.value.partition(':')
+        posters.setdefault(entry_point.name, {
+            'label': entry_point.name.title(),
+            'module': module,
+            'function': function,
+            'client_factory': None,
+            'card_format': None,
+            'dependency': None,
+            'package': entry_point.dist.name if entry_point.dist else module,
+        })
+    return posters
+
+def is_poster_available(name):
+    """Check whether a poster's dependency is installed, without importing it."""
+    poster = get_registered_posters()[name]
+    dependency = poster.get('dependency')
+    return dependency is None or importlib.util.find_spec(dependency) is not None
+
+def load_poster(name):
+    """
+    Import a poster module and return its create_*_post function.
+
+    Args:
+        name (str): Poster name, e.g. 'mastodon'
+
+    Returns:
+        callable: The poster's create function
+    """
+    if name not in _loaded_posters:
+        poster = get_registered_posters()[name]
+        module = importlib.import_module(poster['module'])
+        _loaded_posters[name] = getattr(module, poster['function'])
+    return _loaded_posters[name]
+
+def create_poster_client(name):
+    """
+    Create a reusable client for a poster, if it provides a client factory.
+
+    Returns:
+        object: The client, or None if the poster has no factory or its credentials are missing
+
+    Raises:
+        Exception: Whatever the platform library raises when the login itself fails
+    """
+    poster = get_registered_posters()[name]
+    if not poster.get('client_factory'):
+        return None
+    module = importlib.import_module(poster['module'])
+    return getattr(module, poster['client_factory'])()
@@ -0,0 +1,194 @@
+"""
+Station profiles, so one checkout (and one running service) can make cards
+for several shows and post them to each show's own accounts.
+
+Profiles live in stations.toml next to .env (or the file named by
+STATIONS_CONFIG; a .json file works too) and are read once per process:
+
+    [defaults]
+    MAX_HASHTAGS = 8
+
+    [stations.kdzu]
+    MARKDOWN_OUTPUT_PATH = "~/kdzu/site/src/content/tracks"
+    IMAGE_OUTPUT_PATH = "~/kdzu/site/public/images/tracks"
+    HERO_IMAGE_BASE_URL = "https://static.kdzu.org/images/tracks/"
+    MORE_TRACKS_URL = "https://kdzu.org/tracks-we-love"
+    DEFAULT_HASHTAGS = "#kdzu, #newmusic"
+    MASTODON_URL = "https://mastodon.social"
+    MASTODON_ACCESS_TOKEN = "${KDZU_MASTODON_ACCESS_TOKEN}"
+
+    [stations.kdzu.rate_limits]   # posts per hour and platform
+    instagram = 6
+
+A station's keys are the environment variable names they replace. Anything
+a station doesn't set comes from [defaults] and then from the environment,
+so without a stations file everything works from .env as before. A value
+like "${NAME}" is read from the environment, which keeps passwords in .env.
+
+The station in use is the one passed to use_station() (per thread or task),
+else --station / STATION, else the only configured station.
+"""
+import os
+import json
+import time
+import logging
+import functools
+import contextlib
+import contextvars
+
+from media_cache import load_media_cache, save_media_cache, cache_lock
+
+logger = logging.getLogger('cardcreator.stations')
+
+DEFAULT_STATIONS_CONFIG = 'stations.toml'
+DEFAULT_HERO_IMAGE_BASE_URL = 'https://static.kdzu.org/images/tracks/'
+POST_BUDGET_CACHE_NAME = 'post_budgets'
+RATE_WINDOW = 60 * 60
+
+_active_station = contextvars.ContextVar('station', default=None)
+_default_station = None
+
+@functools.lru_cache(maxsize=None)
+def _read_config(path):
+    if not os.path.exists(path):
+        return {'defaults': {}, 'stations': {}}
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    else:
+        import tomllib
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    logger.info("Loaded %d station profiles from %s", len(config.get('stations', {})), path)
+    return {'defaults': config.get('defaults', {}), 'stations': config.get('stations', {})}
+
+def load_stations():
+    """
+    Return the parsed station profiles (read from disk only the first time).
+
+    Returns:
+        dict: 'defaults' -> settings, 'stations' -> station name -> settings
+    """
+    return _read_config(os.path.expanduser(os.getenv('STATIONS_CONFIG', DEFAULT_STATIONS_CONFIG)))
+
+def station_names():
+    """Return the names of the configured stations."""
+    return list(load_stations()['stations'])
+
+def check_station(name):
+    """Raise ValueError if a station isn't configured."""
+    if name not in load_stations()['stations']:
+        configured = ', '.join(station_names()) or 'none'
+        raise ValueError(f"Unknown station '{name}' (configured: {configured})")
+
+def set_default_station(name):
+    """Use a station wherever use_station() doesn't pick another, e.g. from --station."""
+    global _default_station
+    if name is not None:
+        check_station(name)
+    _default_station = name
+
+def get_station_name():
+    """Return the name of the station in use, or None when no profiles are configured."""
+    name = _active_station.get() or _default_station or os.getenv('STATION')
+    if name:
+        return name
+    names = station_names()
+    return names[0] if len(names) == 1 else None
+
+@contextlib.contextmanager
+def use_station(name):
+    """
+    Make a station the current one for this thread or task.
+
+    Passing None keeps whatever station is already in use.
+    """
+    if name is None:
+        yield get_station_name()
+        return
+    check_station(name)
+    token = _active_station.set(name)
+    try:
+        yield name
+    finally:
+        _active_station.reset(token)
+
+def _resolve(value):
+    if isinstance(value, str) and value.startswith('${') and value.endswith('}'):
+        return os.getenv(value[2:-1])
+    return value
+
+def get_setting(key, default=None):
+    """
+    Look up a setting for the current station.
+
+    Args:
+        key (str): Setting name, the same as its environment variable
+        default: Returned when neither the station, [defaults] nor the
+            environment set it
+
+    Returns:
+        The station's value, else the [defaults] value, else the environment
+        variable, else default. Values from the file keep their TOML type.
+    """
+    config = load_stations()
+    name = get_station_name()
+    if name is not None:
+        check_station(name)
+        station = config['stations'][name]
+        if key in station:
+            return _resolve(station[key])
+    if key in config['defaults']:
+        return _resolve(config['defaults'][key])
+    return os.getenv(key, default)
+
+def get_hero_image_base_url():
+    """Return the URL the station's artwork is published under (ends with /)."""
+    base_url = get_setting('HERO_IMAGE_BASE_URL') or DEFAULT_HERO_IMAGE_BASE_URL
+    return base_url if base_url.endswith('/') else f"{base_url}/"
+
+def get_rate_limit(platform):
+    """Return the station's posts-per-hour limit for a platform, or None for no limit."""
+    limit = (get_setting('rate_limits') or {}).get(platform)
+    return int(limit) if limit is not None else None
+
+def _budget_key(platform):
+    return f"{get_station_name() or 'default'}:{platform}"
+
+def take_post_budget(platform):
+    """
+    Spend one post from the current station's hourly budget for a platform.
+
+    Budgets are per station and platform (so per account) and are kept in
+    the cache directory, so interactive runs and the service share them.
+    The post is counted as soon as the budget is taken, so concurrent posts
+    can't overshoot it; give it back with refund_post_budget() if the post fails.
+
+    Returns:
+        bool: True if the post may go ahead, False if the budget is used up
+    """
+    limit = get_rate_limit(platform)
+    if limit is None:
+        return True
+    key = _budget_key(platform)
+    now = time.time()
+    with cache_lock:
+        budgets = load_media_cache(POST_BUDGET_CACHE_NAME)
+        recent = [posted for posted in budgets.get(key, []) if now - posted < RATE_WINDOW]
+        if len(recent) >= limit:
+            return False
+        budgets[key] = recent + [now]
+        save_media_cache(POST_BUDGET_CACHE_NAME, budgets)
+    return True
+
+def refund_post_budget(platform):
+    """Give back the post most recently taken from a platform's budget, after it failed."""
+    if get_rate_limit(platform) is None:
+        return
+    key = _budget_key(platform)
+    with cache_lock:
+        budgets = load_media_cache(POST_BUDGET_CACHE_NAME)
+        posted = budgets.get(key, [])
+        if posted:
+            budgets[key] = sorted(posted)[:-1]
+            save_media_cache(POST_BUDGET_CACHE_NAME, budgets)
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import functools
+import threading
+import contextlib
+from datetime import datetime
+
+# Tracing is off unless enable_tracing() is called; span() then returns a shared
+# no-op context manager, so instrumented code pays for one flag check.
+_enabled = False
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+_started_at = None
+_NOOP = contextlib.nullcontext()
+
+def enable_tracing():
+    """Start collecting spans for this process."""
+    global _enabled, _started_at
+    with _lock:
+        _spans.clear()
+        _started_at = time.perf_counter()
+        _enabled = True
+
+def disable_tracing():
+    """Stop collecting spans (already collected spans are kept)."""
+    global _enabled
+    _enabled = False
+
+def is_tracing_enabled():
+    return _enabled
+
+@contextlib.contextmanager
+def _recording_span(name, attrs):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {
+        'name': name,
+        'parent': stack[-1]['name'] if stack else None,
+        'depth': len(stack),
+        'thread': threading.current_thread().name,
+        'start_ms': (time.perf_counter() - _started_at) * 1000,
+        'attrs': attrs,
+    }
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['duration_ms'] = (time.perf_counter() - start) * 1000
+        stack.pop()
+        with _lock:
+            _spans.append(record)
+
+def span(name, **attrs):
+    """
+    Time a block of code as a named span.
+
+    Usage:
+        with span('download_image', url=url):
+            ...
+    """
+    if not _enabled:
+        return _NOOP
+    return _recording_span(name, attrs)
+
+def traced(name=None):
+    """Decorator that records each call of the function as a span."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _recording_span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_spans():
+    """Return the collected spans ordered by start time."""
+    with _lock:
+        return sorted(_spans, key=lambda record: record['start_ms'])
+
+def write_trace(path):
+    """
+    Write the collected spans to a JSON file.
+
+    Returns:
+        str: The path written
+    """
+    spans = get_spans()
+    trace = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'total_ms': (time.perf_counter() - _started_at) * 1000 if _started_at else 0.0,
+        'spans': spans,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=2, default=str)
+    return path
+
+def format_report():
+    """
+    Build a human-readable per-stage breakdown of the collected spans.
+
+    Spans are grouped by name (nested stages are indented under their parent)
+    with call count, total and mean time, and share of the run's wall time.
+    """
+    spans = get_spans()
+    total_ms = (time.perf_counter() - _started_at) * 1000 if _started_at else 0.0
+    if not spans:
+        return "No spans recorded."
+
+    groups = {}
+    for record in spans:
+        group = groups.setdefault(record['name'], {
+            'depth': record['depth'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'errors': 0,
+            'first_start': record['start_ms'],
+        })
+        group['count'] += 1
+        group['total_ms'] += record['duration_ms']
+        group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+        group['errors'] += 1 if record.get('error') else 0
+
+    lines = [f"{'stage':<36} {'calls':>5} {'total':>10} {'mean':>10} {'max':>10} {'share':>6}"]
+    for name, group in sorted(groups.items(), key=lambda item: item[1]['first_start']):
+        label = '  ' * group['depth'] + name
+        share = group['total_ms'] / total_ms * 100 if total_ms else 0.0
+        line = (f"{label:<36} {group['count']:>5} {group['total_ms']:>8.1f}ms "
+                f"{group['total_ms'] / group['count']:>8.1f}ms {group['max_ms']:>8.1f}ms {share:>5.1f}%")
+        if group['errors']:
+            line += f"  ({group['errors']} failed)"
+        lines.append(line)
+    lines.append(f"{'total run time':<36} {'':>5} {total_ms:>8.1f}ms")
+    return '\n'.join(lines)
@@ -0,0 +1,91 @@
+import json
+
+def parse_frontmatter_value(value):
+    """
+    Parse a single frontmatter value as written by create_track_file.
+
+    Quoted strings are unquoted, flow lists like ["a", "b"] become Python lists,
+    and anything else is returned as a stripped string.
+    """
+    value = value.strip()
+    if value.startswith('[') and value.endswith(']'):
+        try:
+            parsed = json.loads(value)
+            if isinstance(parsed, list):
+                return [str(item) for item in parsed]
+        except ValueError:
+            pass
+        # Fall back to a plain comma-separated list
+        return [item.strip().strip('"').strip("'") for item in value[1:-1].split(',') if item.strip()]
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value[1:-1]
+    return value.strip('"').strip("'")
+
+def parse_frontmatter(content):
+    """
+    Split a track markdown file into frontmatter fields and body.
+
+    Args:
+        content (str): Full markdown file content
+
+    Returns:
+        tuple: (dict of frontmatter fields, review body)
+    """
+    parts = content.split('---', 2)
+    if len(parts) < 3:
+        raise ValueError("Invalid markdown format: missing frontmatter")
+
+    fields = {}
+    for line in parts[1].strip().split('\n'):
+        line = line.strip()
+        if ':' in line and not line.startswith('#'):
+            key, value = line.split(':', 1)
+            fields[key.strip()] = parse_frontmatter_value(value)
+
+    return fields, parts[2].strip()
+
+def read_frontmatter(markdown_file_path):
+    """Read and parse the frontmatter of a track markdown file."""
+    with open(markdown_file_path, 'r', encoding='utf-8') as f:
+        return parse_frontmatter(f.read())[0]
+
+def format_frontmatter_list(values):
+    """Format a list of strings as a YAML flow list (which is also valid JSON)."""
+    return json.dumps(list(values), ensure_ascii=False)
+
+def format_frontmatter_value(value):
+    """Format a value the way create_track_file writes it (quoted string or flow list)."""
+    if isinstance(value, (list, tuple)):
+        return format_frontmatter_list(value)
+    return json.dumps(str(value), ensure_ascii=False)
+
+def update_frontmatter(markdown_file_path, changes):
+    """
+    Set frontmatter fields in a track markdown file, leaving everything else untouched.
+
+    Existing keys are rewritten in place; new keys are added at the end of the
+    frontmatter.
+
+    Args:
+        markdown_file_path (str): Path to the markdown file
+        changes (dict): Field name -> new value (string or list)
+    """
+    with open(markdown_file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not content.startswith('---'):
+        raise ValueError("Invalid markdown format: missing frontmatter")
+    end = content.index('---', 3)
+    lines = content[3:end].strip('\n').split('\n')
+
+    remaining = dict(changes)
+    for i, line in enumerate(lines):
+        key = line.split(':', 1)[0].strip()
+        if ':' in line and key in remaining:
+            lines[i] = f"{key}: {format_frontmatter_value(remaining.pop(key))}"
+    lines.extend(f"{key}: {format_frontmatter_value(value)}" for key, value in remaining.items())
+
+    with open(markdown_file_path, 'w', encoding='utf-8') as f:
+        f.write('---\n' + '\n'.join(lines) + '\n' + content[end:])